@@ -0,0 +1,152 @@
+"""
+Yield backtest: summaries against a per-tick reference, independence from
+chunk size and history format, and the default tier table when no usable
+model is loaded (CLI and server)
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import numpy as np
+
+import backtest_yield
+import predict_server
+import predict_yield
+import synthetic
+
+def history_array(count, seed):
+    chunks = list(synthetic.iter_yield_history(count, chunk_size=count, seed=seed))
+    history = np.zeros(count, dtype=backtest_yield.history_dtype)
+    for name in backtest_yield.HISTORY_FIELDS:
+        history[name] = chunks[0][name]
+    return history
+
+def chunks_of(history, size):
+    return [{name: np.asarray(history[name][start:start + size], dtype=np.float64)
+             for name in backtest_yield.HISTORY_FIELDS}
+            for start in range(0, len(history), size)]
+
+def reference_summary(history, compiled):
+    """Tick-by-tick loop over the same definitions"""
+    variance = sum(compiled['variance_range']) / 2
+    apy_seconds = fee_income = split_income = 0.0
+    tiers = []
+    previous = history['timestamp'][0]
+    for tick in history:
+        tier = predict_yield.tier_indices(compiled['bounds'], np.array([tick['tvl']]))[0]
+        apy = min(max(compiled['apys'][tier] + variance, compiled['min_apy']), compiled['max_apy'])
+        apy_seconds += apy * (tick['timestamp'] - previous)
+        fee_income += tick['fees'] * compiled['recommended_fees']
+        split_income += tick['splits'] * compiled['recommended_splits']
+        tiers.append(tier)
+        previous = tick['timestamp']
+
+    elapsed = history['timestamp'][-1] - history['timestamp'][0]
+    steps = np.diff(tiers)
+    return {
+        'ticks': len(history),
+        'formula_apy': round(apy_seconds / elapsed, 4),
+        'fee_income': round(fee_income, 2),
+        'split_income': round(split_income, 2),
+        'tier_upgrades': int((steps > 0).sum()),
+        'tier_downgrades': int((steps < 0).sum())
+    }
+
+class YieldBacktestTest(unittest.TestCase):
+    def setUp(self):
+        self.compiled = predict_yield.compile_yield_model(predict_yield.default_model_data())
+
+    def test_summary_matches_reference(self):
+        history = history_array(3000, 4)
+        summary = backtest_yield.backtest(chunks_of(history, 3000), {'m': self.compiled},
+                                          chart_limit=0)['m']['summary']
+        expected = reference_summary(history, self.compiled)
+        self.assertEqual({key: summary[key] for key in expected}, expected)
+        self.assertTrue(summary['model_used'])
+
+    def test_chunk_size_does_not_change_results(self):
+        history = history_array(5000, 2)
+        whole = backtest_yield.backtest(chunks_of(history, 5000), {'m': self.compiled})
+        for size in (1, 37, 1000):
+            chunked = backtest_yield.backtest(chunks_of(history, size), {'m': self.compiled})
+            for key, value in whole['m']['summary'].items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(chunked['m']['summary'][key], value, places=2,
+                                           msg=f'{key}, chunk size {size}')
+                else:
+                    self.assertEqual(chunked['m']['summary'][key], value, f'chunk size {size}')
+            self.assertEqual(len(chunked['m']['chart']), len(whole['m']['chart']))
+
+    def test_history_formats_agree(self):
+        history = history_array(500, 8)
+        with tempfile.TemporaryDirectory() as directory:
+            npy_path = os.path.join(directory, 'history.npy')
+            ndjson_path = os.path.join(directory, 'history.ndjson')
+            np.save(npy_path, history)
+            with open(ndjson_path, 'w') as f:
+                for tick in history:
+                    f.write(json.dumps({name: float(tick[name])
+                                        for name in backtest_yield.HISTORY_FIELDS}) + '\n')
+
+            results = [backtest_yield.backtest(backtest_yield.iter_history_chunks(path, 64),
+                                               {'m': self.compiled})
+                       for path in (npy_path, ndjson_path)]
+        self.assertEqual(results[0], results[1])
+
+    def test_rejects_descending_timestamps(self):
+        chunk = {'timestamp': np.array([2.0, 1.0]), 'tvl': np.array([1.0, 1.0]),
+                 'fees': np.zeros(2), 'splits': np.zeros(2)}
+        with self.assertRaises(ValueError):
+            backtest_yield.backtest([chunk], {'m': self.compiled})
+
+    def test_missing_model_uses_default_tiers(self):
+        history = history_array(1000, 1)
+        results = backtest_yield.backtest(chunks_of(history, 1000),
+                                          {'none': None, 'default': self.compiled})
+        fallback, default = results['none']['summary'], results['default']['summary']
+        self.assertFalse(fallback.pop('model_used'))
+        self.assertTrue(default.pop('model_used'))
+        self.assertEqual(fallback, default)
+
+class BacktestEntryPointTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.history_path = os.path.join(self.directory.name, 'history.npy')
+        np.save(self.history_path, history_array(200, 3))
+        # An unreadable model: the compiled model comes back as None
+        self.model_path = os.path.join(self.directory.name, 'yield_model.json')
+        with open(self.model_path, 'w') as f:
+            f.write('{not json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_cli_backtests_unreadable_model_with_default_tiers(self):
+        result = subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'backtest_yield.py'), self.history_path,
+             '--model', self.model_path],
+            cwd=self.directory.name, capture_output=True, text=True, check=True)
+        summary = json.loads(result.stdout.splitlines()[0])
+        self.assertEqual((summary['model'], summary['ticks'], summary['model_used']),
+                         (self.model_path, 200, False))
+
+    def test_server_backtests_unreadable_model_with_default_tiers(self):
+        server = predict_server.PredictionServer(
+            os.path.join(self.directory.name, 'risk_model.json'), self.model_path)
+        response = json.loads(server.handle_line(json.dumps(
+            {'id': 1, 'type': 'yield_backtest', 'history_file': self.history_path})))
+        self.assertTrue(response['ok'], response)
+        self.assertFalse(response['result']['summary']['model_used'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Benchmark harness: every case measures at a small scale, the regression
+gate flags only metrics beyond tolerance, and the CLI saves a baseline
+and fails against a tightened one
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import contextlib
+import subprocess
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import benchmarks
+
+METRICS = ('records', 'iterations', 'throughput', 'latency_p50', 'latency_p95', 'latency_p99',
+           'peak_memory_bytes')
+
+def result(throughput=1000.0, latency=0.01, memory=1000):
+    return {'throughput': throughput, 'latency_p50': latency, 'peak_memory_bytes': memory}
+
+class MeasureCaseTest(unittest.TestCase):
+    def test_every_case_measures(self):
+        for name in benchmarks.CASES:
+            with contextlib.redirect_stdout(io.StringIO()):
+                measured = benchmarks.measure_case(name, 200, iterations=2)
+            self.assertEqual(tuple(measured), METRICS, name)
+            self.assertEqual(measured['records'], 200, name)
+            self.assertGreater(measured['throughput'], 0, name)
+            self.assertLessEqual(measured['latency_p50'], measured['latency_p99'], name)
+            self.assertGreater(measured['peak_memory_bytes'], 0, name)
+
+    def test_per_call_cases_time_each_call(self):
+        measured = benchmarks.measure_case('predict_yield', 50, iterations=5)
+        self.assertEqual(measured['iterations'], 1)
+
+    def test_harness_skips_scales_past_the_case_limit(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            results = benchmarks.run_harness(['assess_tail_risk'], [100, 10**6], iterations=1)
+        self.assertEqual(list(results), ['assess_tail_risk@100'])
+        self.assertIn('skipped', out.getvalue())
+
+class LegacyParityTest(unittest.TestCase):
+    def test_columnar_engines_match_legacy_code(self):
+        model_weights = benchmarks.predict_risk.default_model_data()['model_weights']
+        positions = benchmarks.make_positions(2000, num_clusters=30)
+        self.assertEqual(benchmarks.predict_risk.assess_cluster_risk(positions, model_weights),
+                         benchmarks.legacy_assess_cluster_risk(positions, model_weights))
+
+        positions, end_dates = benchmarks.make_training_positions(2000, 30)
+        with contextlib.redirect_stdout(io.StringIO()):
+            analysis = benchmarks.train_risk.analyze_drawdown_patterns(positions, end_dates)
+        self.assertEqual(analysis, benchmarks.legacy_analyze_drawdown_patterns(positions, end_dates))
+
+class RegressionGateTest(unittest.TestCase):
+    def test_flags_metrics_beyond_tolerance(self):
+        baseline = {'results': {'a@100': result(), 'b@100': result()}}
+        results = {
+            'a@100': result(throughput=800.0, latency=0.0124, memory=1249),
+            'b@100': result(throughput=700.0, latency=0.02, memory=2000),
+            'new@100': result(throughput=1.0)
+        }
+        regressions = benchmarks.find_regressions(results, baseline, 0.25)
+        self.assertEqual([(key, metric) for key, metric, _, _ in regressions],
+                         [('b@100', 'throughput'), ('b@100', 'latency_p50'),
+                          ('b@100', 'peak_memory_bytes')])
+
+    def test_parse_scales(self):
+        self.assertEqual(benchmarks.parse_scales('1e3,2500,1e7'), [1000, 2500, 10**7])
+
+class BenchmarkCliTest(unittest.TestCase):
+    def run_cli(self, cwd, *args):
+        return subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'benchmarks.py'), 'run',
+             '--cases', 'predict_yield_batch', '--scales', '1e3', '--iterations', '2', *args],
+            cwd=cwd, capture_output=True, text=True)
+
+    def test_saves_and_enforces_baselines(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            path = os.path.join(cwd, 'baseline.json')
+            self.assertEqual(self.run_cli(cwd, '--save', path).returncode, 0)
+            with open(path) as f:
+                baseline = json.load(f)
+            self.assertEqual(list(baseline['results']), ['predict_yield_batch@1000'])
+
+            # An unreachable baseline must fail the run
+            baseline['results']['predict_yield_batch@1000']['throughput'] = 1e18
+            with open(path, 'w') as f:
+                json.dump(baseline, f)
+            failed = self.run_cli(cwd, '--baseline', path)
+            self.assertEqual(failed.returncode, 1)
+            self.assertIn('throughput', failed.stderr)
+
+    def test_rejects_unknown_cases(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            failed = self.run_cli(cwd, '--cases', 'nope')
+        self.assertEqual(failed.returncode, 1)
+        self.assertIn('Unknown case: nope', failed.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Calibration: vectorized threshold scores against a brute-force F1, recovery
+of the threshold synthetic outcomes were labeled with, and the fields
+written into the model weights
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import calibration
+import synthetic
+
+def reference_f1(drawdown, breached, threshold):
+    flagged = [d > threshold for d in drawdown]
+    true_positives = sum(f and b for f, b in zip(flagged, breached))
+    denominator = sum(flagged) + sum(breached)
+    return 2 * true_positives / denominator if denominator else 0.0
+
+class CalibrationTest(unittest.TestCase):
+    def test_scores_match_reference(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            # Coarse values so drawdowns land exactly on thresholds
+            outcomes = [{'drawdown': rng.choice([0.0, 0.01, 0.02, 0.03, 0.05, 0.1]),
+                         'breached': rng.random() < 0.3}
+                        for _ in range(rng.randrange(0, 40))]
+            columns = calibration.outcome_columns(outcomes)
+            thresholds = [0.0, 0.005, 0.01, 0.02, 0.025, 0.05, 0.2]
+
+            scores = calibration.score_thresholds(columns, thresholds)
+            expected = [reference_f1(columns['drawdown'].tolist(), columns['breached'].tolist(), t)
+                        for t in thresholds]
+            np.testing.assert_allclose(scores, expected, err_msg=f'seed {seed}')
+
+            result = calibration.calibrate(columns, thresholds)
+            best = max(range(len(thresholds)), key=lambda i: (expected[i], -i))
+            self.assertEqual(result['drawdown_threshold'], thresholds[best], f'seed {seed}')
+            self.assertEqual(result['f1'], round(expected[best], 4), f'seed {seed}')
+            self.assertEqual(result['clusters'], len(outcomes))
+
+    def test_recovers_labeling_threshold(self):
+        result = calibration.calibrate(synthetic.cluster_outcomes(5000, 1, noise=0.002))
+        self.assertAlmostEqual(result['drawdown_threshold'], 0.04, delta=0.005)
+        self.assertGreater(result['f1'], 0.9)
+        self.assertEqual(result['candidates'], len(calibration.DEFAULT_THRESHOLDS))
+
+    def test_same_seed_gives_same_outcomes(self):
+        first, second = synthetic.cluster_outcomes(100, 7), synthetic.cluster_outcomes(100, 7)
+        for column in ('drawdown', 'breached'):
+            self.assertEqual(first[column].tolist(), second[column].tolist())
+
+    def test_apply_calibration_and_load_outcomes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'outcomes.ndjson')
+            with open(path, 'w') as f:
+                f.write(json.dumps({'drawdown': 0.01, 'breached': False, 'id': 'a'}) + '\n\n')
+                f.write(json.dumps({'drawdown': 0.08, 'breached': True}) + '\n')
+            columns = calibration.load_outcomes(path)
+
+        self.assertEqual(columns['drawdown'].tolist(), [0.01, 0.08])
+        self.assertEqual(columns['breached'].tolist(), [False, True])
+
+        weights = {'cluster_size_weight': 0.3}
+        calibration.apply_calibration(weights, calibration.calibrate(columns, [0.005, 0.05]))
+        self.assertEqual(weights['drawdown_threshold'], 0.05)
+        self.assertEqual(weights['cluster_size_weight'], 0.3)
+        self.assertEqual(weights['calibration'], {'f1': 1.0, 'precision': 1.0, 'recall': 1.0,
+                                                  'candidates': 2, 'clusters': 2})
+
+if __name__ == '__main__':
+    unittest.main()
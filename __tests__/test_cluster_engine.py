@@ -0,0 +1,92 @@
+"""
+Columnar cluster engine: assess_cluster_risk on dicts and PositionTables
+against the original dict-grouping implementation, including empty books,
+zero-value clusters and the risk-level boundaries
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import predict_risk
+import records
+
+def reference_assessments(positions, model_weights):
+    """Per-end-date grouping over dicts, as assess_cluster_risk was first written"""
+    clusters = {}
+    for position in positions:
+        clusters.setdefault(position['endDate'], []).append(position)
+
+    assessments = []
+    for end_date, members in clusters.items():
+        total_value = sum(p['entryPrice'] * p['shares'] for p in members)
+        total_pnl = sum(p['pnl'] for p in members)
+        if total_value > 0:
+            drawdown = abs(total_pnl) / total_value if total_pnl < 0 else 0
+        else:
+            drawdown = 0
+
+        if drawdown > model_weights.get('drawdown_threshold', 4.0):
+            level = 'high'
+        elif drawdown > 2.0:
+            level = 'medium'
+        else:
+            level = 'low'
+        assessments.append({
+            'end_date': end_date,
+            'cluster_size': len(members),
+            'drawdown_percentage': round(drawdown * 100, 2),
+            'total_value': round(total_value, 2),
+            'total_pnl': round(total_pnl, 2),
+            'risk_level': level,
+            'severity': level
+        })
+    return assessments
+
+def random_positions(rng):
+    # Dyadic prices and whole shares keep every sum exact in any order
+    return [{'id': i, 'endDate': f'2025-01-{rng.randrange(1, 9):02d}',
+             'entryPrice': rng.choice([0.0, 0.125, 0.25, 0.5, 0.75]),
+             'shares': rng.choice([1, 8, 40, 100]),
+             'pnl': rng.choice([-300.0, -50.0, -2.5, 0.0, 4.0, 64.0])}
+            for i in range(rng.randrange(0, 60))]
+
+class ClusterEngineTest(unittest.TestCase):
+    def test_matches_dict_reference(self):
+        for seed in range(100):
+            rng = random.Random(seed)
+            positions = random_positions(rng)
+            model_weights = {'drawdown_threshold': rng.choice([0.04, 1.0, 4.0])}
+            expected = reference_assessments(positions, model_weights)
+
+            for source in (positions, records.PositionTable.from_dicts(positions)):
+                assessments = predict_risk.assess_cluster_risk(source, model_weights)
+                self.assertEqual(assessments, expected, f'seed {seed}')
+                self.assertEqual(
+                    predict_risk.generate_risk_prediction(assessments, model_weights),
+                    predict_risk.generate_risk_prediction(expected, model_weights),
+                    f'seed {seed}')
+
+    def test_risk_level_boundaries(self):
+        def level(pnl):
+            positions = [{'id': 1, 'endDate': 'd', 'entryPrice': 1.0, 'shares': 1, 'pnl': pnl}]
+            return predict_risk.assess_cluster_risk(
+                positions, {'drawdown_threshold': 4.0})[0]['risk_level']
+
+        # Drawdown is a ratio of value, so only losses beyond 2x / 4x the value escalate
+        self.assertEqual([level(p) for p in (-2.0, -2.5, -4.0, -4.5, 10.0)],
+                         ['low', 'medium', 'medium', 'high', 'low'])
+
+    def test_empty_and_zero_value_books(self):
+        self.assertEqual(predict_risk.assess_cluster_risk([], {}), [])
+        assessment, = predict_risk.assess_cluster_risk(
+            [{'id': 1, 'endDate': 'd', 'entryPrice': 0.0, 'shares': 5, 'pnl': -3.0}], {})
+        self.assertEqual((assessment['drawdown_percentage'], assessment['risk_level']), (0, 'low'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+"""
+Clustering engine: window clusters against a brute-force reference, the
+exact fallback for unparsable end dates, and batch scoring against
+single-portfolio scoring under every window
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import numpy as np
+
+import clustering
+import predict_risk
+
+LABELS = ['2025-01-01', '2025-01-02', '2025-01-02T23:30:00-05:00', '2025-01-05', '2025-01-06',
+          '2025-01-06T08:00:00', '2025-01-12', '2025-01-13', '2025-01-20', '2025-02-01']
+CATEGORIES = ['sports', 'politics', None]
+
+def utc_day(label):
+    value = datetime.fromisoformat(label)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.date()
+
+def reference_clusters(labels, values, window, categories):
+    """{(cluster label, category): (value sum, value min)} by brute force"""
+    days = [utc_day(label) for label in labels]
+    clusters = {}
+
+    def add(key, value):
+        total, low = clusters.get(key, (0.0, np.inf))
+        clusters[key] = (total + value, min(low, value))
+
+    if window.kind == 'rolling':
+        for category in set(categories):
+            members = sorted((i for i, c in enumerate(categories) if c == category),
+                             key=lambda i: days[i])
+            # Each window starts at the first expiry past the previous window
+            anchor = None
+            for i in members:
+                if anchor is None or days[i] >= anchor + timedelta(days=window.days):
+                    anchor = days[i]
+                add((anchor.isoformat(), category), values[i])
+        return clusters
+
+    for i, day in enumerate(days):
+        if window.kind == 'weekly':
+            day -= timedelta(days=day.weekday())
+        add((day.isoformat(), categories[i]), values[i])
+    return clusters
+
+class ClusterGroupsTest(unittest.TestCase):
+    def random_groups(self, rng):
+        count = rng.randrange(1, 25)
+        labels = [rng.choice(LABELS) for _ in range(count)]
+        categories = [rng.choice(CATEGORIES) for _ in range(count)]
+        # Whole numbers keep the sums exact in any order
+        values = [float(rng.randrange(-50, 100)) for _ in range(count)]
+        return labels, categories, values
+
+    def test_windows_match_reference(self):
+        for spec in ('daily', 'weekly', 'rolling:1', 'rolling:3', 'rolling:7', 'rolling:30'):
+            window = clustering.ClusterWindow.parse(spec)
+            for seed in range(50):
+                labels, categories, values = self.random_groups(random.Random(seed))
+                for by_category in (False, True):
+                    cats = categories if by_category else [None] * len(labels)
+                    keys, key_categories, clustered = clustering.cluster_groups(
+                        labels, {'sum': values, 'low': values}, window,
+                        categories if by_category else None, minimums=('low',))
+
+                    if not by_category:
+                        self.assertIsNone(key_categories)
+                        key_categories = [None] * len(keys)
+                    got = {(key, category): (total, low) for key, category, total, low in zip(
+                        keys, key_categories, clustered['sum'].tolist(),
+                        clustered['low'].tolist())}
+                    self.assertEqual(len(got), len(keys), f'{spec} seed {seed}')
+                    self.assertEqual(got, reference_clusters(labels, values, window, cats),
+                                     f'{spec} seed {seed}')
+
+                    # Clusters come out by window start
+                    self.assertEqual(keys, sorted(keys), f'{spec} seed {seed}')
+
+    def test_weekly_windows_start_on_monday(self):
+        window = clustering.ClusterWindow.parse('weekly')
+        keys, _, _ = clustering.cluster_groups(['2025-01-05', '2025-01-06', '2025-01-12'],
+                                               {'sum': [1.0, 2.0, 3.0]}, window)
+        self.assertEqual(keys, ['2024-12-30', '2025-01-06'])
+        for key in keys:
+            self.assertEqual(date.fromisoformat(key).weekday(), 0)
+
+    def test_rolling_windows_are_disjoint(self):
+        window = clustering.ClusterWindow.parse('rolling:3')
+        keys, _, clustered = clustering.cluster_groups(
+            ['2025-01-01', '2025-01-02', '2025-01-03', '2025-01-04', '2025-01-09'],
+            {'sum': [1.0, 2.0, 4.0, 8.0, 16.0]}, window)
+        # [01, 04), then [04, 07) from the first uncovered expiry, then [09, 12)
+        self.assertEqual(keys, ['2025-01-01', '2025-01-04', '2025-01-09'])
+        self.assertEqual(clustered['sum'].tolist(), [7.0, 8.0, 16.0])
+
+    def test_rolling_windows_count_each_position_once(self):
+        positions = [{'id': i, 'endDate': end_date, 'entryPrice': 0.5, 'shares': 200, 'pnl': 0.0}
+                     for i, end_date in enumerate(['2025-01-01', '2025-01-02', '2025-01-03'])]
+        model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                             cluster_window='rolling:2')
+        prediction = predict_risk.generate_risk_prediction(
+            predict_risk.assess_cluster_risk(positions, model_weights), model_weights)
+        self.assertEqual(prediction['metrics']['totalExposure'], 300.0)
+
+    def test_exact_keeps_first_appearance_order(self):
+        keys, categories, clustered = clustering.cluster_groups(
+            ['b', 'a', 'b', None], {'sum': [1.0, 2.0, 3.0, 4.0]},
+            clustering.ClusterWindow.parse('exact'), ['x', 'x', 'y', 'x'])
+        self.assertEqual(keys, ['b', 'a', 'b', None])
+        self.assertEqual(categories, ['x', 'x', 'y', 'x'])
+        self.assertEqual(clustered['sum'].tolist(), [1.0, 2.0, 3.0, 4.0])
+
+    def test_unparsable_labels_fall_back_to_exact_clusters(self):
+        labels = ['2025-01-01', None, 'next week', '2025-01-01T12:00:00', 'next week', None]
+        values = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0]
+        for spec in ('daily', 'weekly', 'rolling:3'):
+            keys, _, clustered = clustering.cluster_groups(
+                labels, {'sum': values}, clustering.ClusterWindow.parse(spec))
+            self.assertEqual(keys[1:], [None, 'next week'], spec)
+            self.assertEqual(clustered['sum'].tolist()[1:], [34.0, 20.0], spec)
+
+        keys, categories, clustered = clustering.cluster_groups(
+            labels, {'sum': values}, clustering.ClusterWindow.parse('daily'),
+            ['a', 'a', 'a', 'b', 'b', 'a'])
+        self.assertEqual(list(zip(keys, categories)),
+                         [('2025-01-01', 'a'), ('2025-01-01', 'b'), (None, 'a'),
+                          ('next week', 'a'), ('next week', 'b')])
+        self.assertEqual(clustered['sum'].tolist(), [1.0, 8.0, 34.0, 4.0, 16.0])
+
+    def test_day_keys_skip_unparsable_labels(self):
+        self.assertEqual(clustering.day_keys(['2025-01-02T23:30:00-05:00', None, 'soon']),
+                         ['2025-01-03', None, None])
+
+    def test_parse_window(self):
+        self.assertEqual(str(clustering.ClusterWindow.parse('rolling:5')), 'rolling:5')
+        self.assertEqual(clustering.ClusterWindow.parse('weekly').days, 7)
+        for spec in ('hourly', 'rolling', 'rolling:0', 'daily:2'):
+            with self.assertRaises(ValueError):
+                clustering.ClusterWindow.parse(spec)
+
+    def test_stream_keeps_in_memory_cluster_order(self):
+        # Equal drawdowns: the first cluster in order names the drawdownDate
+        positions = [
+            {'id': 1, 'endDate': '2025-01-02', 'category': 'b', 'entryPrice': 0.5, 'shares': 10,
+             'pnl': -5.0},
+            {'id': 2, 'endDate': '2025-01-01', 'category': 'a', 'entryPrice': 0.5, 'shares': 10,
+             'pnl': -5.0},
+            {'id': 3, 'endDate': '2025-01-02', 'category': 'a', 'entryPrice': 0.5, 'shares': 10,
+             'pnl': -5.0}
+        ]
+        stream = ''.join(json.dumps(position) + '\n' for position in positions)
+        for spec in ('exact', 'daily', 'rolling:3'):
+            model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                                 drawdown_threshold=0.5, cluster_window=spec,
+                                 cluster_by_category=True)
+            expected = predict_risk.assess_cluster_risk(positions, model_weights)
+            for chunk_size in (1, 2, 3):
+                accumulator = predict_risk.accumulate_stream(io.StringIO(stream), chunk_size, True)
+                self.assertEqual(accumulator.assessments(model_weights), expected,
+                                 f'{spec}, chunk {chunk_size}')
+
+class BatchWindowTest(unittest.TestCase):
+    def test_batch_matches_single_trader_scoring(self):
+        labels = LABELS + [None, 'soon']
+        for seed in range(40):
+            rng = random.Random(seed)
+            positions = []
+            for i in range(rng.randrange(1, 80)):
+                position = {
+                    'id': i,
+                    'trader': rng.choice('abcde'),
+                    'endDate': rng.choice(labels),
+                    'entryPrice': rng.choice([0.1, 0.25, 0.333, 0.5, 0.7]),
+                    'shares': rng.choice([1, 3, 7, 33, 100]),
+                    'pnl': rng.choice([-30.0, -10.0, -3.3, -1.0, 0.0, 0.7, 5.0])
+                }
+                if rng.random() < 0.8:
+                    position['category'] = rng.choice(CATEGORIES)
+                positions.append(position)
+
+            for spec in ('exact', 'daily', 'weekly', 'rolling:3'):
+                for by_category in (False, True):
+                    model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                                         drawdown_threshold=0.05, cluster_window=spec,
+                                         cluster_by_category=by_category)
+                    batch = predict_risk.predict_risk_batch(
+                        {'model_weights': model_weights}, positions)
+
+                    for trader, prediction in batch.items():
+                        own = [p for p in positions if p['trader'] == trader]
+                        expected = predict_risk.generate_risk_prediction(
+                            predict_risk.assess_cluster_risk(own, model_weights), model_weights)
+                        self.assertEqual(prediction, expected,
+                                         f'seed {seed}, {spec}, by_category={by_category}')
+
+    def test_batch_cli_applies_cluster_options(self):
+        positions = [{'id': i, 'trader': 'a', 'endDate': end_date, 'entryPrice': 0.5,
+                      'shares': 10, 'pnl': 0.0}
+                     for i, end_date in enumerate(['2025-01-01', '2025-01-02', '2025-01-03'])]
+        with tempfile.TemporaryDirectory() as cwd:
+            batch_path = os.path.join(cwd, 'batch.ndjson')
+            with open(batch_path, 'w') as f:
+                f.writelines(json.dumps(position) + '\n' for position in positions)
+            env = dict(os.environ, MODEL_OUTPUT_PATH=os.path.join(cwd, 'missing_model.json'))
+            env.pop('PREDICT_TIMINGS', None)
+
+            concentration = {}
+            for spec in ('daily', 'rolling:7'):
+                result = subprocess.run(
+                    [sys.executable, os.path.join(SCRIPTS_DIR, 'predict_risk.py'),
+                     '--batch', batch_path, '--cluster-window', spec],
+                    cwd=cwd, env=env, capture_output=True, text=True, check=True)
+                concentration[spec] = json.loads(result.stdout)['a']['metrics']['concentrationRisk']
+
+        # concentrationRisk is largest cluster size / cluster count: three one-position daily
+        # clusters, or one three-position 7-day window
+        self.assertEqual(concentration, {'daily': 33.33, 'rolling:7': 300.0})
+
+if __name__ == '__main__':
+    unittest.main()
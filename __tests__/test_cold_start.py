@@ -0,0 +1,100 @@
+"""
+Cold-start import budget for the one-shot prediction scripts, measured with
+python -X importtime
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import precompile
+
+# Import time spent by the scripts themselves, on top of interpreter startup.
+# Measured around 15-20 ms for a single-TVL yield call; the budget leaves
+# headroom for slower machines but fails if numpy creeps back in (~70 ms+).
+YIELD_IMPORT_BUDGET_MS = 40
+
+# Everything but numpy (and its lazily loaded submodules) for the risk CLI,
+# measured around 25 ms
+RISK_EXTRA_IMPORT_BUDGET_MS = 40
+
+# Best of several runs, to keep scheduler noise out of the budget check
+RUNS = 3
+
+def import_times(*args):
+    """(cumulative us per module, cumulative us per top-level import made by the script)"""
+    with tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, MODEL_OUTPUT_PATH=os.path.join(cwd, 'missing_model.json'))
+        env.pop('PREDICT_TIMINGS', None)
+        result = subprocess.run([sys.executable, '-X', 'importtime', *args], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True)
+
+    modules = {}
+    top_level = {}
+    startup = True
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        is_top_level = name.startswith(' ') and not name.startswith('  ')
+        name = name.strip()
+        modules.setdefault(name, int(cumulative))
+        # Interpreter startup ends with site; what follows is the script's own
+        if is_top_level and not startup:
+            top_level[name] = int(cumulative)
+        if is_top_level and name == 'site':
+            startup = False
+    return modules, top_level
+
+def best_import_times(*args, exclude=''):
+    """import_times() of the run with the lowest total, skipping top-level modules
+    starting with exclude"""
+    best = None
+    for _ in range(RUNS):
+        modules, top_level = import_times(*args)
+        total = sum(us for name, us in top_level.items()
+                    if not (exclude and name.startswith(exclude)))
+        if best is None or total < best[1]:
+            best = (modules, total)
+    return best
+
+class ColdStartTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        precompile.precompile()
+
+    def test_single_yield_prediction_skips_numpy(self):
+        modules, total = best_import_times(os.path.join(SCRIPTS_DIR, 'predict_yield.py'), '50000')
+
+        self.assertNotIn('numpy', modules)
+        self.assertLess(total / 1000, YIELD_IMPORT_BUDGET_MS)
+
+    def test_yield_batch_still_uses_numpy(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            f.write('[5000, 50000]')
+        try:
+            modules, _ = import_times(os.path.join(SCRIPTS_DIR, 'predict_yield.py'),
+                                      '--batch', f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertIn('numpy', modules)
+
+    def test_risk_prediction_skips_optional_features(self):
+        modules, total = best_import_times(os.path.join(SCRIPTS_DIR, 'predict_risk.py'), '--json',
+                                           exclude='numpy')
+
+        for optional in ('asyncio', 'concurrent.futures.process'):
+            self.assertNotIn(optional, modules)
+        self.assertLess(total / 1000, RISK_EXTRA_IMPORT_BUDGET_MS)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""
+Columnar training data store: datasets written chunk by chunk read back
+as the original records, lazily memory-mapped columns, writer checks, and
+the dataset training paths against the in-memory ones
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import random
+import tempfile
+import contextlib
+import subprocess
+import unittest
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import numpy as np
+
+import columnar_store
+import records
+import synthetic
+import train_risk
+import train_yield
+
+DAYS = [f'2025-02-{day:02d}' for day in range(1, 15)]
+
+def random_positions(rng, count):
+    # Dyadic values keep chunked sums exact
+    return [{'id': f'pos_{i}', 'endDate': rng.choice(DAYS) + rng.choice(['', 'T12:00:00']),
+             'entryPrice': rng.choice([0.125, 0.25, 0.5]), 'shares': rng.choice([8.0, 64.0]),
+             'pnl': rng.choice([-16.0, -2.0, 0.0, 4.0]), 'status': 'open'}
+            for i in range(count)]
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+class ColumnarStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_positions(self, positions, chunk_size):
+        # Each chunk codes its end dates in its own first-appearance order
+        chunks = [records.PositionTable.from_dicts(positions[i:i + chunk_size])
+                  for i in range(0, len(positions), chunk_size)]
+        columnar_store.write_dataset(self.path('positions'), 'positions', chunks, len(positions))
+        return columnar_store.open_dataset(self.path('positions'), 'positions')
+
+    def test_positions_round_trip_across_chunks(self):
+        positions = random_positions(random.Random(1), 500)
+        dataset = self.write_positions(positions, 37)
+        self.assertEqual(len(dataset), 500)
+        self.assertEqual(dataset.end_dates, list(dict.fromkeys(p['endDate'] for p in positions)))
+        self.assertEqual(dataset.to_dicts(np.arange(500)), positions)
+        self.assertEqual(dataset.to_dicts([499, 3]), [positions[499], positions[3]])
+
+    def test_traders_round_trip(self):
+        chunks = list(synthetic.iter_trader_tables(300, 128, seed=2))
+        columnar_store.write_dataset(self.path('traders'), 'traders', chunks, 300)
+        dataset = columnar_store.open_dataset(self.path('traders'), 'traders')
+        self.assertEqual(dataset.to_dicts(np.arange(300)),
+                         [trader for chunk in chunks for trader in chunk.to_dicts()])
+
+    def test_columns_map_lazily(self):
+        dataset = self.write_positions(random_positions(random.Random(2), 100), 100)
+        self.assertEqual(dataset._columns, {})
+        pnl = dataset.column('pnl')
+        self.assertIsInstance(pnl, np.memmap)
+        self.assertFalse(pnl.flags.writeable)
+        self.assertEqual(list(dataset._columns), ['pnl'])
+        with self.assertRaises(KeyError):
+            dataset.column('category')
+
+    def test_iter_chunks(self):
+        dataset = self.write_positions(random_positions(random.Random(3), 100), 100)
+        chunks = list(dataset.iter_chunks(['pnl', 'end_code'], chunk_size=30, start=10))
+        self.assertEqual([len(chunk['pnl']) for chunk in chunks], [30, 30, 30])
+        self.assertEqual(set(chunks[0]), {'pnl', 'end_code', 'end_dates'})
+        self.assertTrue(np.shares_memory(chunks[0]['pnl'], dataset.column('pnl')))
+        self.assertEqual(np.concatenate([chunk['pnl'] for chunk in chunks]).tolist(),
+                         dataset.column('pnl')[10:].tolist())
+
+    def test_writer_checks(self):
+        positions = random_positions(random.Random(4), 10)
+        table = records.PositionTable.from_dicts(positions)
+
+        with self.assertRaises(ValueError):
+            columnar_store.DatasetWriter(self.path('bad'), 'orders', 10)
+        with self.assertRaises(ValueError):
+            columnar_store.write_dataset(self.path('short'), 'positions', [table], 11)
+        self.assertFalse(os.path.exists(self.path(os.path.join('short', 'manifest.json'))))
+        with self.assertRaises(ValueError):
+            columnar_store.write_dataset(self.path('long'), 'positions', [table, table], 15)
+        with self.assertRaises(ValueError):
+            columnar_store.write_dataset(self.path('narrow'), 'positions', [table], 10, id_width=4)
+
+        self.write_positions(positions, 10)
+        with self.assertRaises(ValueError):
+            columnar_store.open_dataset(self.path('positions'), 'traders')
+
+    def test_drawdown_analysis_matches_in_memory(self):
+        positions = random_positions(random.Random(5), 400)
+        dataset = self.write_positions(positions, 64)
+        end_dates = [datetime.strptime(day, '%Y-%m-%d') for day in DAYS]
+
+        expected = quietly(train_risk.analyze_drawdown_patterns, positions, end_dates)
+        for chunk_size in (1, 50, 10**6):
+            analysis, used = quietly(train_risk.analyze_drawdown_dataset, dataset, end_dates,
+                                     chunk_size)
+            self.assertEqual(analysis, expected, f'chunk {chunk_size}')
+            self.assertEqual(used, end_dates)
+
+        # Default end dates: every day the dataset refers to
+        analysis, used = quietly(train_risk.analyze_drawdown_dataset, dataset)
+        self.assertEqual(sorted(used), sorted(set(used)))
+        self.assertEqual(analysis, quietly(train_risk.analyze_drawdown_patterns, positions, used))
+
+    def test_allocation_matches_in_memory(self):
+        traders = synthetic.trader_table(5000, seed=6)
+        columnar_store.write_dataset(self.path('traders'), 'traders', [traders], 5000)
+        dataset = columnar_store.open_dataset(self.path('traders'))
+
+        expected = quietly(train_yield.calculate_optimal_allocation, traders.to_dicts())
+        for chunk_size in (7, 1000, 10**6):
+            self.assertEqual(quietly(train_yield.calculate_dataset_allocation, dataset, chunk_size),
+                             expected, f'chunk {chunk_size}')
+
+    def test_cli_import_and_info(self):
+        positions = random_positions(random.Random(7), 25)
+        source = self.path('book.ndjson')
+        with open(source, 'w') as f:
+            f.writelines(json.dumps(position) + '\n\n' for position in positions)
+        self.assertEqual(columnar_store.count_rows(source), 25)
+
+        script = os.path.join(SCRIPTS_DIR, 'columnar_store.py')
+        subprocess.run([sys.executable, script, 'import', 'positions', source,
+                        self.path('imported'), '--chunk-size', '10'],
+                       capture_output=True, text=True, check=True)
+        info = subprocess.run([sys.executable, script, 'info', self.path('imported')],
+                              capture_output=True, text=True, check=True)
+        self.assertEqual(json.loads(info.stdout)['count'], 25)
+        self.assertEqual(columnar_store.open_dataset(self.path('imported')).to_dicts(range(25)),
+                         positions)
+
+        missing = subprocess.run([sys.executable, script, 'info', self.path('missing')],
+                                 capture_output=True, text=True)
+        self.assertEqual(missing.returncode, 1)
+        self.assertTrue(missing.stderr.startswith('Error:'))
+
+if __name__ == '__main__':
+    unittest.main()
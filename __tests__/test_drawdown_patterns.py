@@ -0,0 +1,100 @@
+"""
+Drawdown pattern analysis: the grouped-reduction analyze_drawdown_patterns
+against the original per-date scan, independence from chunking, and
+offset timestamps counted on their UTC day
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import contextlib
+import random
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import records
+import train_risk
+
+DAYS = [f'2025-03-{day:02d}' for day in range(1, 11)]
+
+def reference_analysis(positions, end_dates):
+    """One scan over every position per end date, as the trainer was first written"""
+    analysis = {}
+    for end_date in end_dates:
+        date_str = end_date.strftime('%Y-%m-%d')
+        members = [p for p in positions if p['endDate'].startswith(date_str)]
+        if not members:
+            continue
+        total_value = sum(p['entryPrice'] * p['shares'] for p in members)
+        max_loss = min(p['pnl'] for p in members)
+        drawdown = abs(max_loss) / total_value if total_value > 0 else 0
+        analysis[date_str] = {
+            'total_positions': len(members),
+            'total_value': total_value,
+            'total_pnl': sum(p['pnl'] for p in members),
+            'max_loss': max_loss,
+            'drawdown_percentage': drawdown,
+            'risk_level': 'high' if drawdown > 0.04 else 'medium' if drawdown > 0.02 else 'low'
+        }
+    return analysis
+
+def random_positions(rng):
+    # Naive timestamps stay on their own day; dyadic values keep sums exact
+    return [{'id': i,
+             'endDate': rng.choice(DAYS) + rng.choice(['', 'T00:00:00', 'T23:59:59']),
+             'entryPrice': rng.choice([0.125, 0.25, 0.5, 0.875]),
+             'shares': rng.choice([16, 64, 200]),
+             'pnl': rng.choice([-20.0, -4.0, -0.5, 0.0, 3.0, 12.0])}
+            for i in range(rng.randrange(0, 150))]
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+class DrawdownPatternsTest(unittest.TestCase):
+    def test_matches_per_date_scan(self):
+        for seed in range(60):
+            rng = random.Random(seed)
+            positions = random_positions(rng)
+            end_dates = [datetime.strptime(day, '%Y-%m-%d')
+                         for day in rng.sample(DAYS, rng.randrange(1, len(DAYS)))]
+
+            expected = reference_analysis(positions, end_dates)
+            for source in (positions, records.PositionTable.from_dicts(positions)):
+                self.assertEqual(quietly(train_risk.analyze_drawdown_patterns, source, end_dates),
+                                 expected, f'seed {seed}')
+
+    def test_chunking_does_not_change_stats(self):
+        rng = random.Random(5)
+        positions = random_positions(rng) + random_positions(rng)
+        date_codes = train_risk.cluster_date_codes(
+            [datetime.strptime(day, '%Y-%m-%d') for day in DAYS])
+
+        whole = train_risk.drawdown_stats(
+            [records.PositionTable.from_dicts(positions).columns()], date_codes)
+        chunked = train_risk.drawdown_stats(
+            [records.PositionTable.from_dicts(positions[i:i + 7]).columns()
+             for i in range(0, len(positions), 7)], date_codes)
+        for name in whole:
+            self.assertEqual(chunked[name].tolist(), whole[name].tolist(), name)
+
+    def test_offset_timestamps_count_on_their_utc_day(self):
+        positions = [
+            {'id': 1, 'endDate': '2025-03-01T22:00:00-05:00', 'entryPrice': 0.5, 'shares': 100,
+             'pnl': -5.0},
+            {'id': 2, 'endDate': '2025-03-02', 'entryPrice': 0.5, 'shares': 100, 'pnl': 1.0},
+            {'id': 3, 'endDate': None, 'entryPrice': 0.5, 'shares': 100, 'pnl': -50.0}
+        ]
+        analysis = quietly(train_risk.analyze_drawdown_patterns, positions,
+                           [datetime(2025, 3, 1), datetime(2025, 3, 2)])
+        self.assertEqual(list(analysis), ['2025-03-02'])
+        self.assertEqual(analysis['2025-03-02']['total_positions'], 2)
+        self.assertEqual(analysis['2025-03-02']['max_loss'], -5.0)
+        self.assertEqual(analysis['2025-03-02']['drawdown_percentage'], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
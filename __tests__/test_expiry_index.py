@@ -0,0 +1,115 @@
+"""
+Expiry index: horizon, expired and undated rollups against a brute-force
+scan of the positions, unparsable end dates (missing endDate included)
+kept out of every horizon, and the same index from positions, a stream
+and a live RiskBook
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import io
+import sys
+import json
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import expiry_index
+import predict_risk
+import risk_book
+
+NOW = datetime(2025, 1, 10, 12)
+LABELS = ['2025-01-01', '2025-01-10', '2025-01-10T12:00:00', '2025-01-11T06:00:00+02:00',
+          '2025-01-15', '2025-02-01', '2025-04-30', None, 'next week']
+
+def expiry(label):
+    try:
+        value = datetime.fromisoformat(label)
+    except (TypeError, ValueError):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def random_positions(rng):
+    return [{'id': i, 'endDate': rng.choice(LABELS), 'entryPrice': rng.choice([0.25, 0.5, 0.75]),
+             'shares': rng.choice([4, 8, 100]), 'pnl': float(rng.randrange(-20, 20))}
+            for i in range(rng.randrange(1, 40))]
+
+def reference_totals(positions, keep):
+    chosen = [p for p in positions if keep(expiry(p['endDate']))]
+    return {
+        'clusters': len({p['endDate'] for p in chosen}),
+        'positions': len(chosen),
+        'total_value': round(sum(p['entryPrice'] * p['shares'] for p in chosen), 2),
+        'total_pnl': round(sum(p['pnl'] for p in chosen), 2)
+    }
+
+class ExpiryIndexTest(unittest.TestCase):
+    def test_rollups_match_reference(self):
+        for seed in range(40):
+            rng = random.Random(seed)
+            positions = random_positions(rng)
+            index = expiry_index.ExpiryIndex.from_positions(positions)
+
+            for days in (0.25, 1, 5, 30, 365):
+                end = NOW + timedelta(days=days)
+                rollup = index.horizon(days, NOW)
+                self.assertEqual(rollup.pop('days'), days)
+                next_expiry = rollup.pop('next_expiry')
+                expected = reference_totals(positions, lambda e: e is not None and NOW < e <= end)
+                self.assertEqual(rollup, expected, f'seed {seed}, {days} days')
+                if expected['clusters']:
+                    self.assertEqual(expiry(next_expiry), min(
+                        expiry(p['endDate']) for p in positions
+                        if expiry(p['endDate']) is not None and NOW < expiry(p['endDate'])))
+
+            self.assertEqual(index.expired(NOW),
+                             reference_totals(positions, lambda e: e is not None and e <= NOW),
+                             f'seed {seed}')
+            self.assertEqual(index.undated(), reference_totals(positions, lambda e: e is None),
+                             f'seed {seed}')
+
+    def test_missing_end_date_is_undated(self):
+        positions = [
+            {'id': 1, 'endDate': '2025-01-12', 'entryPrice': 0.5, 'shares': 10, 'pnl': -1.0},
+            {'id': 2, 'endDate': None, 'entryPrice': 0.5, 'shares': 20, 'pnl': 2.0},
+            {'id': 3, 'endDate': None, 'entryPrice': 0.25, 'shares': 4, 'pnl': 0.0}
+        ]
+        index = expiry_index.ExpiryIndex.from_positions(positions)
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.undated(), {'clusters': 1, 'positions': 2, 'total_value': 11.0,
+                                           'total_pnl': 2.0})
+        self.assertEqual(index.horizon(10000, NOW)['positions'], 1)
+        self.assertEqual(index.expired(datetime(2100, 1, 1))['positions'], 1)
+
+        only_undated = expiry_index.ExpiryIndex([None], [1.0], [0.0], [1])
+        self.assertEqual(only_undated.horizon(30, NOW)['clusters'], 0)
+        self.assertEqual(only_undated.undated()['clusters'], 1)
+
+    def test_sources_build_the_same_index(self):
+        rng = random.Random(11)
+        positions = random_positions(rng)
+        stream = io.StringIO(''.join(json.dumps(p) + '\n' for p in positions))
+        book = risk_book.RiskBook(predict_risk.default_model_data()['model_weights'])
+        for position in positions:
+            book.open_position(position)
+
+        indexes = [expiry_index.ExpiryIndex.from_positions(positions),
+                   expiry_index.ExpiryIndex.from_accumulator(predict_risk.accumulate_stream(stream)),
+                   expiry_index.ExpiryIndex.from_book(book)]
+        for index in indexes:
+            self.assertEqual(index.horizons((1, 30, 365), NOW),
+                             indexes[0].horizons((1, 30, 365), NOW))
+            self.assertEqual(index.expired(NOW), indexes[0].expired(NOW))
+            self.assertEqual(index.undated(), indexes[0].undated())
+
+    def test_parse_horizons(self):
+        self.assertEqual(expiry_index.parse_horizons('7, 30,0.5,'), [7, 30, 0.5])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Incremental risk training: statistics folded batch by batch against one
+pass over the whole history, the saved statistics file, and
+train_risk.py --incremental against a full retrain on the same dataset
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import random
+import tempfile
+import contextlib
+import subprocess
+import unittest
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import numpy as np
+
+import columnar_store
+import records
+import train_risk
+
+DAYS = [f'2025-04-{day:02d}' for day in range(1, 21)]
+
+def random_positions(rng, count, days=DAYS):
+    # Dyadic values keep the sums exact however the batches split
+    return [{'id': f'pos_{i}', 'endDate': rng.choice(days) + rng.choice(['', 'T08:00:00']),
+             'entryPrice': rng.choice([0.125, 0.25, 0.5]), 'shares': rng.choice([8.0, 64.0]),
+             'pnl': rng.choice([-40.0, -4.0, 0.0, 2.0, 6.0])}
+            for i in range(count)]
+
+def dates_of(positions):
+    return [datetime.strptime(day, '%Y-%m-%d')
+            for day in dict.fromkeys(p['endDate'][:10] for p in positions)]
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+class IncrementalStatsTest(unittest.TestCase):
+    def test_batches_match_full_history(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            # Later batches reach end dates the earlier ones never saw
+            batches = [random_positions(rng, rng.randrange(0, 80), DAYS[:5 + 5 * i])
+                       for i in range(4)]
+            history = [p for batch in batches for p in batch]
+
+            date_codes, stats = {}, train_risk.empty_drawdown_stats()
+            for batch in batches:
+                date_codes, stats = train_risk.update_position_stats(
+                    batch, dates_of(batch), date_codes, stats)
+
+            expected = quietly(train_risk.analyze_drawdown_patterns, history, dates_of(history))
+            self.assertEqual(train_risk.build_cluster_analysis(date_codes, stats), expected,
+                             f'seed {seed}')
+
+    def test_empty_clusters_hold_no_max_loss(self):
+        date_codes = {'2025-04-01': 0, '2025-04-02': 1}
+        old = {'sizes': [3, 0], 'total_values': [1.0, 0.0], 'total_pnls': [-1.0, 0.0],
+               'max_losses': [-5.0, 0.0]}
+        old = {name: np.array(values) for name, values in old.items()}
+        new = train_risk.drawdown_stats([records.PositionTable.from_dicts([
+            {'id': 1, 'endDate': '2025-04-02', 'entryPrice': 1.0, 'shares': 1, 'pnl': 7.0}
+        ]).columns()], date_codes)
+
+        merged = train_risk.merge_drawdown_stats(old, new)
+        # Only gains so far on 04-02: its worst PnL is the gain, not the 0.0 placeholder
+        self.assertEqual(merged['max_losses'].tolist(), [-5.0, 7.0])
+        self.assertEqual(merged['sizes'].tolist(), [3, 1])
+
+    def test_saved_stats_round_trip(self):
+        positions = random_positions(random.Random(1), 100)
+        date_codes, stats = train_risk.update_position_stats(
+            positions, dates_of(positions), {}, train_risk.empty_drawdown_stats())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = train_risk.stats_path(os.path.join(directory, 'risk_model.json'))
+            self.assertTrue(path.endswith('risk_model.stats.json'))
+            self.assertEqual(train_risk.load_training_stats(path)[0], {})
+
+            train_risk.save_training_stats(path, date_codes, stats, {'/data/a': 100})
+            loaded_codes, loaded_stats, checkpoints = train_risk.load_training_stats(path)
+            self.assertEqual(loaded_codes, date_codes)
+            self.assertEqual(checkpoints, {'/data/a': 100})
+            for name, values in stats.items():
+                self.assertEqual(loaded_stats[name].tolist(), values.tolist(), name)
+                self.assertEqual(loaded_stats[name].dtype, values.dtype, name)
+
+            # A file from another format version starts over
+            with open(path, 'w') as f:
+                json.dump({'format': -1, 'clusters': {}}, f)
+            self.assertEqual(train_risk.load_training_stats(path)[2], {})
+
+class IncrementalCliTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset = os.path.join(self.directory.name, 'positions')
+        self.positions = random_positions(random.Random(9), 600)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, count):
+        """(Re)write the append-only export with its first count rows"""
+        columnar_store.write_dataset(self.dataset, 'positions',
+                                     [records.PositionTable.from_dicts(self.positions[:count])],
+                                     count)
+
+    def train(self, model_name, *args):
+        env = dict(os.environ, MODEL_OUTPUT_PATH=os.path.join(self.directory.name, model_name))
+        env.pop('PREDICT_TIMINGS', None)
+        return subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'train_risk.py'), '--data', self.dataset,
+             '--chunk-size', '64', *args],
+            cwd=self.directory.name, env=env, capture_output=True, text=True)
+
+    def trained(self, model_name):
+        with open(os.path.join(self.directory.name, model_name)) as f:
+            model = json.load(f)
+        return model['model_weights'], model['training_data_summary']
+
+    def test_incremental_runs_match_a_full_retrain(self):
+        # The repeated 250 is a run with no new rows
+        for count in (250, 250, 600):
+            self.export(count)
+            self.assertEqual(self.train('incremental.json', '--incremental').returncode, 0)
+        self.assertEqual(self.train('full.json').returncode, 0)
+
+        self.assertEqual(self.trained('incremental.json'), self.trained('full.json'))
+        _, _, checkpoints = train_risk.load_training_stats(
+            os.path.join(self.directory.name, 'incremental.stats.json'))
+        self.assertEqual(checkpoints, {os.path.abspath(self.dataset): 600})
+
+    def test_shrunk_dataset_fails(self):
+        self.export(600)
+        self.assertEqual(self.train('model.json', '--incremental').returncode, 0)
+        self.export(100)
+        failed = self.train('model.json', '--incremental')
+        self.assertEqual(failed.returncode, 1)
+        self.assertIn('rerun without --incremental', failed.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
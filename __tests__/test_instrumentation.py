@@ -0,0 +1,160 @@
+"""
+Stage instrumentation: PREDICT_TIMINGS modes, per-stage records and where
+emit puts them, rolling latency histograms, and the _timings block in the
+prediction CLIs and server stats
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import contextlib
+import subprocess
+import unittest
+from unittest import mock
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import instrumentation
+import predict_server
+
+STAGE_FIELDS = ['name', 'wall_ms', 'cpu_ms', 'allocated_blocks', 'gc_collections']
+
+class TimingsModeTest(unittest.TestCase):
+    def test_env_values(self):
+        cases = {'': None, '0': None, 'off': None, 'False': None, '1': 'json', 'json': 'json',
+                 'yes': 'json', 'STDERR': 'stderr'}
+        for value, mode in cases.items():
+            with mock.patch.dict(os.environ, {instrumentation.ENV_VAR: value}):
+                self.assertEqual(instrumentation.timings_mode(), mode, repr(value))
+
+class StageTimerTest(unittest.TestCase):
+    def test_disabled_timer_records_nothing(self):
+        with mock.patch.dict(os.environ, {instrumentation.ENV_VAR: '0'}):
+            timer = instrumentation.StageTimer()
+        with timer.stage('work'):
+            pass
+        self.assertFalse(timer.enabled)
+        self.assertEqual(timer.stages, [])
+        self.assertEqual(timer.emit({'a': 1}, 'unchanged'), 'unchanged')
+
+    def test_stages_record_time_and_allocations(self):
+        timer = instrumentation.StageTimer(mode='json')
+        with timer.stage('build'):
+            kept = [[i] for i in range(10000)]
+        with self.assertRaises(ValueError):
+            with timer.stage('failing'):
+                raise ValueError('recorded anyway')
+
+        self.assertEqual([stage['name'] for stage in timer.stages], ['build', 'failing'])
+        build = timer.stages[0]
+        self.assertEqual(list(build), STAGE_FIELDS)
+        self.assertGreaterEqual(build['allocated_blocks'], len(kept))
+        self.assertGreaterEqual(build['wall_ms'], 0)
+
+        report = timer.report()
+        self.assertGreaterEqual(report['total_wall_ms'], build['wall_ms'])
+        self.assertIn('startup_ms', report)
+
+    def test_json_mode_adds_timings_block(self):
+        timer = instrumentation.StageTimer(mode='json')
+        with timer.stage('prediction'):
+            pass
+        output = json.loads(timer.emit({'apy': 5.0}, 'ignored', indent=2))
+        self.assertEqual(output['apy'], 5.0)
+        self.assertEqual(output['_timings']['stages'][0]['name'], 'prediction')
+
+    def test_stderr_mode_leaves_output_alone(self):
+        timer = instrumentation.StageTimer(mode='stderr')
+        with timer.stage('prediction'):
+            pass
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.assertEqual(timer.emit({'apy': 5.0}, 'original'), 'original')
+        self.assertEqual(json.loads(err.getvalue())['_timings']['stages'][0]['name'],
+                         'prediction')
+
+    def test_json_mode_without_result_goes_to_stderr(self):
+        timer = instrumentation.StageTimer(mode='json')
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            self.assertIsNone(timer.emit())
+        self.assertIn('_timings', json.loads(err.getvalue()))
+
+class LatencyHistogramTest(unittest.TestCase):
+    def test_percentiles_use_bucket_upper_bounds(self):
+        histogram = instrumentation.LatencyHistogram()
+        for _ in range(90):
+            histogram.record(0.0005)   # 500 us -> <= 0.512 ms
+        for _ in range(10):
+            histogram.record(0.1)      # 100 ms -> <= 131.072 ms
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 100)
+        self.assertEqual((snapshot['p50_ms'], snapshot['p95_ms'], snapshot['p99_ms']),
+                         (0.512, 131.072, 131.072))
+        self.assertEqual(snapshot['buckets_ms'], {'<=0.512': 90, '<=131.072': 10})
+
+    def test_huge_latencies_land_in_the_last_bucket(self):
+        histogram = instrumentation.LatencyHistogram()
+        histogram.record(10**6)
+        self.assertEqual(histogram.snapshot()['p99_ms'],
+                         (1 << (histogram.NUM_BUCKETS - 1)) / 1000)
+
+    def test_old_slots_roll_out_of_the_window(self):
+        histogram = instrumentation.LatencyHistogram(slots=3, slot_seconds=10)
+        with mock.patch.object(instrumentation.time, 'time', return_value=1000.0):
+            histogram.record(0.001)
+            self.assertEqual(histogram.snapshot()['count'], 1)
+        with mock.patch.object(instrumentation.time, 'time', return_value=1025.0):
+            histogram.record(0.001)
+            self.assertEqual(histogram.snapshot()['count'], 2)
+        with mock.patch.object(instrumentation.time, 'time', return_value=1030.0):
+            snapshot = histogram.snapshot()
+        self.assertEqual((snapshot['count'], snapshot['p50_ms']), (1, 1.024))
+
+        empty = instrumentation.LatencyHistogram().snapshot()
+        self.assertEqual((empty['count'], empty['p50_ms']), (0, None))
+
+class TimingsOutputTest(unittest.TestCase):
+    def run_yield(self, cwd, mode):
+        env = dict(os.environ, PREDICT_TIMINGS=mode,
+                   MODEL_OUTPUT_PATH=os.path.join(cwd, 'missing_model.json'))
+        return subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, 'predict_yield.py'),
+                               '50000'], cwd=cwd, env=env, capture_output=True, text=True,
+                              check=True)
+
+    def test_predict_yield_cli(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            timed = json.loads(self.run_yield(cwd, '1').stdout)
+            self.assertEqual([stage['name'] for stage in timed.pop('_timings')['stages']],
+                             ['model_load', 'prediction', 'serialization'])
+
+            result = self.run_yield(cwd, 'stderr')
+            self.assertNotIn('_timings', json.loads(result.stdout))
+            self.assertIn('_timings', json.loads(result.stderr.splitlines()[-1]))
+
+            plain = self.run_yield(cwd, '0')
+            self.assertNotIn('_timings', plain.stdout + plain.stderr)
+
+    def test_server_stats_keep_latencies_per_request_type(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = (os.path.join(directory, 'risk_model.json'),
+                     os.path.join(directory, 'yield_model.json'))
+            with mock.patch.dict(os.environ, {instrumentation.ENV_VAR: '1'}):
+                server = predict_server.PredictionServer(*paths)
+            for tvl in (1000, 2000, 3000):
+                server.handle_line(json.dumps({'id': tvl, 'type': 'yield', 'tvl': tvl}))
+            stats = json.loads(server.handle_line('{"id": 0, "type": "stats"}'))['result']
+            self.assertTrue(stats['enabled'])
+            self.assertEqual(stats['latency']['yield']['count'], 3)
+
+            with mock.patch.dict(os.environ, {instrumentation.ENV_VAR: '0'}):
+                server = predict_server.PredictionServer(*paths)
+            stats = json.loads(server.handle_line('{"id": 0, "type": "stats"}'))['result']
+            self.assertEqual(stats, {'enabled': False, 'memo': stats['memo']})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Prediction memoization: results are computed once per model version and
+input digest, stale versions and expired entries are dropped, the SQLite
+store is shared between caches, counters stay exact under threads, and the
+server memoizes risk but not yield requests
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import memo
+import predict_server
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class CountingCompute:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+class MemoCacheTest(unittest.TestCase):
+    def test_digest_ignores_key_order_and_covers_arrays(self):
+        self.assertEqual(memo.canonical_digest({'a': 1, 'b': [2, 3]}),
+                         memo.canonical_digest({'b': [2, 3], 'a': 1}))
+        self.assertNotEqual(memo.canonical_digest(np.arange(3)),
+                            memo.canonical_digest(np.arange(3, dtype=np.float64)))
+        self.assertNotEqual(memo.canonical_digest([1], [2]), memo.canonical_digest([1, 2]))
+
+    def test_computes_once_per_version_and_input(self):
+        cache = memo.MemoCache(8)
+        compute = CountingCompute({'score': 1})
+
+        for _ in range(3):
+            self.assertEqual(cache.memoize('risk', 'v1', {'x': 1}, compute), {'score': 1})
+        cache.memoize('risk', 'v1', {'x': 2}, compute)
+        self.assertEqual(compute.calls, 2)
+
+        # A new version drops the old entries and recomputes
+        cache.memoize('risk', 'v2', {'x': 1}, compute)
+        self.assertEqual(compute.calls, 3)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.snapshot()['hits'], 2)
+        self.assertEqual(cache.snapshot()['misses'], 3)
+
+    def test_lru_bound_and_ttl(self):
+        clock = Clock()
+        cache = memo.MemoCache(2, clock=clock)
+        compute = CountingCompute(1)
+        for x in range(3):
+            cache.memoize('risk', 'v1', x, compute)
+        self.assertEqual(len(cache), 2)
+        cache.memoize('risk', 'v1', 0, compute)
+        self.assertEqual(compute.calls, 4)
+
+        cache.memoize('tail_risk', 'v1', 'book', compute, ttl=10)
+        clock.now += 9
+        cache.memoize('tail_risk', 'v1', 'book', compute, ttl=10)
+        self.assertEqual(compute.calls, 5)
+        clock.now += 1
+        cache.memoize('tail_risk', 'v1', 'book', compute, ttl=10)
+        self.assertEqual(compute.calls, 6)
+
+    def test_disabled_cache_always_computes(self):
+        cache = memo.MemoCache(0)
+        compute = CountingCompute(1)
+        cache.memoize('risk', 'v1', 1, compute)
+        cache.memoize('risk', 'v1', 1, compute)
+        self.assertEqual(compute.calls, 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_store_is_shared_between_caches(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'memo.db')
+            first = memo.MemoCache(8, memo.MemoStore(path))
+            second = memo.MemoCache(8, memo.MemoStore(path))
+            try:
+                first.memoize('risk', 'v1', [1, 2], CountingCompute({'score': 3}))
+                compute = CountingCompute(None)
+                self.assertEqual(second.memoize('risk', 'v1', [1, 2], compute), {'score': 3})
+                self.assertEqual(compute.calls, 0)
+                self.assertEqual(second.snapshot()['store_hits'], 1)
+            finally:
+                first.store.close()
+                second.store.close()
+
+    def test_counters_are_exact_under_threads(self):
+        cache = memo.MemoCache(64)
+        threads, calls = 8, 2000
+
+        def work(offset):
+            for i in range(calls):
+                cache.memoize('risk', 'v1', (offset + i) % 32, lambda: i)
+
+        workers = [threading.Thread(target=work, args=(t,)) for t in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        stats = cache.snapshot()
+        self.assertEqual(stats['hits'] + stats['misses'], threads * calls)
+        self.assertGreaterEqual(stats['misses'], 32)
+
+class ServerMemoTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.server = predict_server.PredictionServer(
+            os.path.join(self.directory.name, 'risk_model.json'),
+            os.path.join(self.directory.name, 'yield_model.json'))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def request(self, **request):
+        response = json.loads(self.server.handle_line(json.dumps(request)))
+        self.assertTrue(response['ok'], response)
+        return response['result']
+
+    def test_yield_requests_are_not_memoized(self):
+        for _ in range(3):
+            self.request(type='yield', tvl=50000)
+            self.request(type='yield_batch', tvls=[5000, 50000, 500000])
+        stats = self.server.memo.snapshot()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (0, 0, 0))
+
+    def test_risk_requests_are_memoized(self):
+        positions = [{'id': 1, 'endDate': '2025-01-01', 'entryPrice': 0.5, 'shares': 100,
+                      'pnl': -10.0}]
+        first = self.request(type='risk', positions=positions)
+        second = self.request(type='risk', positions=positions)
+        self.assertEqual(first, second)
+        stats = self.server.memo.snapshot()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
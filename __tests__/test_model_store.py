@@ -0,0 +1,85 @@
+"""
+Model store: trained models and their compiled artifacts are written
+atomically, the cache serves the artifact of the newest version, and
+hot swaps show up through snapshot()
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import model_store
+
+class CountingCompiler:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, model):
+        self.calls += 1
+        return {'compiled_from': None if model is None else model['name']}
+
+class ModelStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.model_path = os.path.join(self.directory.name, 'risk_model.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_model_leaves_complete_files_and_a_fresh_artifact(self):
+        artifact = model_store.write_model(self.model_path, {'name': 'v1'}, 'risk',
+                                           {'compiled_from': 'v1'})
+
+        self.assertEqual(artifact, os.path.join(self.directory.name, 'risk_model.compiled.json'))
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         ['risk_model.compiled.json', 'risk_model.json'])
+        with open(self.model_path) as f:
+            self.assertEqual(json.load(f), {'name': 'v1'})
+        self.assertGreaterEqual(os.stat(artifact).st_mtime_ns,
+                                os.stat(self.model_path).st_mtime_ns)
+
+    def test_cache_serves_the_artifact_and_swaps_versions(self):
+        compile_fn = CountingCompiler()
+        cache = model_store.ModelCache(self.model_path, 'risk', compile_fn,
+                                       default={'name': 'default'})
+
+        self.assertEqual(cache.snapshot(), ({'compiled_from': 'default'}, 'default'))
+
+        model_store.write_model(self.model_path, {'name': 'v1'}, 'risk', {'compiled_from': 'v1'})
+        compiled, version = cache.snapshot()
+        self.assertEqual(compiled, {'compiled_from': 'v1'})
+        self.assertIsNotNone(version)
+        calls = compile_fn.calls
+
+        model_store.write_model(self.model_path, {'name': 'v2'}, 'risk', {'compiled_from': 'v2'})
+        os.utime(self.model_path, ns=(0, 0))  # JSON older than the artifact, whatever the clock
+        compiled, new_version = cache.snapshot()
+        self.assertEqual(compiled, {'compiled_from': 'v2'})
+        self.assertNotEqual(new_version, version)
+        # Served from the artifact: the JSON was never compiled
+        self.assertEqual(compile_fn.calls, calls)
+
+    def test_newer_json_is_compiled_directly(self):
+        compile_fn = CountingCompiler()
+        cache = model_store.ModelCache(self.model_path, 'risk', compile_fn)
+        model_store.write_model(self.model_path, {'name': 'v1'}, 'risk', {'compiled_from': 'v1'})
+
+        # Mid-save state: new JSON, artifact of the previous version
+        model_store.write_json(self.model_path, {'name': 'v2'})
+        artifact = model_store.artifact_path(self.model_path)
+        os.utime(artifact, ns=(0, 0))
+        self.assertEqual(cache.get(), {'compiled_from': 'v2'})
+
+    def test_artifact_of_another_kind_falls_back_to_the_json(self):
+        model_store.write_model(self.model_path, {'name': 'v1'}, 'yield', {'compiled_from': 'x'})
+        cache = model_store.ModelCache(self.model_path, 'risk', CountingCompiler())
+        self.assertEqual(cache.get(), {'compiled_from': 'v1'})
+
+if __name__ == '__main__':
+    unittest.main()
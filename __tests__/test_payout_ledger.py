@@ -0,0 +1,143 @@
+"""
+Payout ledger: integer-cent distribution against a pure-Python largest
+remainder reference (negative pools and int64-overflowing products
+included), and cent conservation across epochs and share updates
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import payout_ledger
+
+def reference_distribute(pool, shares):
+    """Largest remainder split of one pool in Python integers"""
+    total = sum(shares)
+    quotients = [pool * s // total for s in shares]
+    remainders = [pool * s - q * total for s, q in zip(shares, quotients)]
+    leftover = pool - sum(quotients)
+    for i in sorted(range(len(shares)), key=lambda i: (-remainders[i], i))[:leftover]:
+        quotients[i] += 1
+    return quotients
+
+def allocation_model(traders):
+    return {f'trader_{i}': {'fees_allocation': allocation, 'splits_allocation': allocation / 2}
+            for i, allocation in enumerate(traders)}
+
+class DistributeTest(unittest.TestCase):
+    def check(self, pools, shares, message):
+        payouts = payout_ledger.distribute(pools, shares)
+        self.assertEqual(payouts.dtype, np.int64)
+        expected = [reference_distribute(pool, shares) for pool in pools]
+        self.assertEqual(payouts.tolist(), expected, message)
+        self.assertEqual(payouts.sum(axis=1).tolist(), list(pools), message)
+
+    def test_matches_reference(self):
+        for seed in range(200):
+            rng = random.Random(seed)
+            shares = [rng.choice([0, 1, 3, 7, 100, 12345]) for _ in range(rng.randrange(1, 12))]
+            shares[rng.randrange(len(shares))] = rng.randrange(1, 1000)
+            pools = [rng.randrange(-10000, 10000) for _ in range(rng.randrange(1, 6))]
+            self.check(pools, shares, f'seed {seed}')
+
+    def test_negative_pools(self):
+        self.check([-7, -1, 0, 1, 7], [1, 1, 1], 'equal shares')
+        self.check([-1000001], [3, 5, 11], 'uneven shares')
+
+    def test_overflowing_products_use_long_division(self):
+        for seed in range(50):
+            rng = random.Random(seed)
+            shares = [rng.randrange(2 ** 40, 2 ** 58) for _ in range(rng.randrange(1, 6))]
+            pools = [rng.randrange(-2 ** 40, 2 ** 40) for _ in range(3)]
+            self.assertGreaterEqual(max(abs(p) for p in pools) * max(shares), 2 ** 63)
+            self.check(pools, shares, f'seed {seed}')
+
+    def test_rejects_share_totals_too_large_for_int64(self):
+        with self.assertRaises(ValueError):
+            payout_ledger.distribute([2 ** 40], [2 ** 61, 2 ** 61])
+
+class PayoutLedgerTest(unittest.TestCase):
+    def assert_conserved(self, ledger, fee_cents, split_cents, message):
+        for stream, cents in (('fees', fee_cents), ('splits', split_cents)):
+            units = sum(int((np.asarray(block, dtype=np.int64) @ ledger.bps[stream]).sum())
+                        for block in cents if len(block))
+            self.assertEqual(int(ledger.accrued[stream].sum()), ledger.distributed[stream], message)
+            self.assertEqual(ledger.distributed[stream] * payout_ledger.BPS
+                             + ledger.carry[stream], units, message)
+            self.assertGreaterEqual(ledger.carry[stream], 0, message)
+
+    def test_blocks_conserve_every_cent(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            model = allocation_model([rng.choice([0.0, 0.1, 0.3333, 0.55]) for _ in range(6)])
+            balances = [(f'lp_{i}', rng.randrange(1, 10 ** 6)) for i in range(rng.randrange(1, 8))]
+            fee_cents, split_cents = [], []
+            for _ in range(rng.randrange(1, 5)):
+                epochs = rng.randrange(0, 6)
+                fee_cents.append([[rng.randrange(0, 5000) for _ in range(6)]
+                                  for _ in range(epochs)])
+                split_cents.append([[rng.randrange(-3000, 5000) for _ in range(6)]
+                                    for _ in range(epochs)])
+
+            ledger = payout_ledger.accrue(model, balances, zip(fee_cents, split_cents))
+            self.assert_conserved(ledger, fee_cents, split_cents, f'seed {seed}')
+
+    def test_blocking_does_not_change_payouts(self):
+        rng = random.Random(9)
+        model = allocation_model([0.1, 0.25, 0.3333])
+        balances = [('a', 5), ('b', 7), ('c', 11)]
+        fees = [[rng.randrange(0, 999) for _ in range(3)] for _ in range(20)]
+        splits = [[rng.randrange(-500, 999) for _ in range(3)] for _ in range(20)]
+
+        whole = payout_ledger.accrue(model, balances, [(fees, splits)])
+        blocked = payout_ledger.accrue(model, balances, [(fees[i:i + 3], splits[i:i + 3])
+                                                         for i in range(0, 20, 3)])
+        self.assertEqual(whole.rows(), blocked.rows())
+        self.assertEqual(whole.summary(), blocked.summary())
+
+    def test_share_updates_apply_from_their_epoch(self):
+        model = allocation_model([0.5])
+        ledger = payout_ledger.PayoutLedger(model, [('a', 1), ('b', 1)])
+        ledger.add_epoch_records([
+            {'epoch': 1, 'fees': {'trader_0': 400}},
+            {'epoch': 2, 'fees': {'trader_0': 400}, 'shares': {'b': 0, 'c': 3}},
+            {'epoch': 3, 'fees': {'trader_0': 400, 'unknown': 999}}
+        ])
+
+        rows = {row['lp']: row for row in ledger.rows()}
+        # 200 cents per epoch: split 1:1, then 1:3 between a and c
+        self.assertEqual(rows['a']['fees_cents'], 100 + 50 + 50)
+        self.assertEqual(rows['b']['fees_cents'], 100)
+        self.assertEqual(rows['c']['fees_cents'], 150 + 150)
+        self.assertEqual(rows['b']['shares'], 0)
+        self.assertEqual(ledger.distributed['fees'], 600)
+        self.assertEqual(ledger.revenue['fees'], 1200)
+
+    def test_pools_wait_while_nobody_holds_shares(self):
+        model = allocation_model([1.0])
+        ledger = payout_ledger.PayoutLedger(model, [('a', 0)])
+        ledger.add_epochs([[300]], [[0]])
+        self.assertEqual(ledger.accrued['fees'].tolist(), [0])
+        self.assertEqual(ledger.carry['fees'], 300 * payout_ledger.BPS)
+
+        ledger.set_shares([('a', 1)])
+        ledger.add_epochs([[0]], [[0]])
+        self.assertEqual(ledger.accrued['fees'].tolist(), [300])
+        self.assertEqual(ledger.carry['fees'], 0)
+
+    def test_rejects_bad_input(self):
+        ledger = payout_ledger.PayoutLedger(allocation_model([0.5]))
+        with self.assertRaises(ValueError):
+            ledger.set_shares([('a', -1)])
+        with self.assertRaises(ValueError):
+            ledger.add_epoch_records([{'fees': {'trader_0': 1.5}}])
+
+if __name__ == '__main__':
+    unittest.main()
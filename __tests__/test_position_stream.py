@@ -0,0 +1,89 @@
+"""
+Streaming position input: NDJSON streams folded chunk by chunk score the
+same as the whole book in memory, under every chunk size and cluster
+window, and the --positions CLI reads files and stdin alike
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import predict_risk
+
+def random_positions(rng, count):
+    # Dyadic values keep chunked sums exact
+    return [{'id': i, 'endDate': f'2025-0{rng.randrange(1, 4)}-{rng.randrange(1, 29):02d}',
+             'entryPrice': rng.choice([0.125, 0.25, 0.5]), 'shares': rng.choice([8, 40, 100]),
+             'pnl': rng.choice([-64.0, -8.0, 0.0, 16.0]),
+             'category': rng.choice(['sports', 'politics', None])}
+            for i in range(count)]
+
+def ndjson(positions, blank_lines=False):
+    separator = '\n\n' if blank_lines else '\n'
+    return separator.join(json.dumps(p) for p in positions) + '\n'
+
+class PositionStreamTest(unittest.TestCase):
+    def test_stream_matches_in_memory_scoring(self):
+        for seed in range(10):
+            rng = random.Random(seed)
+            positions = random_positions(rng, rng.randrange(1, 300))
+            for spec in ('exact', 'weekly', 'rolling:5'):
+                for by_category in (False, True):
+                    model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                                         drawdown_threshold=0.1, cluster_window=spec,
+                                         cluster_by_category=by_category)
+                    expected = predict_risk.generate_risk_prediction(
+                        predict_risk.assess_cluster_risk(positions, model_weights), model_weights)
+
+                    for chunk_size in (1, 7, 10000):
+                        stream = io.StringIO(ndjson(positions, blank_lines=seed % 2 == 0))
+                        self.assertEqual(
+                            predict_risk.stream_risk_prediction(stream, model_weights, chunk_size),
+                            expected, f'seed {seed}, {spec}, {by_category}, chunk {chunk_size}')
+
+    def test_accumulator_counts_positions(self):
+        positions = random_positions(random.Random(1), 50)
+        accumulator = predict_risk.accumulate_stream(io.StringIO(ndjson(positions)), 8)
+        self.assertEqual(accumulator.positions_seen, 50)
+        self.assertEqual(int(accumulator.cluster_size.sum()), 50)
+        self.assertEqual(accumulator.end_dates, list(dict.fromkeys(p['endDate'] for p in positions)))
+
+    def test_chunks_are_bounded(self):
+        chunks = list(predict_risk.iter_position_chunks(
+            io.StringIO(ndjson(random_positions(random.Random(2), 25))), 10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+    def test_cli_reads_files_and_stdin(self):
+        text = ndjson(random_positions(random.Random(3), 40))
+        with tempfile.TemporaryDirectory() as cwd:
+            path = os.path.join(cwd, 'book.ndjson')
+            with open(path, 'w') as f:
+                f.write(text)
+            env = dict(os.environ, MODEL_OUTPUT_PATH=os.path.join(cwd, 'missing_model.json'))
+            env.pop('PREDICT_TIMINGS', None)
+
+            outputs = [subprocess.run(
+                [sys.executable, os.path.join(SCRIPTS_DIR, 'predict_risk.py'),
+                 '--positions', source, '--chunk-size', '6'],
+                cwd=cwd, env=env, input=text, capture_output=True, text=True, check=True).stdout
+                for source in (path, '-')]
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(json.loads(outputs[0])['metrics']['clusterSize'],
+                         max(predict_risk.assess_cluster_risk(
+                             [json.loads(line) for line in text.splitlines()], {}),
+                             key=lambda a: a['cluster_size'])['cluster_size'])
+
+if __name__ == '__main__':
+    unittest.main()
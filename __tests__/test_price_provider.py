@@ -0,0 +1,194 @@
+"""
+Price provider tests against a local stand-in for app/api/midpoint/[tokenId]
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import price_provider
+
+class MidpointHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        # /api/midpoint/<tokenId> or the upstream /markets/<tokenId>/midpoint
+        parts = self.path.strip('/').split('/')
+        token_id = parts[1] if parts[0] == 'markets' else parts[-1]
+        with server.lock:
+            server.hits[token_id] = server.hits.get(token_id, 0) + 1
+            server.clients.add(self.client_address)
+            server.active += 1
+            server.peak_active = max(server.peak_active, server.active)
+
+        time.sleep(server.delay)
+
+        with server.lock:
+            server.active -= 1
+
+        if token_id.startswith('missing'):
+            status, payload = 500, {'error': 'Failed to fetch midpoint', 'tokenId': token_id,
+                                    'yesPrice': 0.5, 'noPrice': 0.5}
+        else:
+            price = server.prices.get(token_id, 0.5)
+            status, payload = 200, {'tokenId': token_id, 'yesPrice': price,
+                                    'noPrice': round(1 - price, 4), 'timestamp': 1}
+
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MidpointServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs when the pool opens its connections at once
+    request_queue_size = 64
+
+class PriceProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = MidpointServer(('127.0.0.1', 0), MidpointHandler)
+        self.server.lock = threading.Lock()
+        self.server.hits = {}
+        self.server.clients = set()
+        self.server.active = 0
+        self.server.peak_active = 0
+        self.server.delay = 0.02
+        self.server.prices = {f'tok{i}': round(0.05 + i / 100, 2) for i in range(40)}
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        self.source = f'http://127.0.0.1:{self.server.server_address[1]}/api/midpoint'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_provider(self, scenario, **options):
+        async def run():
+            async with price_provider.PriceProvider(self.source, **options) as provider:
+                result = await scenario(provider)
+                return result, provider
+        return asyncio.run(run())
+
+    def test_midpoint_shape(self):
+        midpoints = price_provider.fetch_midpoints(['tok3'], self.source)
+        self.assertEqual(midpoints, {'tok3': {'tokenId': 'tok3', 'yesPrice': 0.08,
+                                              'noPrice': 0.92, 'timestamp': 1}})
+
+    def test_zero_price_is_kept(self):
+        # A resolved-NO market trades at 0; only a missing field falls back
+        midpoint = price_provider.parse_midpoint('t', json.dumps({'yesPrice': 0, 'noPrice': 1}))
+        self.assertEqual((midpoint['yesPrice'], midpoint['noPrice']), (0.0, 1.0))
+
+        midpoint = price_provider.parse_midpoint('t', json.dumps({'yes_price': 0.0}))
+        self.assertEqual((midpoint['yesPrice'], midpoint['noPrice']),
+                         (0.0, price_provider.FALLBACK_PRICE))
+
+    def test_url_template(self):
+        port = self.server.server_address[1]
+        source = f'http://127.0.0.1:{port}/markets/{{tokenId}}/midpoint'
+        midpoints = price_provider.fetch_midpoints(['tok1'], source)
+        self.assertEqual(midpoints['tok1']['yesPrice'], 0.06)
+
+    def test_pool_bounds_connections(self):
+        tokens = [f'tok{i}' for i in range(40)]
+        midpoints, provider = self.run_provider(lambda p: p.get_midpoints(tokens),
+                                                max_connections=4)
+
+        self.assertEqual(len(midpoints), 40)
+        self.assertLessEqual(self.server.peak_active, 4)
+        self.assertLessEqual(provider.pool.peak_active, 4)
+        # Keep-alive: connections are reused rather than opened per request
+        self.assertLessEqual(provider.pool.opened, 4)
+        self.assertLessEqual(len(self.server.clients), 4)
+        self.assertEqual(provider.stats['rounds'], 1)
+
+    def test_concurrent_lookups_are_deduplicated(self):
+        async def scenario(provider):
+            return await asyncio.gather(
+                *(provider.get_midpoint('tok7') for _ in range(10)),
+                provider.get_midpoints(['tok7', 'tok8', 'tok7']))
+
+        results, provider = self.run_provider(scenario)
+
+        self.assertEqual(self.server.hits, {'tok7': 1, 'tok8': 1})
+        self.assertTrue(all(r['yesPrice'] == 0.12 for r in results[:10]))
+        self.assertEqual(sorted(results[10]), ['tok7', 'tok8'])
+        self.assertEqual(provider.stats['requests'], 2)
+
+    def test_single_lookups_share_a_round(self):
+        async def scenario(provider):
+            return await asyncio.gather(*(provider.get_midpoint(f'tok{i}') for i in range(10)))
+
+        _, provider = self.run_provider(scenario, batch_window=0.01)
+        self.assertEqual(provider.stats['rounds'], 1)
+
+    def test_cache_serves_until_ttl_expires(self):
+        now = [0.0]
+
+        async def scenario(provider):
+            await provider.get_midpoints(['tok1', 'tok2'])
+            await provider.get_midpoints(['tok1', 'tok2'])
+            now[0] = 10.0
+            await provider.get_midpoint('tok1')
+
+        _, provider = self.run_provider(scenario, ttl=5.0, clock=lambda: now[0])
+
+        self.assertEqual(self.server.hits, {'tok1': 2, 'tok2': 1})
+        self.assertEqual(provider.stats['cache_hits'], 2)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = price_provider.TTLCache(ttl=60, max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_failed_tokens_are_left_out(self):
+        midpoints, provider = self.run_provider(
+            lambda p: p.get_midpoints(['tok1', 'missing1']))
+
+        self.assertEqual(list(midpoints), ['tok1'])
+        self.assertEqual(provider.stats['errors'], 1)
+        # Errors are not cached
+        self.assertEqual(len(provider.cache), 1)
+
+        with self.assertRaises(price_provider.PriceError):
+            self.run_provider(lambda p: p.get_midpoint('missing2'))
+
+    def test_reprice_book(self):
+        positions = [
+            {'id': 'a', 'tokenId': 'tok10', 'endDate': '2026-01-01', 'entryPrice': 0.1,
+             'shares': 100, 'pnl': 0.0},
+            {'id': 'b', 'tokenId': 'tok10', 'endDate': '2026-01-01', 'entryPrice': 0.2,
+             'shares': 50, 'pnl': 0.0},
+            {'id': 'c', 'endDate': '2026-01-02', 'entryPrice': 0.3, 'shares': 10, 'pnl': 4.0},
+        ]
+
+        repriced = price_provider.reprice_book(positions, self.source)
+
+        self.assertEqual(repriced, 2)
+        self.assertEqual(self.server.hits, {'tok10': 1})
+        self.assertEqual(positions[0]['currentPrice'], 0.15)
+        self.assertAlmostEqual(positions[0]['pnl'], 5.0)
+        self.assertAlmostEqual(positions[1]['pnl'], -2.5)
+        self.assertNotIn('currentPrice', positions[2])
+        self.assertEqual(positions[2]['pnl'], 4.0)
+
+if __name__ == '__main__':
+    unittest.main()
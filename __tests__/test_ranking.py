@@ -0,0 +1,164 @@
+"""
+Ranking index: random updates, removals, rank lookups and leaderboard pages
+against a sorted reference, and the allocation top list against
+train_yield.select_top_traders
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import ranking
+import train_yield
+
+# Few distinct scores so ties are common
+SCORES = [-1.0, 0.0, 0.25, 0.5, 0.5, 1.0, 2.5]
+
+class Reference:
+    """Sorted-list model of RankingIndex: (-score, first-added sequence) order"""
+
+    def __init__(self):
+        self.keys = {}
+        self.next_sequence = 0
+
+    def update(self, trader_id, score):
+        if trader_id in self.keys:
+            self.keys[trader_id] = (-score, self.keys[trader_id][1])
+        else:
+            self.keys[trader_id] = (-score, self.next_sequence)
+            self.next_sequence += 1
+
+    def remove(self, trader_id):
+        return self.keys.pop(trader_id, None) is not None
+
+    def ordered(self):
+        return sorted(self.keys, key=self.keys.get)
+
+    def entries(self, count, offset=0):
+        ordered = self.ordered()
+        return [(rank, trader_id, -self.keys[trader_id][0])
+                for rank, trader_id in enumerate(ordered[offset:offset + count], offset + 1)]
+
+def trader(rng, trader_id):
+    # Dyadic stats, so ROI * win rate is exact in float32 and float64 alike
+    return {
+        'id': trader_id,
+        'roi': rng.choice([-0.5, 0.0, 0.25, 0.5, 1.5]),
+        'fees_earned': 10.0,
+        'splits_earned': 5.0,
+        'total_trades': 100,
+        'win_rate': rng.choice([0.25, 0.5, 0.625, 1.0]),
+        'avg_position_size': 100.0,
+        'trading_days': 30
+    }
+
+class RankingIndexTest(unittest.TestCase):
+    def assert_matches(self, index, reference, rng, message):
+        self.assertEqual(len(index), len(reference.keys), message)
+        self.assertEqual(index.entries(len(reference.keys) + 5),
+                         reference.entries(len(reference.keys) + 5), message)
+
+        for rank, trader_id in enumerate(reference.ordered(), 1):
+            self.assertEqual(index.rank(trader_id), rank, message)
+            self.assertEqual(index.score(trader_id), -reference.keys[trader_id][0], message)
+
+        for _ in range(3):
+            count, offset = rng.randrange(0, 8), rng.randrange(0, len(reference.keys) + 3)
+            self.assertEqual(index.entries(count, offset), reference.entries(count, offset),
+                             message)
+
+    def test_random_operations_match_reference(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            index = ranking.RankingIndex(seed)
+            reference = Reference()
+
+            for step in range(300):
+                trader_id = f'0x{rng.randrange(60):040x}'
+                action = rng.random()
+                if action < 0.7:
+                    score = rng.choice(SCORES)
+                    index.update(trader_id, score)
+                    reference.update(trader_id, score)
+                else:
+                    self.assertEqual(index.remove(trader_id), reference.remove(trader_id))
+                self.assertEqual(trader_id in index, trader_id in reference.keys)
+
+                if step % 10 == 0:
+                    self.assert_matches(index, reference, rng, f'seed {seed}, step {step}')
+            self.assert_matches(index, reference, rng, f'seed {seed}, end')
+
+    def test_load_matches_incremental_updates(self):
+        rng = random.Random(3)
+        entries = [(f'trader_{rng.randrange(200)}', rng.choice(SCORES), None)
+                   for _ in range(500)]
+
+        loaded = ranking.RankingIndex(1).load(entries)
+        updated = ranking.RankingIndex(2)
+        reference = Reference()
+        for trader_id, score, record in entries:
+            updated.update(trader_id, score, record)
+            reference.update(trader_id, score)
+
+        expected = reference.entries(len(reference.keys))
+        self.assertEqual(loaded.entries(len(loaded)), expected)
+        self.assertEqual(updated.entries(len(updated)), expected)
+
+        # Incremental updates on top of a bulk load keep the list consistent
+        for trader_id, score, _ in entries[:100]:
+            loaded.update(trader_id, -score)
+            reference.update(trader_id, -score)
+        self.assertEqual(loaded.entries(len(loaded)), reference.entries(len(reference.keys)))
+
+    def test_ties_keep_first_added_order(self):
+        index = ranking.RankingIndex(0)
+        for trader_id in ('a', 'b', 'c'):
+            index.update(trader_id, 1.0)
+        index.update('a', 2.0)
+        index.update('a', 1.0)
+        index.update('d', 1.0)
+        self.assertEqual([trader_id for _, trader_id, _ in index.entries(4)],
+                         ['a', 'b', 'c', 'd'])
+
+        # A removed trader comes back behind the traders it tied with
+        index.remove('a')
+        index.update('a', 1.0)
+        self.assertEqual([trader_id for _, trader_id, _ in index.entries(4)],
+                         ['b', 'c', 'd', 'a'])
+        self.assertIsNone(index.rank('missing'))
+        self.assertFalse(index.remove('missing'))
+
+    def test_top_adds_rank_and_score_to_records(self):
+        rng = random.Random(5)
+        traders = [trader(rng, f'trader_{i}') for i in range(10)]
+        index = ranking.RankingIndex.from_traders(traders)
+
+        page = index.top(3, offset=2)
+        self.assertEqual([entry['rank'] for entry in page], [3, 4, 5])
+        for entry, (_, trader_id, score) in zip(page, index.entries(3, 2)):
+            self.assertEqual(entry['id'], trader_id)
+            self.assertEqual(entry['score'], score)
+            self.assertEqual(entry['roi'] * entry['win_rate'], score)
+
+        # Updating without a record keeps the stored one
+        index.update('trader_0', 100.0)
+        self.assertEqual(index.top(1)[0]['roi'], traders[0]['roi'])
+
+    def test_top_records_match_select_top_traders(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            traders = [trader(rng, f'0x{i:040x}') for i in range(rng.randrange(1, 120))]
+            index = ranking.RankingIndex.from_traders(traders, seed)
+
+            for k in (1, 5, train_yield.TOP_TRADERS, len(traders) + 1):
+                expected = [t['id'] for t in train_yield.select_top_traders(traders, k)]
+                self.assertEqual([t['id'] for t in index.top_records(k)], expected,
+                                 f'seed {seed}, k {k}')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Compact record layer: PositionTable and TraderTable round trips through
+the dict shape, first-appearance end date and category codes, column
+views, and the packed record size
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import records
+
+POSITIONS = [
+    {'id': 'p1', 'endDate': '2025-01-02', 'entryPrice': 0.5, 'currentPrice': 0.75,
+     'shares': 100.0, 'pnl': 25.0, 'status': 'open', 'category': 'sports'},
+    {'id': 'p2', 'endDate': '2025-01-01', 'entryPrice': 0.25, 'shares': 40.0, 'pnl': -10.0,
+     'status': 'closed'},
+    {'id': 'p3', 'endDate': '2025-01-02', 'entryPrice': 0.125, 'shares': 8.0, 'pnl': 0.0,
+     'status': 'resolved', 'category': 'politics'}
+]
+
+TRADERS = [
+    {'id': '0xabc', 'roi': 12.5, 'fees_earned': 100.0, 'splits_earned': 20.0,
+     'total_trades': 40, 'win_rate': 0.75, 'avg_position_size': 500.0, 'trading_days': 30},
+    {'id': '0xdef0123', 'roi': -3.0, 'fees_earned': 0.0, 'splits_earned': 0.0,
+     'total_trades': 2, 'win_rate': 0.5, 'avg_position_size': 50.0, 'trading_days': 1}
+]
+
+class PositionTableTest(unittest.TestCase):
+    def test_round_trip(self):
+        table = records.PositionTable.from_dicts(POSITIONS)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table.to_dicts(), POSITIONS)
+
+    def test_end_dates_and_categories_coded_in_first_appearance_order(self):
+        table = records.PositionTable.from_dicts(POSITIONS)
+        self.assertEqual(table.end_dates, ['2025-01-02', '2025-01-01'])
+        self.assertEqual(table.records['end_code'].tolist(), [0, 1, 0])
+        self.assertEqual(table.categories, ['sports', None, 'politics'])
+        self.assertEqual(table.category_codes.tolist(), [0, 1, 2])
+
+    def test_uncategorized_books_carry_no_category_columns(self):
+        positions = [{k: v for k, v in p.items() if k != 'category'} for p in POSITIONS]
+        table = records.PositionTable.from_dicts(positions)
+        self.assertIsNone(table.category_codes)
+        self.assertNotIn('category_code', table.columns())
+        self.assertEqual(table.to_dicts(), positions)
+
+    def test_defaults_for_optional_fields(self):
+        table = records.PositionTable.from_dicts(
+            [{'id': 7, 'endDate': None, 'entryPrice': 1, 'shares': 2, 'pnl': 0}])
+        position, = table.to_dicts()
+        self.assertEqual(position, {'id': '7', 'endDate': None, 'entryPrice': 1.0,
+                                    'shares': 2.0, 'pnl': 0.0, 'status': 'open'})
+
+    def test_columns_are_views(self):
+        table = records.PositionTable.from_dicts(POSITIONS)
+        columns = table.columns()
+        self.assertTrue(np.shares_memory(columns['pnl'], table.records))
+        self.assertEqual(columns['end_dates'], table.end_dates)
+        self.assertEqual(columns['categories'], table.categories)
+
+    def test_empty_table(self):
+        table = records.PositionTable.from_dicts([])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.to_dicts(), [])
+
+    def test_packed_record_size(self):
+        table = records.PositionTable.from_dicts(POSITIONS)
+        # Two-byte ids: 2 + int32 + four float64 + uint8
+        self.assertEqual(table.records.dtype.itemsize, 2 + 4 + 4 * 8 + 1)
+
+class TraderTableTest(unittest.TestCase):
+    def test_round_trip(self):
+        table = records.TraderTable.from_dicts(TRADERS)
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.to_dicts(), TRADERS)
+        self.assertEqual(table.to_dicts([1]), TRADERS[1:])
+
+    def test_id_width_fits_longest_id(self):
+        table = records.TraderTable.from_dicts(TRADERS)
+        self.assertEqual(table.records.dtype['id'], np.dtype('S9'))
+
+    def test_scores(self):
+        table = records.TraderTable.from_dicts(TRADERS)
+        self.assertEqual(table.scores().tolist(),
+                         [t['roi'] * t['win_rate'] for t in TRADERS])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Batch risk scoring: one grouped pass over trader-tagged positions against
+one single-portfolio run per trader, on dense and sparse (trader, end date)
+key spaces, plus the --batch CLI
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+import unittest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import predict_risk
+
+MODEL_DATA = {'model_weights': dict(predict_risk.default_model_data()['model_weights'],
+                                    drawdown_threshold=0.05)}
+
+def tagged_positions(rng, count, num_traders, num_end_dates, trader_key='trader'):
+    return [{'id': i,
+             trader_key: f'0x{rng.randrange(num_traders):04x}',
+             'endDate': f'2025-01-{rng.randrange(1, num_end_dates + 1):02d}',
+             'entryPrice': rng.choice([0.1, 0.25, 0.333, 0.5, 0.9]),
+             'shares': rng.choice([1, 5, 40, 250]),
+             'pnl': rng.choice([-80.0, -12.5, -1.0, 0.0, 3.3, 40.0])}
+            for i in range(count)]
+
+def single_trader_predictions(positions, trader_key='trader'):
+    model_weights = MODEL_DATA['model_weights']
+    portfolios = {}
+    for position in positions:
+        portfolios.setdefault(position[trader_key], []).append(position)
+    return {trader: predict_risk.generate_risk_prediction(
+                predict_risk.assess_cluster_risk(own, model_weights), model_weights)
+            for trader, own in portfolios.items()}
+
+class RiskBatchTest(unittest.TestCase):
+    def test_dense_key_space(self):
+        for seed in range(20):
+            positions = tagged_positions(random.Random(seed), 400, 8, 3)
+            batch = predict_risk.predict_risk_batch(MODEL_DATA, positions)
+            self.assertEqual(batch, single_trader_predictions(positions), f'seed {seed}')
+
+    def test_sparse_key_space(self):
+        # Many traders and end dates: far more (trader, end date) keys than positions
+        for seed in range(5):
+            positions = tagged_positions(random.Random(seed), 300, 300, 28)
+            columns = predict_risk.trader_columns(positions)
+            self.assertGreater(len(columns['traders']) * len(columns['end_dates']),
+                               4 * len(positions) + 1024)
+            batch = predict_risk.predict_risk_batch(MODEL_DATA, positions)
+            self.assertEqual(batch, single_trader_predictions(positions), f'seed {seed}')
+
+    def test_traders_come_back_in_first_appearance_order(self):
+        positions = tagged_positions(random.Random(3), 100, 20, 5)
+        batch = predict_risk.predict_risk_batch(MODEL_DATA, positions)
+        self.assertEqual(list(batch), list(dict.fromkeys(p['trader'] for p in positions)))
+
+    def test_groups_follow_single_trader_cluster_order(self):
+        positions = [
+            {'id': 1, 'trader': 'b', 'endDate': 'd2', 'entryPrice': 1.0, 'shares': 1, 'pnl': 0.0},
+            {'id': 2, 'trader': 'a', 'endDate': 'd1', 'entryPrice': 1.0, 'shares': 2, 'pnl': 0.0},
+            {'id': 3, 'trader': 'b', 'endDate': 'd1', 'entryPrice': 1.0, 'shares': 4, 'pnl': 0.0},
+            {'id': 4, 'trader': 'b', 'endDate': 'd2', 'entryPrice': 1.0, 'shares': 8, 'pnl': 0.0}
+        ]
+        groups = predict_risk.aggregate_trader_clusters(predict_risk.trader_columns(positions))
+        # Trader b (code 0) first: d2 then d1; then trader a
+        self.assertEqual(groups['trader_code'].tolist(), [0, 0, 1])
+        self.assertEqual(groups['end_code'].tolist(), [0, 1, 1])
+        self.assertEqual(groups['total_value'].tolist(), [9.0, 4.0, 2.0])
+        self.assertEqual(groups['cluster_size'].tolist(), [2, 1, 1])
+
+    def test_custom_trader_key_and_missing_key(self):
+        positions = tagged_positions(random.Random(4), 60, 5, 4, trader_key='wallet')
+        self.assertEqual(predict_risk.predict_risk_batch(MODEL_DATA, positions, 'wallet'),
+                         single_trader_predictions(positions, 'wallet'))
+        with self.assertRaises(KeyError):
+            predict_risk.predict_risk_batch(MODEL_DATA, positions)
+
+    def test_empty_batch(self):
+        self.assertEqual(predict_risk.predict_risk_batch(MODEL_DATA, []), {})
+
+class RiskBatchCliTest(unittest.TestCase):
+    def run_batch(self, cwd, source, text, *args):
+        env = dict(os.environ, MODEL_OUTPUT_PATH=os.path.join(cwd, 'missing_model.json'))
+        env.pop('PREDICT_TIMINGS', None)
+        return subprocess.run(
+            [sys.executable, os.path.join(SCRIPTS_DIR, 'predict_risk.py'), '--batch', source,
+             *args], cwd=cwd, env=env, input=text, capture_output=True, text=True)
+
+    def test_files_and_stdin(self):
+        positions = tagged_positions(random.Random(6), 200, 10, 6)
+        text = ''.join(json.dumps(position) + '\n' for position in positions)
+        with tempfile.TemporaryDirectory() as cwd:
+            path = os.path.join(cwd, 'batch.ndjson')
+            with open(path, 'w') as f:
+                f.write(text)
+            outputs = [self.run_batch(cwd, source, text) for source in (path, '-')]
+
+        self.assertEqual(outputs[0].stdout, outputs[1].stdout)
+        expected = predict_risk.predict_risk_batch(predict_risk.default_model_data(), positions)
+        self.assertEqual(json.loads(outputs[0].stdout), json.loads(json.dumps(expected)))
+
+    def test_missing_trader_field_fails(self):
+        text = json.dumps({'id': 1, 'endDate': 'd', 'entryPrice': 1.0, 'shares': 1,
+                           'pnl': 0.0}) + '\n'
+        with tempfile.TemporaryDirectory() as cwd:
+            failed = self.run_batch(cwd, '-', text)
+        self.assertEqual(failed.returncode, 1)
+        self.assertIn("Position without trader field 'trader'", failed.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+RiskBook equivalence: after any sequence of opens, closes and reprices the
+incremental book must answer what a full recompute over its live positions
+does, up to the cent the two summation orders can differ by after rounding
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import time
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import predict_risk
+import risk_book
+
+END_DATES = ['2025-01-01', '2025-01-02', '2025-01-02T22:00:00-05:00', '2025-01-09',
+             '2025-02-01', '2025-03-15']
+CATEGORIES = ['sports', 'politics', 'crypto']
+
+def random_position(rng, position_id, end_dates=END_DATES):
+    # Coarse prices and PnLs so equal drawdowns (drawdownDate ties) come up often
+    position = {
+        'id': position_id,
+        'endDate': rng.choice(end_dates),
+        'entryPrice': rng.choice([0.1, 0.25, 0.3, 0.333, 0.5, 0.7]),
+        'shares': rng.choice([1, 3, 7, 10, 33, 100]),
+        'pnl': rng.choice([-30.0, -10.0, -3.3, -1.0, 0.0, 0.7, 5.0])
+    }
+    if rng.random() < 0.8:
+        position['category'] = rng.choice(CATEGORIES)
+    return position
+
+# Rounded metrics may differ by a cent between integer and float summation
+CENT = 0.01 + 1e-9
+
+class RiskBookEquivalenceTest(unittest.TestCase):
+    def assert_matches_recompute(self, prediction, positions, model_weights, message=''):
+        assessments = predict_risk.assess_cluster_risk(list(positions.values()), model_weights)
+        expected = predict_risk.generate_risk_prediction(assessments, model_weights)
+
+        for field in ('alert', 'message', 'severity', 'recommendations'):
+            self.assertEqual(prediction[field], expected[field], message)
+        metrics, expected_metrics = prediction['metrics'], expected['metrics']
+        for field in ('clusterSize', 'concentrationRisk', 'threshold'):
+            self.assertEqual(metrics[field], expected_metrics[field], message)
+        for field in ('maxDrawdown', 'maxSinglePosition'):
+            self.assertAlmostEqual(metrics[field], expected_metrics[field], delta=CENT,
+                                   msg=message)
+        self.assertAlmostEqual(metrics['totalExposure'], expected_metrics['totalExposure'],
+                               delta=CENT * max(len(assessments), 1), msg=message)
+
+        # Equal drawdowns may tie differently once a cent apart
+        if expected_metrics['drawdownDate'] is None:
+            self.assertIsNone(metrics['drawdownDate'], message)
+        else:
+            worst = {a['end_date'] for a in assessments if a['risk_level'] == 'high' and
+                     a['drawdown_percentage'] >= expected_metrics['maxDrawdown'] - CENT}
+            self.assertIn(metrics['drawdownDate'], worst, message)
+
+    def run_trial(self, seed, model_weights, steps=120, end_dates=END_DATES):
+        rng = random.Random(seed)
+        book = risk_book.RiskBook(model_weights)
+        reference = {}  # position_id -> dict, in book order
+
+        for step in range(steps):
+            action = rng.random()
+            if action < 0.5 or not reference:
+                position_id = f'pos_{rng.randrange(40)}'
+                position = random_position(rng, position_id, end_dates)
+                book.open_position(position)
+                reference.pop(position_id, None)  # a reopened position moves to the end
+                reference[position_id] = position
+            elif action < 0.7:
+                position_id = rng.choice(list(reference))
+                book.close_position(position_id)
+                del reference[position_id]
+            else:
+                position_id = rng.choice(list(reference))
+                update = random_position(rng, position_id, end_dates)
+                if rng.random() < 0.5:
+                    book.reprice_position(position_id, update['pnl'])
+                    reference[position_id] = dict(reference[position_id], pnl=update['pnl'])
+                else:
+                    book.reprice_position(position_id, update['pnl'], update['entryPrice'],
+                                          update['shares'])
+                    reference[position_id] = dict(reference[position_id], pnl=update['pnl'],
+                                                  entryPrice=update['entryPrice'],
+                                                  shares=update['shares'])
+
+            self.assert_matches_recompute(book.prediction(), reference, model_weights,
+                                          f'seed {seed}, step {step}')
+
+    def test_matches_full_recompute(self):
+        model_weights = predict_risk.default_model_data()['model_weights']
+        for seed in range(100):
+            self.run_trial(seed, model_weights)
+
+    def test_matches_full_recompute_with_high_risk_clusters(self):
+        # A low threshold puts most losing clusters in the high-risk branch
+        model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                             drawdown_threshold=0.05)
+        for seed in range(100):
+            self.run_trial(seed, model_weights)
+
+    def test_matches_full_recompute_with_cluster_windows(self):
+        # Unparsable end dates fall back to exact clusters under every window
+        end_dates = END_DATES + [None, 'next week']
+        for window in ('daily', 'weekly', 'rolling:3', 'exact'):
+            for by_category in (False, True):
+                model_weights = dict(predict_risk.default_model_data()['model_weights'],
+                                     drawdown_threshold=0.05, cluster_window=window,
+                                     cluster_by_category=by_category)
+                for seed in range(30):
+                    self.run_trial(seed, model_weights, steps=60, end_dates=end_dates)
+
+    def test_cluster_assessment(self):
+        book = risk_book.RiskBook()
+        positions = [random_position(random.Random(seed), f'pos_{seed}') for seed in range(30)]
+        for position in positions:
+            book.open_position(position)
+
+        end_date = positions[0]['endDate']
+        members = [p for p in positions if p['endDate'] == end_date]
+        expected = predict_risk.assess_cluster_risk(members, book.model_weights)[0]
+        expected['max_single_position'] = round(
+            max(p['entryPrice'] * p['shares'] for p in members), 2)
+        assessment = book.cluster_assessment(end_date)
+        self.assertEqual(assessment.keys(), expected.keys())
+        for field, value in expected.items():
+            if isinstance(value, float):
+                self.assertAlmostEqual(assessment[field], value, delta=CENT, msg=field)
+            else:
+                self.assertEqual(assessment[field], value, field)
+        self.assertIsNone(book.cluster_assessment('1999-01-01'))
+
+    def test_set_model_weights_rescores_clusters(self):
+        rng = random.Random(7)
+        positions = {f'pos_{i}': random_position(rng, f'pos_{i}') for i in range(50)}
+        book = risk_book.RiskBook()
+        for position in positions.values():
+            book.open_position(position)
+
+        model_weights = dict(book.model_weights, drawdown_threshold=0.05)
+        book.set_model_weights(model_weights)
+        self.assert_matches_recompute(book.prediction(), positions, model_weights)
+
+    def test_set_model_weights_regroups_by_category(self):
+        rng = random.Random(11)
+        positions = {f'pos_{i}': random_position(rng, f'pos_{i}') for i in range(50)}
+        book = risk_book.RiskBook()
+        for position in positions.values():
+            book.open_position(position)
+
+        base = dict(book.model_weights, drawdown_threshold=0.05)
+        for model_weights in (dict(base, cluster_window='weekly', cluster_by_category=True),
+                              dict(base, cluster_window='daily'), base):
+            book.set_model_weights(model_weights)
+            self.assert_matches_recompute(book.prediction(), positions, model_weights)
+
+    def test_updates_do_not_rescan_the_cluster(self):
+        # 30k positions in one cluster: O(1) updates finish in well under a second,
+        # re-summing the cluster on each update takes tens of seconds
+        book = risk_book.RiskBook()
+        start = time.perf_counter()
+        for i in range(30000):
+            book.open_position({'id': i, 'endDate': '2025-01-01', 'entryPrice': 0.5,
+                                'shares': 10, 'pnl': -1.0})
+        for i in range(30000):
+            book.reprice_position(i, 0.5)
+        self.assertLess(time.perf_counter() - start, 5.0)
+        self.assertEqual(book.cluster_assessment('2025-01-01')['total_pnl'], 15000.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+Synthetic data generator: seed reproducibility, field ranges and id
+shapes, cluster distributions and fixed cluster sizes, and the NDJSON and
+.npy writers (library and CLI)
+
+Run with: python -m pytest -q __tests__
+"""
+
+import io
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import unittest
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+import numpy as np
+
+import synthetic
+
+BASE_DATE = datetime(2025, 1, 1)
+
+class PositionGeneratorTest(unittest.TestCase):
+    def test_seed_reproducibility(self):
+        first, _ = synthetic.position_table(5000, seed=7, base_date=BASE_DATE)
+        again, _ = synthetic.position_table(5000, seed=7, base_date=BASE_DATE)
+        other, _ = synthetic.position_table(5000, seed=8, base_date=BASE_DATE)
+        self.assertEqual(first.records.tobytes(), again.records.tobytes())
+        self.assertNotEqual(first.records.tobytes(), other.records.tobytes())
+
+        chunked = [table.records for table, _ in synthetic.iter_position_tables(
+            5000, chunk_size=1000, seed=7, base_date=BASE_DATE)]
+        rechunked = [table.records for table, _ in synthetic.iter_position_tables(
+            5000, chunk_size=1000, seed=7, base_date=BASE_DATE)]
+        self.assertEqual(np.concatenate(chunked).tobytes(), np.concatenate(rechunked).tobytes())
+
+    def test_field_ranges(self):
+        table, dates = synthetic.position_table(20000, seed=1, num_clusters=30,
+                                                base_date=BASE_DATE)
+        recs = table.records
+        self.assertEqual(len(dates), 30)
+        self.assertTrue(((recs['end_code'] >= 0) & (recs['end_code'] < 30)).all())
+        self.assertTrue(((recs['entry_price'] >= 0.1) & (recs['entry_price'] < 1.0)).all())
+        self.assertTrue(((recs['current_price'] >= 0.05) & (recs['current_price'] < 1.2)).all())
+        self.assertTrue(((recs['shares'] >= 10) & (recs['shares'] < 1000)).all())
+        np.testing.assert_allclose(
+            recs['pnl'], (recs['current_price'] - recs['entry_price']) * recs['shares'])
+
+        drawn, _ = synthetic.position_table(1000, seed=1, base_date=BASE_DATE,
+                                            pnl_range=(-500, 200))
+        self.assertTrue(np.isnan(drawn.records['current_price']).all())
+        self.assertTrue(((drawn.records['pnl'] >= -500) & (drawn.records['pnl'] < 200)).all())
+
+    def test_end_dates_and_ids(self):
+        table, dates = synthetic.position_table(
+            12, seed=3, num_clusters=3, base_date=BASE_DATE, spread_days=7, offset_days=2,
+            date_format='%Y-%m-%d')
+        self.assertEqual(table.end_dates, ['2025-01-03', '2025-01-10', '2025-01-17'])
+        self.assertEqual(dates[0], datetime(2025, 1, 3))
+        self.assertEqual(table.records['id'][[0, 11]].tolist(), [b'pos_0', b'pos_11'])
+        self.assertEqual(table.records.dtype['id'], np.dtype('S6'))
+
+        self.assertEqual(synthetic.hex_ids(255, 2).tolist(),
+                         [b'0x' + b'0' * 38 + b'ff', b'0x' + b'0' * 37 + b'100'])
+
+    def test_cluster_sizes_fix_the_clusters(self):
+        table, _ = synthetic.position_table(0, seed=2, cluster_sizes=[3, 0, 2],
+                                            base_date=BASE_DATE)
+        self.assertEqual(table.records['end_code'].tolist(), [0, 0, 0, 2, 2])
+        self.assertEqual(len(table.end_dates), 3)
+
+    def test_cluster_distributions(self):
+        rng = synthetic.make_rng(0)
+        front = np.bincount(synthetic.cluster_codes(rng, 100000, 50, 'front', skew=3.0),
+                            minlength=50)
+        self.assertGreater(front[:5].sum(), 3 * front[-5:].sum())
+
+        zipf = np.sort(np.bincount(synthetic.cluster_codes(rng, 100000, 50, 'zipf'),
+                                   minlength=50))[::-1]
+        self.assertGreater(zipf[0], 10 * zipf[-1])
+
+        self.assertAlmostEqual(synthetic.cluster_weights(10, 'front').sum(), 1.0)
+        with self.assertRaises(ValueError):
+            synthetic.cluster_weights(10, 'bimodal')
+
+    def test_empty_request_keeps_end_dates(self):
+        (table, dates), = list(synthetic.iter_position_tables(0, num_clusters=4,
+                                                              base_date=BASE_DATE))
+        self.assertEqual((len(table), len(table.end_dates), len(dates)), (0, 4, 4))
+
+class TraderGeneratorTest(unittest.TestCase):
+    def test_seeded_traders(self):
+        table = synthetic.trader_table(10000, seed=5)
+        self.assertEqual(table.records.tobytes(),
+                         synthetic.trader_table(10000, seed=5).records.tobytes())
+
+        recs = table.records
+        self.assertTrue(((recs['win_rate'] >= 0) & (recs['win_rate'] <= 1)).all())
+        self.assertTrue(((recs['total_trades'] >= 10) & (recs['total_trades'] < 200)).all())
+        self.assertTrue(((recs['trading_days'] >= 30) & (recs['trading_days'] < 365)).all())
+        self.assertTrue((recs['fees_earned'] >= 0).all())
+        self.assertAlmostEqual(float(recs['roi'].mean()), 0.12, places=2)
+
+        chunks = list(synthetic.iter_trader_tables(2500, chunk_size=1000, seed=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [1000, 1000, 500])
+        self.assertEqual(chunks[1].records['id'][0], synthetic.hex_ids(1000, 1)[0])
+
+class WriterTest(unittest.TestCase):
+    def test_ndjson_and_npy_agree(self):
+        def tables():
+            return (table for table, _ in synthetic.iter_position_tables(
+                2500, chunk_size=1000, seed=4, base_date=BASE_DATE))
+
+        out = io.StringIO()
+        self.assertEqual(synthetic.write_ndjson(tables(), out), 2500)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.npy')
+            self.assertEqual(synthetic.write_npy(tables(), path, 2500), 2500)
+            loaded = synthetic.load_npy_positions(path)
+            self.assertIsInstance(loaded.records, np.memmap)
+            self.assertEqual(loaded.to_dicts(), lines)
+
+    def test_cli_output_is_reproducible(self):
+        with tempfile.TemporaryDirectory() as cwd:
+            outputs = []
+            for name in ('a.ndjson', 'b.ndjson'):
+                subprocess.run(
+                    [sys.executable, os.path.join(SCRIPTS_DIR, 'synthetic.py'), 'traders',
+                     '--count', '300', '--seed', '9', '--chunk-size', '128', '--output', name],
+                    cwd=cwd, capture_output=True, text=True, check=True)
+                with open(os.path.join(cwd, name)) as f:
+                    outputs.append(f.read())
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(len(outputs[0].splitlines()), 300)
+
+            failed = subprocess.run(
+                [sys.executable, os.path.join(SCRIPTS_DIR, 'synthetic.py'), 'positions',
+                 '--count', '10', '--format', 'npy'],
+                cwd=cwd, capture_output=True, text=True)
+            self.assertEqual(failed.returncode, 1)
+            self.assertIn('needs an --output path', failed.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
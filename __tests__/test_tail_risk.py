@@ -0,0 +1,102 @@
+"""
+Tail risk: simulated clusters follow the risk model's cluster window and
+category split, closed positions neither count nor anchor a window, fully
+correlated clusters resolve together, and seeded runs repeat
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import clustering
+import records
+import tail_risk
+
+def position(i, end_date, category=None, status='open', price=0.5, shares=100):
+    result = {'id': i, 'endDate': end_date, 'entryPrice': price, 'shares': shares, 'pnl': 0.0,
+              'status': status}
+    if category is not None:
+        result['category'] = category
+    return result
+
+BOOK = [
+    position(1, '2025-01-06', 'sports'),
+    position(2, '2025-01-07', 'politics'),
+    position(3, '2025-01-08T10:00:00', 'sports'),
+    position(4, '2025-01-13', 'sports'),
+    position(5, None, 'sports'),
+    position(6, '2025-01-14', 'politics', status='closed'),
+]
+
+def cluster_keys(result):
+    return [(c['end_date'], c.get('category')) for c in result['clusters']]
+
+class TailRiskClusterTest(unittest.TestCase):
+    def assess(self, positions, **options):
+        return tail_risk.assess_tail_risk(positions, scenarios=200, seed=1, **options)
+
+    def test_clusters_follow_the_model_window(self):
+        open_book = [p for p in BOOK if p['status'] == 'open']
+        for spec in ('exact', 'daily', 'weekly', 'rolling:3'):
+            for by_category in (False, True):
+                window = clustering.ClusterWindow.parse(spec)
+                categories = [p['category'] for p in open_book] if by_category else None
+                keys, key_categories, _ = clustering.cluster_groups(
+                    [p['endDate'] for p in open_book], {'n': np.ones(len(open_book))}, window,
+                    categories)
+                expected = list(zip(keys, key_categories or [None] * len(keys)))
+
+                for source in (BOOK, records.PositionTable.from_dicts(BOOK)):
+                    result = self.assess(source, cluster_window=spec, by_category=by_category)
+                    self.assertEqual(cluster_keys(result), expected, f'{spec}, {by_category}')
+
+    def test_weekly_clusters_by_category(self):
+        result = self.assess(BOOK, cluster_window='weekly', by_category=True)
+        self.assertEqual(cluster_keys(result), [('2025-01-06', 'sports'),
+                                                ('2025-01-06', 'politics'),
+                                                ('2025-01-13', 'sports'),
+                                                (None, 'sports')])
+
+    def test_options_come_from_model_weights(self):
+        options = tail_risk.tail_risk_options({'cluster_window': 'rolling:3',
+                                               'cluster_by_category': True}, scenarios=10)
+        self.assertEqual((options['cluster_window'], options['by_category'], options['scenarios']),
+                         ('rolling:3', True, 10))
+        self.assertEqual(tail_risk.tail_risk_options({})['cluster_window'], 'exact')
+
+    def test_closed_positions_do_not_anchor_windows(self):
+        positions = [position(1, '2025-01-01', status='closed'), position(2, '2025-01-02'),
+                     position(3, '2025-01-04')]
+        result = self.assess(positions, cluster_window='rolling:3')
+        # [02, 05) from the first open expiry; a closed anchor would split 02 and 04
+        self.assertEqual(cluster_keys(result), [('2025-01-02', None)])
+
+    def test_fully_correlated_window_resolves_together(self):
+        positions = [position(i, f'2025-01-0{day}') for i, day in enumerate((6, 7, 8))]
+        columns = tail_risk.open_positions(positions)
+        book = tail_risk.prepare_book(columns, clustering.ClusterWindow.parse('weekly'))
+        self.assertEqual(book['labels'], ['2025-01-06'])
+
+        pnl = tail_risk.simulate_cluster_pnl(book, 400, correlation=1.0, seed=3)
+        # All three markets resolve YES or all NO: +150 or -150, never in between
+        self.assertEqual(sorted(set(np.round(pnl[:, 0], 6).tolist())), [-150.0, 150.0])
+
+    def test_seeded_runs_repeat(self):
+        first = self.assess(BOOK, cluster_window='daily')
+        second = self.assess(BOOK, cluster_window='daily')
+        self.assertEqual(first, second)
+        self.assertGreaterEqual(first['expected_shortfall'], first['value_at_risk'])
+
+    def test_empty_book(self):
+        result = self.assess([position(1, '2025-01-01', status='closed')],
+                             cluster_window='weekly')
+        self.assertEqual((result['value_at_risk'], result['clusters']), (0.0, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Sharded yield training: partial top-k selection against a full stable
+sort, sharded rankings and allocation tiers against the single-table path,
+and clear errors for trader records missing ranking fields
+
+Run with: python -m pytest -q __tests__
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import numpy as np
+
+import train_yield
+
+def trader(rng, i):
+    # Few distinct values so score ties are common
+    return {'id': f'0x{i:040x}', 'roi': rng.choice([-0.5, 0.0, 0.25, 0.5, 1.5]),
+            'win_rate': rng.choice([0.25, 0.5, 1.0]), 'fees_earned': 10.0,
+            'splits_earned': 5.0, 'total_trades': 100, 'avg_position_size': 100.0,
+            'trading_days': 30}
+
+class TopKTest(unittest.TestCase):
+    def test_matches_stable_sort(self):
+        for seed in range(100):
+            rng = np.random.default_rng(seed)
+            scores = rng.choice([-1.0, 0.0, 0.5, 2.0], size=int(rng.integers(0, 60)))
+            for k in (1, 5, 20, 100):
+                self.assertEqual(train_yield.top_k_indices(scores, k).tolist(),
+                                 np.argsort(-scores, kind='stable')[:k].tolist(),
+                                 f'seed {seed}, k {k}')
+
+class ShardedRankingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_shards(self, traders, count):
+        paths = []
+        size = -(-len(traders) // count)
+        for shard in range(count):
+            rows = traders[shard * size:(shard + 1) * size]
+            suffix = '.ndjson' if shard % 2 else '.json'
+            path = os.path.join(self.directory.name, f'shard_{shard}{suffix}')
+            with open(path, 'w') as f:
+                if suffix == '.ndjson':
+                    f.writelines(json.dumps(row) + '\n' for row in rows)
+                else:
+                    json.dump(rows, f)
+            paths.append(path)
+        return paths
+
+    def test_shards_match_single_table(self):
+        for seed in range(10):
+            rng = random.Random(seed)
+            traders = [trader(rng, i) for i in range(rng.randrange(1, 200))]
+            paths = self.write_shards(traders, rng.randrange(1, 6))
+
+            total, top = train_yield.rank_sharded_traders(paths, workers=1)
+            expected = train_yield.select_top_traders(traders)
+            self.assertEqual(total, len(traders))
+            self.assertEqual([t['id'] for t in top], [t['id'] for t in expected], f'seed {seed}')
+            self.assertEqual(train_yield.allocate_ranked_traders(top),
+                             train_yield.allocate_ranked_traders(expected), f'seed {seed}')
+
+    def test_process_pool_matches_serial(self):
+        rng = random.Random(3)
+        paths = self.write_shards([trader(rng, i) for i in range(300)], 3)
+        self.assertEqual(train_yield.rank_sharded_traders(paths, workers=2),
+                         train_yield.rank_sharded_traders(paths, workers=1))
+
+    def test_missing_ranking_fields_are_reported(self):
+        path = os.path.join(self.directory.name, 'bad.ndjson')
+        with open(path, 'w') as f:
+            f.write(json.dumps({'id': 'a', 'roi': 0.1, 'win_rate': 0.5}) + '\n')
+            f.write(json.dumps({'roi': 0.2}) + '\n')
+
+        with self.assertRaises(ValueError) as context:
+            train_yield.shard_top_traders(path)
+        self.assertEqual(str(context.exception),
+                         f'{path}: trader record 2 missing id, win_rate')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,7 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs';
 import path from 'path';
-import { spawn } from 'child_process';
+import predictionServer from '../../../lib/services/predictionServer';
 
 // Simple in-memory cache
 const cache = new Map();
@@ -11,55 +11,23 @@ const CACHE_TTL = 5 * 60 * 1000; // 5 minutes
 // Model paths
 const RISK_MODEL_PATH = path.join(process.cwd(), 'models', 'risk_model.json');
 
-// Predict risk using ML model via Python
+// Predict risk using ML model via the long-lived Python prediction server
 async function predictRiskWithML(modelData) {
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python', [
-      path.join(process.cwd(), 'scripts', 'predict_risk.py')
-    ], {
-      cwd: process.cwd(),
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-
-    let output = '';
-    let errorOutput = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
-        try {
-          const prediction = JSON.parse(output.trim());
-          resolve({
-            alert: prediction.alert,
-            message: prediction.message,
-            severity: prediction.severity,
-            metrics: prediction.metrics,
-            recommendations: prediction.recommendations,
-            lastUpdated: new Date().toISOString(),
-            modelUsed: true
-          });
-        } catch (parseError) {
-          console.error('Failed to parse risk prediction:', parseError);
-          resolve(generateRuleBasedRisk());
-        }
-      } else {
-        console.error('Risk ML prediction failed:', errorOutput);
-        resolve(generateRuleBasedRisk());
-      }
-    });
-
-    pythonProcess.on('error', (error) => {
-      console.error('Python process error:', error);
-      resolve(generateRuleBasedRisk());
-    });
-  });
+  try {
+    const prediction = await predictionServer.request('risk');
+    return {
+      alert: prediction.alert,
+      message: prediction.message,
+      severity: prediction.severity,
+      metrics: prediction.metrics,
+      recommendations: prediction.recommendations,
+      lastUpdated: new Date().toISOString(),
+      modelUsed: true
+    };
+  } catch (error) {
+    console.error('Risk ML prediction failed:', error.message);
+    return generateRuleBasedRisk();
+  }
 }
 
 // Rule-based risk calculation (fallback)
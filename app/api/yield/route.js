@@ -2,7 +2,7 @@
 import { NextResponse } from 'next/server';
 import fs from 'fs';
 import path from 'path';
-import { spawn } from 'child_process';
+import predictionServer from '../../../lib/services/predictionServer';
 import Redis from 'ioredis';
 
 // Redis client for production caching
@@ -24,6 +24,8 @@ const CACHE_TTL = 30 * 1000; // 30 seconds
 
 // Model paths
 const YIELD_MODEL_PATH = path.join(process.cwd(), 'models', 'yield_model.json');
+const YIELD_HISTORY_PATH = path.join(process.cwd(), 'models', 'yield_history.npy');
+const CHART_POINTS = 30;
 
 export async function GET(request) {
   try {
@@ -121,61 +123,47 @@ export async function GET(request) {
   }
 }
 
-// Predict yield using ML model via Python
+// Predict yield using ML model via the long-lived Python prediction server
 async function predictWithMLModel(tvl, modelData) {
-  return new Promise((resolve, reject) => {
-    const pythonProcess = spawn('python', [
-      path.join(process.cwd(), 'scripts', 'predict_yield.py'),
-      tvl.toString()
-    ], {
-      cwd: process.cwd(),
-      stdio: ['pipe', 'pipe', 'pipe']
-    });
-
-    let output = '';
-    let errorOutput = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString();
-    });
+  try {
+    const prediction = await predictionServer.request('yield', { tvl });
+    return {
+      apy: prediction.apy,
+      aiOptimized: true,
+      aiInsight: prediction.ai_insight,
+      breakdown: modelData.breakdown_ratios,
+      aiRecommendations: {
+        fees: prediction.recommended_fees,
+        splits: prediction.recommended_splits,
+        description: prediction.recommendation_description
+      },
+      chartData: await loadChartData(),
+      lastUpdated: new Date().toISOString(),
+      modelUsed: true
+    };
+  } catch (error) {
+    console.error('ML prediction failed:', error.message);
+    return generateRuleBasedYield(tvl);
+  }
+}
 
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
-        try {
-          const prediction = JSON.parse(output.trim());
-          resolve({
-            apy: prediction.apy,
-            aiOptimized: true,
-            aiInsight: prediction.ai_insight,
-            breakdown: modelData.breakdown_ratios,
-            aiRecommendations: {
-              fees: prediction.recommended_fees,
-              splits: prediction.recommended_splits,
-              description: prediction.recommendation_description
-            },
-            chartData: generateChartData(),
-            lastUpdated: new Date().toISOString(),
-            modelUsed: true
-          });
-        } catch (parseError) {
-          console.error('Failed to parse ML prediction:', parseError);
-          resolve(generateRuleBasedYield(tvl));
-        }
-      } else {
-        console.error('ML prediction failed:', errorOutput);
-        resolve(generateRuleBasedYield(tvl));
-      }
-    });
+// Chart series backtested over recorded TVL history by the prediction server,
+// or random data when no history has been recorded
+async function loadChartData() {
+  if (!fs.existsSync(YIELD_HISTORY_PATH)) {
+    return generateChartData();
+  }
 
-    pythonProcess.on('error', (error) => {
-      console.error('Python process error:', error);
-      resolve(generateRuleBasedYield(tvl));
+  try {
+    const backtest = await predictionServer.request('yield_backtest', {
+      history_file: YIELD_HISTORY_PATH,
+      points: CHART_POINTS
     });
-  });
+    return backtest.chart;
+  } catch (error) {
+    console.warn('Yield backtest failed, using generated chart data:', error.message);
+    return generateChartData();
+  }
 }
 
 // Rule-based yield calculation (fallback)
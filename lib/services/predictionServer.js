@@ -0,0 +1,140 @@
+/**
+ * Prediction Server Client
+ * Keeps one long-lived scripts/predict_server.py process per Node worker and
+ * multiplexes NDJSON requests over its stdin/stdout, so API routes no longer
+ * pay Python startup and model loading on every call
+ */
+
+import { spawn } from 'child_process';
+import path from 'path';
+import readline from 'readline';
+
+class PredictionServerClient {
+  constructor() {
+    this.scriptPath = path.join(process.cwd(), 'scripts', 'predict_server.py');
+    this.riskModelPath = path.join(process.cwd(), 'models', 'risk_model.json');
+    this.yieldModelPath = path.join(process.cwd(), 'models', 'yield_model.json');
+    // Default timeout, and longer ones for requests that simulate or replay history
+    this.requestTimeout = 5000;
+    this.requestTimeouts = {
+      risk_batch: 30000,
+      tail_risk: 30000,
+      yield_backtest: 60000
+    };
+    this.process = null;
+    this.pending = new Map();
+    this.nextId = 1;
+  }
+
+  /**
+   * Spawn the Python server if it is not already running
+   */
+  ensureStarted() {
+    if (this.process) {
+      return;
+    }
+
+    const pythonProcess = spawn('python', [
+      this.scriptPath,
+      '--risk-model', this.riskModelPath,
+      '--yield-model', this.yieldModelPath
+    ], {
+      cwd: process.cwd(),
+      stdio: ['pipe', 'pipe', 'pipe']
+    });
+
+    const lines = readline.createInterface({ input: pythonProcess.stdout });
+    lines.on('line', (line) => this.handleResponse(line));
+
+    pythonProcess.stderr.on('data', (data) => {
+      const message = data.toString().trim();
+      if (message) {
+        console.warn(`Prediction server: ${message}`);
+      }
+    });
+
+    pythonProcess.stdin.on('error', (error) => {
+      console.error('Prediction server stdin error:', error);
+    });
+
+    pythonProcess.on('exit', (code) => {
+      console.warn(`Prediction server exited with code ${code}`);
+      this.failAll(new Error('Prediction server exited'));
+      this.process = null;
+    });
+
+    pythonProcess.on('error', (error) => {
+      console.error('Prediction server process error:', error);
+      this.failAll(error);
+      this.process = null;
+    });
+
+    this.process = pythonProcess;
+  }
+
+  handleResponse(line) {
+    let response;
+    try {
+      response = JSON.parse(line);
+    } catch (parseError) {
+      console.error('Failed to parse prediction server response:', parseError);
+      return;
+    }
+
+    const pending = this.pending.get(response.id);
+    if (!pending) {
+      return;
+    }
+
+    this.pending.delete(response.id);
+    clearTimeout(pending.timer);
+
+    if (response.ok) {
+      pending.resolve(response.result);
+    } else {
+      pending.reject(new Error(response.error));
+    }
+  }
+
+  failAll(error) {
+    this.pending.forEach(({ reject, timer }) => {
+      clearTimeout(timer);
+      reject(error);
+    });
+    this.pending.clear();
+  }
+
+  /**
+   * Timeout for a request: risk requests with tail_risk set use the tail_risk entry
+   */
+  timeoutFor(type, payload = {}) {
+    const key = type === 'risk' && payload.tail_risk ? 'tail_risk' : type;
+    return this.requestTimeouts[key] ?? this.requestTimeout;
+  }
+
+  /**
+   * Send one request and resolve with its result
+   * (options.timeout overrides the per-type timeout, in milliseconds)
+   */
+  request(type, payload = {}, options = {}) {
+    this.ensureStarted();
+
+    const id = this.nextId++;
+    const timeout = options.timeout ?? this.timeoutFor(type, payload);
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`Prediction server timed out on ${type} after ${timeout}ms`));
+      }, timeout);
+
+      this.pending.set(id, { resolve, reject, timer });
+      this.process.stdin.write(JSON.stringify({ id, type, ...payload }) + '\n');
+    });
+  }
+}
+
+// Create singleton instance
+const predictionServer = new PredictionServerClient();
+
+export default predictionServer;
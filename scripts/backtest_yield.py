@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+
+"""
+Yield Backtester (Python)
+Replays historical TVL and fee/split revenue through the APY tier formula and
+the model's fee/split allocation, as whole-array operations over chunks of
+ticks, so millions of ticks backtest in seconds
+
+History is one tick per row, oldest first:
+  timestamp   unix seconds at the end of the tick
+  tvl         vault TVL during the tick ($)
+  fees        fee revenue earned over the tick ($)
+  splits      profit-split revenue earned over the tick ($, may be negative)
+
+stored as a structured .npy (memory-mapped) or NDJSON, one tick per line.
+
+Usage:
+  python backtest_yield.py history.npy
+  python backtest_yield.py history.npy --model yield_model.json --model candidate.json
+  python backtest_yield.py history.ndjson --bucket-seconds 3600 --chart
+  python backtest_yield.py --mock 1000000 --seed 7
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+from datetime import datetime, timezone
+
+import instrumentation
+import predict_yield
+
+HISTORY_FIELDS = ('timestamp', 'tvl', 'fees', 'splits')
+
+history_dtype = np.dtype([(name, np.float64) for name in HISTORY_FIELDS])
+
+YEAR_SECONDS = 365 * 86400
+
+# One chart point per day, like app/api/yield's generateChartData()
+DEFAULT_BUCKET_SECONDS = 86400
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+def iter_history_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield dicts of column arrays for a .npy or NDJSON history, chunk_size ticks at a time"""
+    if path.endswith('.npy'):
+        history = np.load(path, mmap_mode='r')
+        missing = [name for name in HISTORY_FIELDS if name not in (history.dtype.names or ())]
+        if missing:
+            raise ValueError(f"{path} is missing fields: {', '.join(missing)}")
+        for start in range(0, len(history), chunk_size):
+            chunk = history[start:start + chunk_size]
+            yield {name: np.asarray(chunk[name], dtype=np.float64) for name in HISTORY_FIELDS}
+        return
+
+    with open(path, 'r') as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            ticks = [json.loads(line) for line in itertools.islice(lines, chunk_size)]
+            if not ticks:
+                return
+            yield {name: np.fromiter((tick[name] for tick in ticks), np.float64, len(ticks))
+                   for name in HISTORY_FIELDS}
+
+def tick_formula(compiled, tvl):
+    """(tier index, formula APY %) per tick
+
+    The backtest is deterministic: the model's random variance is replaced by
+    its expected value, the midpoint of variance_range.
+    """
+    tiers = predict_yield.tier_indices(compiled['bounds'], tvl)
+    variance_low, variance_high = compiled['variance_range']
+    apy = np.asarray(compiled['apys'], dtype=np.float64)[tiers] + (variance_low + variance_high) / 2
+    return tiers, np.clip(apy, compiled['min_apy'], compiled['max_apy'])
+
+class YieldBacktest:
+    """Streaming backtest of one compiled yield model
+
+    Feed history chunks in time order with update(); state carried between
+    chunks (last timestamp and tier, running log value and peak, the open
+    chart bucket) makes the result independent of chunk size.
+    """
+
+    def __init__(self, compiled, fee_share=None, split_share=None,
+                 bucket_seconds=DEFAULT_BUCKET_SECONDS):
+        # No usable model (missing or unreadable): backtest the default tier
+        # table, as predict_yield falls back to its default prediction
+        self.model_used = bool(compiled)
+        if not compiled:
+            compiled = predict_yield.compile_yield_model(predict_yield.default_model_data())
+        self.compiled = compiled
+        self.fee_share = compiled['recommended_fees'] if fee_share is None else fee_share
+        self.split_share = compiled['recommended_splits'] if split_share is None else split_share
+        self.bucket_seconds = bucket_seconds
+
+        self.ticks = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.last_tier = None
+        self.upgrades = 0
+        self.downgrades = 0
+        self.tier_seconds = np.zeros(len(compiled['apys']))
+
+        self.apy_seconds = 0.0  # integral of formula APY over time
+        self.promised = 0.0     # $ the formula would have paid out
+        self.fee_income = 0.0
+        self.split_income = 0.0
+        self.log_value = 0.0    # log of the LP value index (starts at 1)
+        self.log_peak = 0.0
+        self.max_drawdown = 0.0
+
+        # Chart buckets: ids and per-bucket sums, one array per chunk
+        self._buckets = []
+
+    def update(self, chunk):
+        """Fold one chunk of history (dict of column arrays) into the backtest"""
+        timestamps = chunk['timestamp']
+        if timestamps.size == 0:
+            return self
+        tvl, fees, splits = chunk['tvl'], chunk['fees'], chunk['splits']
+
+        if self.first_timestamp is None:
+            self.first_timestamp = float(timestamps[0])
+            self.last_timestamp = float(timestamps[0])
+
+        previous = np.empty_like(timestamps)
+        previous[0] = self.last_timestamp
+        previous[1:] = timestamps[:-1]
+        seconds = timestamps - previous
+        if (seconds < 0).any():
+            raise ValueError('History timestamps must be in ascending order')
+
+        tiers, apy = tick_formula(self.compiled, tvl)
+
+        # Tier transitions, including the one across the chunk boundary
+        if self.last_tier is not None:
+            steps = np.diff(tiers, prepend=self.last_tier)
+        else:
+            steps = np.diff(tiers)
+        self.upgrades += int((steps > 0).sum())
+        self.downgrades += int((steps < 0).sum())
+        self.tier_seconds += np.bincount(tiers, weights=seconds, minlength=self.tier_seconds.size)
+
+        self.apy_seconds += float(apy @ seconds)
+        self.promised += float((tvl * apy / 100) @ seconds) / YEAR_SECONDS
+
+        # LP income is its allocated share of the tick's revenue
+        fee_income = fees * self.fee_share
+        split_income = splits * self.split_share
+        self.fee_income += float(fee_income.sum())
+        self.split_income += float(split_income.sum())
+
+        # LP value index compounds the per-tick return on TVL
+        returns = np.divide(fee_income + split_income, tvl, out=np.zeros_like(tvl), where=tvl > 0)
+        log_value = self.log_value + np.cumsum(np.log1p(np.maximum(returns, -1 + 1e-12)))
+        log_peak = np.maximum.accumulate(np.maximum(log_value, self.log_peak))
+        self.max_drawdown = max(self.max_drawdown, float(-np.expm1((log_value - log_peak).min())))
+        self.log_value = float(log_value[-1])
+        self.log_peak = float(log_peak[-1])
+
+        self._add_buckets(timestamps, tvl, apy, seconds, fee_income, split_income)
+
+        self.ticks += timestamps.size
+        self.last_timestamp = float(timestamps[-1])
+        self.last_tier = int(tiers[-1])
+        return self
+
+    def _add_buckets(self, timestamps, tvl, apy, seconds, fee_income, split_income):
+        buckets = ((timestamps - self.first_timestamp) // self.bucket_seconds).astype(np.int64)
+        ids, starts = np.unique(buckets, return_index=True)
+        ends = np.append(starts[1:], buckets.size) - 1
+        self._buckets.append({
+            'id': ids,
+            'fees': np.add.reduceat(fee_income, starts),
+            'splits': np.add.reduceat(split_income, starts),
+            'apy_seconds': np.add.reduceat(apy * seconds, starts),
+            'seconds': np.add.reduceat(seconds, starts),
+            'tvl': tvl[ends]
+        })
+
+    def chart(self, limit=None):
+        """Downsampled series in the app/api/yield chartData shape, oldest first
+
+        Each point sums the LP's fee and split income over one bucket and
+        carries the time-weighted formula APY and the closing TVL. limit
+        keeps only the most recent points.
+        """
+        if not self._buckets:
+            return []
+
+        merged = {key: np.concatenate([part[key] for part in self._buckets])
+                  for key in self._buckets[0]}
+
+        # A bucket spanning a chunk boundary appears once per chunk
+        ids, starts = np.unique(merged['id'], return_index=True)
+        ends = np.append(starts[1:], merged['id'].size) - 1
+        fees = np.add.reduceat(merged['fees'], starts)
+        splits = np.add.reduceat(merged['splits'], starts)
+        seconds = np.add.reduceat(merged['seconds'], starts)
+        apy_seconds = np.add.reduceat(merged['apy_seconds'], starts)
+        tvl = merged['tvl'][ends]
+
+        # A bucket's first tick may carry no elapsed time; fall back to its tier APY
+        apy = np.divide(apy_seconds, seconds, out=tick_formula(self.compiled, tvl)[1],
+                        where=seconds > 0)
+
+        if limit is not None:
+            ids, fees, splits, apy, tvl = (values[-limit:] for values in (ids, fees, splits, apy, tvl))
+
+        bucket_starts = self.first_timestamp + ids * self.bucket_seconds
+        return [{
+            'date': datetime.fromtimestamp(start, timezone.utc).strftime(
+                '%Y-%m-%d' if self.bucket_seconds % 86400 == 0 else '%Y-%m-%dT%H:%M:%SZ'),
+            'fees': round(float(fee), 2),
+            'splits': round(float(split), 2),
+            'total': round(float(fee + split), 2),
+            'apy': round(float(bucket_apy), 2),
+            'tvl': round(float(bucket_tvl), 2)
+        } for start, fee, split, bucket_apy, bucket_tvl in zip(
+            bucket_starts.tolist(), fees, splits, apy, tvl)]
+
+    def summary(self):
+        """Realized vs formula yield, drawdown and tier statistics"""
+        elapsed = (self.last_timestamp - self.first_timestamp) if self.ticks else 0.0
+        years = elapsed / YEAR_SECONDS
+
+        if years > 0:
+            realized_apy = float(np.expm1(self.log_value / years)) * 100
+            formula_apy = self.apy_seconds / elapsed
+        else:
+            realized_apy = formula_apy = 0.0
+
+        return {
+            'ticks': self.ticks,
+            'days': round(elapsed / 86400, 2),
+            'formula_apy': round(formula_apy, 4),
+            'realized_apy': round(realized_apy, 4),
+            'apy_shortfall': round(formula_apy - realized_apy, 4),
+            'promised_payout': round(self.promised, 2),
+            'fee_income': round(self.fee_income, 2),
+            'split_income': round(self.split_income, 2),
+            'max_drawdown': round(self.max_drawdown * 100, 4),
+            'fee_share': self.fee_share,
+            'split_share': self.split_share,
+            'model_used': self.model_used,
+            'tier_transitions': self.upgrades + self.downgrades,
+            'tier_upgrades': self.upgrades,
+            'tier_downgrades': self.downgrades,
+            'tier_time_share': {
+                tier_label(self.compiled, tier): round(float(share), 4)
+                for tier, share in enumerate(self.tier_seconds / elapsed if elapsed > 0
+                                             else self.tier_seconds)
+            }
+        }
+
+def tier_label(compiled, tier):
+    """'default' for the bottom tier, otherwise the TVL bound that must be exceeded"""
+    return 'default' if tier == 0 else f"{compiled['bounds'][tier - 1]:.0f}"
+
+def backtest(chunks, models, fee_share=None, split_share=None,
+             bucket_seconds=DEFAULT_BUCKET_SECONDS, chart_limit=None):
+    """Backtest several compiled models over one pass of history chunks
+
+    models maps a name to a compiled yield model (predict_yield's compiled
+    form, or None for the default tier table). Returns {name: {'summary': ..., 'chart': [...]}}; chart_limit=0
+    leaves the chart out.
+    """
+    runs = {name: YieldBacktest(compiled, fee_share, split_share, bucket_seconds)
+            for name, compiled in models.items()}
+    for chunk in chunks:
+        for run in runs.values():
+            run.update(chunk)
+
+    return {
+        name: {
+            'summary': run.summary(),
+            'chart': [] if chart_limit == 0 else run.chart(chart_limit)
+        }
+        for name, run in runs.items()
+    }
+
+def load_models(paths):
+    """Compiled yield models by path; the default model when paths is empty"""
+    if not paths:
+        paths = [os.environ.get('MODEL_OUTPUT_PATH', 'yield_model.json')]
+    return {path: predict_yield.load_compiled_model(path) for path in paths}
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Backtest the APY formula over historical TVL')
+    parser.add_argument('history', nargs='?', default=None,
+                        help='tick history (.npy structured array or NDJSON)')
+    parser.add_argument('--mock', type=float, default=None, metavar='TICKS',
+                        help='backtest this many synthetic ticks instead of a history file')
+    parser.add_argument('--seed', type=int, default=None, help='seed for --mock')
+    parser.add_argument('--model', action='append', default=None, metavar='PATH',
+                        help='yield model to backtest; repeat to compare models over one pass '
+                             '(default: $MODEL_OUTPUT_PATH or yield_model.json)')
+    parser.add_argument('--fee-share', type=float, default=None,
+                        help="LP share of fee revenue (default: the model's recommended_fees)")
+    parser.add_argument('--split-share', type=float, default=None,
+                        help="LP share of split revenue (default: the model's recommended_splits)")
+    parser.add_argument('--bucket-seconds', type=int, default=DEFAULT_BUCKET_SECONDS,
+                        help='chart downsampling interval')
+    parser.add_argument('--chart-points', type=int, default=None,
+                        help='keep only the most recent chart points')
+    parser.add_argument('--chart', action='store_true',
+                        help='stream chart points as NDJSON after the summaries')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+def main():
+    """Run the backtest and print per-model summaries"""
+
+    args = parse_args()
+    if (args.history is None) == (args.mock is None):
+        print("Error: Give a history file or --mock TICKS", file=sys.stderr)
+        sys.exit(1)
+
+    timer = instrumentation.StageTimer()
+
+    with timer.stage('model_load'):
+        models = load_models(args.model)
+
+    if args.mock is not None:
+        import synthetic
+        chunks = synthetic.iter_yield_history(int(args.mock), args.chunk_size, args.seed)
+    else:
+        chunks = iter_history_chunks(args.history, args.chunk_size)
+
+    try:
+        with timer.stage('backtest'):
+            results = backtest(chunks, models, args.fee_share, args.split_share,
+                               args.bucket_seconds, args.chart_points if args.chart else 0)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Error: Backtest failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for name, result in results.items():
+        print(json.dumps({'model': name, **result['summary']}))
+        for point in result['chart']:
+            print(json.dumps({'model': name, **point}))
+    timer.emit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the Python risk and yield scripts
+
+  python benchmarks.py run [--scales 1e3,1e4,1e5,1e6,1e7] [--save b.json] [--baseline b.json]
+  python benchmarks.py legacy [cluster_risk drawdown_patterns record_memory]
+
+'run' measures throughput, latency percentiles and peak memory on seeded
+synthetic data and fails when a baseline regresses beyond --tolerance.
+'legacy' compares the columnar engines against the original dict-based code.
+"""
+
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import tracemalloc
+import numpy as np
+from datetime import datetime, timedelta
+
+import backtest_yield
+import calibration
+import payout_ledger
+import predict_risk
+import predict_yield
+import ranking
+import records
+import synthetic
+import tail_risk
+import train_risk
+import train_yield
+
+def legacy_assess_cluster_risk(positions, model_weights):
+    """Original dict-of-lists implementation of assess_cluster_risk"""
+
+    clusters = {}
+    for position in positions:
+        end_date = position['endDate']
+        if end_date not in clusters:
+            clusters[end_date] = []
+        clusters[end_date].append(position)
+
+    risk_assessments = []
+
+    for end_date, cluster_positions in clusters.items():
+        total_value = sum(p['entryPrice'] * p['shares'] for p in cluster_positions)
+        total_pnl = sum(p['pnl'] for p in cluster_positions)
+        cluster_size = len(cluster_positions)
+
+        if total_value > 0:
+            drawdown_pct = abs(total_pnl) / total_value if total_pnl < 0 else 0
+        else:
+            drawdown_pct = 0
+
+        if drawdown_pct > model_weights.get('drawdown_threshold', 4.0):
+            risk_level = 'high'
+        elif drawdown_pct > 2.0:
+            risk_level = 'medium'
+        else:
+            risk_level = 'low'
+
+        risk_assessments.append({
+            'end_date': end_date,
+            'cluster_size': cluster_size,
+            'drawdown_percentage': round(drawdown_pct * 100, 2),
+            'total_value': round(total_value, 2),
+            'total_pnl': round(total_pnl, 2),
+            'risk_level': risk_level,
+            'severity': risk_level
+        })
+
+    return risk_assessments
+
+def legacy_analyze_drawdown_patterns(positions, end_dates):
+    """Original per-cluster rescan implementation of analyze_drawdown_patterns"""
+
+    cluster_analysis = {}
+
+    for end_date in end_dates:
+        date_str = end_date.strftime('%Y-%m-%d')
+        cluster_positions = [p for p in positions if p['endDate'].startswith(date_str)]
+
+        if not cluster_positions:
+            continue
+
+        total_value = sum(p['entryPrice'] * p['shares'] for p in cluster_positions)
+        total_pnl = sum(p['pnl'] for p in cluster_positions)
+        max_loss = min(p['pnl'] for p in cluster_positions)
+        drawdown_pct = abs(max_loss) / total_value if total_value > 0 else 0
+
+        cluster_analysis[date_str] = {
+            'total_positions': len(cluster_positions),
+            'total_value': total_value,
+            'total_pnl': total_pnl,
+            'max_loss': max_loss,
+            'drawdown_percentage': drawdown_pct,
+            'risk_level': 'high' if drawdown_pct > 0.04 else 'medium' if drawdown_pct > 0.02 else 'low'
+        }
+
+    return cluster_analysis
+
+def make_training_positions(count, num_clusters, seed=42):
+    """Seeded train_risk-style positions (ISO endDate) and their end dates"""
+    table, end_dates = synthetic.position_table(
+        count, num_clusters=num_clusters, seed=seed, base_date=datetime(2025, 1, 1, 12, 0))
+    return table.to_dicts(), end_dates
+
+def make_positions(count, num_clusters=365, seed=42):
+    """Seeded position dicts spread over num_clusters daily end dates"""
+    table, _ = synthetic.position_table(
+        count, num_clusters=num_clusters, seed=seed, base_date=datetime(2025, 1, 1),
+        date_format='%Y-%m-%d', pnl_range=(-500, 200))
+    return table.to_dicts()
+
+def best_time(fn, *args, repeat=3):
+    """Fastest wall time of repeat calls, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def bench_cluster_risk(sizes, repeat=3):
+    """assess_cluster_risk: dict-based vs columnar"""
+
+    print("assess_cluster_risk (seconds, best of %d)" % repeat)
+    print(f"{'positions':>10} {'legacy':>9} {'columnar':>9} {'speedup':>8} "
+          f"{'cols-only':>9} {'speedup':>8}")
+
+    model_weights = predict_risk.default_model_data()['model_weights']
+
+    for size in sizes:
+        positions = make_positions(size)
+        columns = predict_risk.positions_to_columns(positions)
+
+        expected = legacy_assess_cluster_risk(positions, model_weights)
+        if predict_risk.assess_cluster_risk(positions, model_weights) != expected:
+            raise AssertionError(f"Columnar result differs from legacy at {size} positions")
+
+        legacy = best_time(legacy_assess_cluster_risk, positions, model_weights, repeat=repeat)
+        columnar = best_time(predict_risk.assess_cluster_risk, positions, model_weights, repeat=repeat)
+        columns_only = best_time(predict_risk.assess_cluster_risk_columns, columns, model_weights,
+                                 repeat=repeat)
+
+        print(f"{size:>10} {legacy:>9.4f} {columnar:>9.4f} {legacy / columnar:>7.1f}x "
+              f"{columns_only:>9.4f} {legacy / columns_only:>7.1f}x")
+
+def bench_drawdown_patterns(sizes, repeat=3, cluster_counts=(30, 365, 1825),
+                            legacy_budget=5e7):
+    """analyze_drawdown_patterns: per-cluster rescan vs single-pass grouping
+
+    The legacy code is O(clusters x positions); it is skipped ('-') once that
+    product exceeds legacy_budget.
+    """
+
+    print("analyze_drawdown_patterns (seconds, best of %d)" % repeat)
+    print(f"{'positions':>10} {'clusters':>8} {'legacy':>9} {'indexed':>9} {'speedup':>8}")
+
+    quiet = io.StringIO()
+
+    for size in sizes:
+        for num_clusters in cluster_counts:
+            positions, end_dates = make_training_positions(size, num_clusters)
+
+            with contextlib.redirect_stdout(quiet):
+                indexed = best_time(train_risk.analyze_drawdown_patterns, positions, end_dates,
+                                    repeat=repeat)
+
+            if size * num_clusters > legacy_budget:
+                print(f"{size:>10} {num_clusters:>8} {'-':>9} {indexed:>9.4f} {'-':>8}")
+                continue
+
+            with contextlib.redirect_stdout(quiet):
+                result = train_risk.analyze_drawdown_patterns(positions, end_dates)
+            if result != legacy_analyze_drawdown_patterns(positions, end_dates):
+                raise AssertionError(f"Indexed result differs from legacy at {size} positions")
+
+            legacy = best_time(legacy_analyze_drawdown_patterns, positions, end_dates, repeat=1)
+            print(f"{size:>10} {num_clusters:>8} {legacy:>9.4f} {indexed:>9.4f} "
+                  f"{legacy / indexed:>7.1f}x")
+
+def dict_bytes(items):
+    """Bytes held by a list of flat dicts: the list slot, each dict and each
+    distinct value object (shared keys and shared values count once)"""
+    seen = set()
+    total = sys.getsizeof(items)
+    for item in items:
+        total += sys.getsizeof(item)
+        for value in item.values():
+            if id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+    return total
+
+def bench_record_memory(sizes, repeat=1):
+    """Bytes per record: dicts vs the structured-array record layer"""
+
+    print("record memory (bytes per record)")
+    print(f"{'records':>10} {'kind':>9} {'dicts':>7} {'records':>8} {'ratio':>6}")
+
+    for size in sizes:
+        positions = make_positions(size)
+        table = records.PositionTable.from_dicts(positions)
+        dict_size = dict_bytes(positions) / size
+        table_size = (table.records.nbytes + dict_bytes([dict(enumerate(table.end_dates))])) / size
+        print(f"{size:>10} {'position':>9} {dict_size:>7.0f} {table_size:>8.1f} "
+              f"{dict_size / table_size:>5.1f}x")
+
+        traders = make_trader_table(size).to_dicts()
+        trader_table = records.TraderTable.from_dicts(traders)
+        dict_size = dict_bytes(traders) / len(traders)
+        table_size = trader_table.records.nbytes / len(traders)
+        print(f"{len(traders):>10} {'trader':>9} {dict_size:>7.0f} {table_size:>8.1f} "
+              f"{dict_size / table_size:>5.1f}x")
+
+LEGACY_COMPARISONS = {
+    'cluster_risk': bench_cluster_risk,
+    'drawdown_patterns': bench_drawdown_patterns,
+    'record_memory': bench_record_memory,
+}
+
+# ---------------------------------------------------------------------------
+# Benchmark harness: throughput, latency percentiles and peak memory per
+# function and scale, with JSON baselines and a regression gate
+# ---------------------------------------------------------------------------
+
+def make_position_table(count, num_clusters=1825, seed=42):
+    """Seeded PositionTable built directly as records (no per-position dicts)"""
+    return synthetic.position_table(count, num_clusters=num_clusters, seed=seed,
+                                    base_date=datetime(2025, 1, 1, 12, 0))
+
+def make_trader_table(count, seed=42):
+    """Seeded TraderTable with the load_mock_supabase_data distributions"""
+    return synthetic.trader_table(count, seed)
+
+def make_risk_assessments(count, seed=42):
+    """Seeded cluster assessments in the assess_cluster_risk output shape"""
+    rng = np.random.default_rng(seed)
+    base_date = datetime(2025, 1, 1)
+    drawdowns = np.round(rng.exponential(150, size=count), 2).tolist()
+    values = np.round(rng.uniform(100, 100000, size=count), 2).tolist()
+    sizes = rng.integers(1, 500, size=count).tolist()
+
+    assessments = []
+    for i in range(count):
+        level = 'high' if drawdowns[i] > 400 else 'medium' if drawdowns[i] > 200 else 'low'
+        assessments.append({
+            'end_date': (base_date + timedelta(days=i % 36500)).strftime('%Y-%m-%d'),
+            'cluster_size': sizes[i],
+            'drawdown_percentage': drawdowns[i],
+            'total_value': values[i],
+            'total_pnl': round(-values[i] * drawdowns[i] / 100, 2),
+            'risk_level': level,
+            'severity': level
+        })
+    return assessments
+
+def _quietly(fn):
+    """Wrap fn so its progress prints do not pollute the report"""
+    def run(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fn(*args)
+    return run
+
+def _setup_cluster_risk(scale, seed):
+    table, _ = make_position_table(scale, seed=seed)
+    return (table, predict_risk.default_model_data()['model_weights'])
+
+def _setup_risk_prediction(scale, seed):
+    return (make_risk_assessments(scale, seed), predict_risk.default_model_data()['model_weights'])
+
+def _setup_drawdown_patterns(scale, seed):
+    return make_position_table(scale, seed=seed)
+
+def _setup_optimal_allocation(scale, seed):
+    return (make_trader_table(scale, seed),)
+
+def _setup_risk_batch(scale, seed):
+    table, _ = make_position_table(scale, num_clusters=365, seed=seed)
+    columns = table.columns()
+    num_traders = max(scale // 200, 1)
+    columns['trader_code'] = np.random.default_rng(seed).integers(0, num_traders, size=scale)
+    columns['traders'] = [f'0x{code:040x}' for code in range(num_traders)]
+    return (columns, predict_risk.default_model_data()['model_weights'])
+
+def _setup_tail_risk(scale, seed):
+    table, _ = make_position_table(scale, num_clusters=365, seed=seed)
+    return (table, tail_risk.DEFAULT_SCENARIOS, tail_risk.DEFAULT_CONFIDENCE,
+            tail_risk.DEFAULT_CORRELATION, seed)
+
+def _setup_calibration(scale, seed):
+    # scale = labeled clusters, swept against the default 2,000-candidate grid
+    return (synthetic.cluster_outcomes(scale, seed),)
+
+def _setup_backtest(scale, seed):
+    # scale = history ticks, one minute apart, held in memory as chunks
+    chunks = list(synthetic.iter_yield_history(scale, seed=seed))
+    compiled = predict_yield.compile_yield_model(predict_yield.default_model_data())
+    return (chunks, {'default': compiled})
+
+def _setup_yield_batch(scale, seed):
+    rng = np.random.default_rng(seed)
+    compiled = predict_yield.compile_yield_model(predict_yield.default_model_data())
+    return (rng.uniform(0, 200000, size=scale), compiled, rng)
+
+def _setup_yield_calls(scale, seed):
+    rng = np.random.default_rng(seed)
+    compiled = predict_yield.compile_yield_model(predict_yield.default_model_data())
+    return [(tvl, compiled) for tvl in rng.uniform(0, 200000, size=scale).tolist()]
+
+def _setup_payouts(scale, seed):
+    # scale = LPs, paid from 1,000 traders over one block of epochs
+    allocation_model, balances = synthetic.payout_setup(scale, 1000, seed)
+    blocks = list(synthetic.iter_epoch_revenue(payout_ledger.DEFAULT_BLOCK_EPOCHS, 1000, seed=seed))
+    return (allocation_model, balances, blocks)
+
+def _setup_ranking_updates(scale, seed):
+    # scale = traders in the index and score updates applied to it
+    rng = np.random.default_rng(seed)
+    ids = [f'0x{code:040x}' for code in range(scale)]
+    index = ranking.RankingIndex(seed).load(
+        (trader_id, score, None) for trader_id, score in zip(ids, rng.random(scale).tolist()))
+    updates = zip(rng.integers(0, scale, size=scale).tolist(), rng.random(scale).tolist())
+    return [(index, ids[code], score) for code, score in updates]
+
+def _ranking_update(index, trader_id, score):
+    index.update(trader_id, score)
+    return index.rank(trader_id)
+
+# name -> (setup(scale, seed) -> args, function, max scale, per-call?)
+# Per-call cases time every call separately; the others time one call over
+# the whole dataset per iteration.
+CASES = {
+    'assess_cluster_risk': (_setup_cluster_risk, predict_risk.assess_cluster_risk, 10**7, False),
+    'generate_risk_prediction': (_setup_risk_prediction, predict_risk.generate_risk_prediction,
+                                 10**6, False),
+    'analyze_drawdown_patterns': (_setup_drawdown_patterns,
+                                  _quietly(train_risk.analyze_drawdown_patterns), 10**7, False),
+    'calculate_optimal_allocation': (_setup_optimal_allocation,
+                                     _quietly(train_yield.calculate_optimal_allocation), 10**7, False),
+    'generate_risk_predictions_batch': (_setup_risk_batch,
+                                        predict_risk.generate_risk_predictions_batch, 10**7, False),
+    'assess_tail_risk': (_setup_tail_risk, tail_risk.assess_tail_risk, 10**5, False),
+    'calibrate': (_setup_calibration, calibration.calibrate, 10**7, False),
+    'backtest_yield': (_setup_backtest, backtest_yield.backtest, 10**7, False),
+    'predict_yield': (_setup_yield_calls, predict_yield.predict_yield_compiled, 10**5, True),
+    'predict_yield_batch': (_setup_yield_batch, predict_yield.predict_yield_batch_compiled,
+                            10**7, False),
+    'payout_ledger': (_setup_payouts, payout_ledger.accrue, 10**6, False),
+    'ranking_update': (_setup_ranking_updates, _ranking_update, 10**6, True),
+}
+
+def measure_case(name, scale, iterations=5, seed=42):
+    """Throughput, latency percentiles and peak traced memory for one case"""
+    setup, fn, _, per_call = CASES[name]
+    args = setup(scale, seed)
+
+    if per_call:
+        latencies = []
+        for call_args in args:
+            start = time.perf_counter()
+            fn(*call_args)
+            latencies.append(time.perf_counter() - start)
+        total_time = sum(latencies)
+        iterations = 1
+    else:
+        fn(*args)  # warm-up
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn(*args)
+            latencies.append(time.perf_counter() - start)
+        total_time = sum(latencies)
+
+    # Peak memory from a separate traced run, since tracing slows execution
+    tracemalloc.start()
+    if per_call:
+        for call_args in args[:1000]:
+            fn(*call_args)
+    else:
+        fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+    return {
+        'records': scale,
+        'iterations': iterations,
+        'throughput': scale * iterations / total_time,
+        'latency_p50': p50,
+        'latency_p95': p95,
+        'latency_p99': p99,
+        'peak_memory_bytes': peak
+    }
+
+def run_harness(case_names, scales, iterations=5, seed=42):
+    """Measure every case at every scale it supports"""
+
+    results = {}
+    print(f"{'case':<30} {'records':>9} {'rec/s':>11} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'peak MB':>8}")
+
+    for name in case_names:
+        max_scale = CASES[name][2]
+        for scale in scales:
+            if scale > max_scale:
+                print(f"{name:<30} {scale:>9} {'skipped (max %d)' % max_scale:>11}")
+                continue
+
+            result = measure_case(name, scale, iterations, seed)
+            results[f"{name}@{scale}"] = result
+            print(f"{name:<30} {scale:>9} {result['throughput']:>11.0f} "
+                  f"{result['latency_p50'] * 1e3:>9.3f} {result['latency_p95'] * 1e3:>9.3f} "
+                  f"{result['latency_p99'] * 1e3:>9.3f} {result['peak_memory_bytes'] / 1e6:>8.1f}")
+
+    return results
+
+def save_baseline(path, results):
+    """Write results as a JSON baseline"""
+    baseline = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    print(f"Baseline saved to {path}")
+
+def find_regressions(results, baseline, tolerance):
+    """Metrics that got worse than the baseline by more than tolerance (a fraction)"""
+    regressions = []
+
+    for key, result in results.items():
+        expected = baseline.get('results', {}).get(key)
+        if expected is None:
+            continue
+
+        if result['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append((key, 'throughput', expected['throughput'], result['throughput']))
+        if result['latency_p50'] > expected['latency_p50'] * (1 + tolerance):
+            regressions.append((key, 'latency_p50', expected['latency_p50'], result['latency_p50']))
+        if result['peak_memory_bytes'] > expected['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append((key, 'peak_memory_bytes', expected['peak_memory_bytes'],
+                                result['peak_memory_bytes']))
+
+    return regressions
+
+def parse_scales(text):
+    return [int(float(scale)) for scale in text.split(',')]
+
+def main():
+    """Run the benchmark harness or a legacy comparison"""
+
+    parser = argparse.ArgumentParser(description='Benchmark the risk and yield scripts')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run = subparsers.add_parser('run', help='Measure functions and check against a baseline (default)')
+    run.add_argument('--cases', default=','.join(CASES),
+                     help=f"Comma-separated cases (default: {','.join(CASES)})")
+    run.add_argument('--scales', default='1e3,1e4,1e5,1e6',
+                     help='Comma-separated record counts, up to 1e7')
+    run.add_argument('--iterations', type=int, default=5)
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--save', default=None, help='Write the results as a JSON baseline')
+    run.add_argument('--baseline', default=None, help='Fail if results regress against this baseline')
+    run.add_argument('--tolerance', type=float, default=0.25,
+                     help='Allowed fractional regression before failing (default 0.25)')
+
+    legacy = subparsers.add_parser('legacy', help='Compare against the original implementations')
+    legacy.add_argument('names', nargs='*', default=list(LEGACY_COMPARISONS),
+                        help=f"Comparisons to run (default: all of {', '.join(LEGACY_COMPARISONS)})")
+    legacy.add_argument('--sizes', default='10000,100000,1000000',
+                        help='Comma-separated record counts')
+    legacy.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args(sys.argv[1:] or ['run'])
+
+    if args.command == 'legacy':
+        for name in args.names:
+            if name not in LEGACY_COMPARISONS:
+                print(f"Unknown comparison: {name}", file=sys.stderr)
+                sys.exit(1)
+            LEGACY_COMPARISONS[name](parse_scales(args.sizes), repeat=args.repeat)
+        return
+
+    case_names = args.cases.split(',')
+    for name in case_names:
+        if name not in CASES:
+            print(f"Unknown case: {name}", file=sys.stderr)
+            sys.exit(1)
+
+    results = run_harness(case_names, parse_scales(args.scales), args.iterations, args.seed)
+
+    if args.save:
+        save_baseline(args.save, results)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for key, metric, expected, actual in regressions:
+            print(f"❌ {key} {metric}: {expected:.6g} -> {actual:.6g}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
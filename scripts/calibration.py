@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+Risk Model Calibration (Python)
+Grid sweep over the drawdown threshold, scored against labeled historical
+cluster outcomes
+
+A candidate threshold t flags a cluster when its drawdown (|PnL| / value for
+a losing cluster, 0 otherwise) crosses it:
+
+  drawdown > t
+
+which is the comparison predict_risk.assess_cluster_totals makes, so the
+fitted threshold means the same thing at prediction time. Candidates are
+scored by F1 against the clusters' `breached` labels. Flagged and
+true-positive counts are suffix counts over the sorted drawdowns, so the
+whole grid is scored with two searchsorted calls in O((n + t) log n).
+
+The cluster size, time-to-expiry and PnL volatility weights are not fitted:
+the predictor does not read them, so a fitted value would change no
+prediction.
+
+Labeled outcomes are NDJSON, one cluster per line (other fields are ignored):
+  {"drawdown": 0.031, "breached": true}
+"""
+
+import json
+import numpy as np
+
+# Default grid: 2,000 thresholds from 0.01% to 20% drawdown
+DEFAULT_THRESHOLDS = tuple(round(0.0001 * i, 4) for i in range(1, 2001))
+
+def outcome_columns(outcomes):
+    """Column arrays for labeled outcome dicts"""
+    count = len(outcomes)
+    return {
+        'drawdown': np.fromiter((o['drawdown'] for o in outcomes), np.float64, count),
+        'breached': np.fromiter((bool(o['breached']) for o in outcomes), np.bool_, count)
+    }
+
+def load_outcomes(path):
+    """Read an NDJSON file of labeled cluster outcomes into columns"""
+    with open(path, 'r') as f:
+        return outcome_columns([json.loads(line) for line in f if line.strip()])
+
+def threshold_counts(columns, thresholds):
+    """(flagged, true positives) per threshold: clusters with drawdown above it, all and breached"""
+    drawdown = columns['drawdown']
+    breached = drawdown[columns['breached']]
+    flagged = drawdown.size - np.searchsorted(np.sort(drawdown), thresholds, side='right')
+    true_positives = breached.size - np.searchsorted(np.sort(breached), thresholds, side='right')
+    return flagged, true_positives
+
+def f1_scores(flagged, true_positives, positives):
+    """F1 = 2 TP / (2 TP + FP + FN) = 2 TP / (flagged + positives), 0 when both are 0"""
+    denominator = flagged + positives
+    return np.divide(2 * true_positives, denominator, out=np.zeros(len(flagged)),
+                     where=denominator > 0)
+
+def score_thresholds(columns, thresholds):
+    """F1 of every threshold in one vectorized pass"""
+    flagged, true_positives = threshold_counts(columns, thresholds)
+    return f1_scores(flagged, true_positives, int(columns['breached'].sum()))
+
+def calibrate(columns, thresholds=DEFAULT_THRESHOLDS):
+    """Best drawdown threshold for labeled outcome columns
+
+    Ties go to the first candidate in grid order (the lowest threshold).
+    """
+    candidates = np.asarray(thresholds, dtype=np.float64)
+    positives = int(columns['breached'].sum())
+    flagged, true_positives = threshold_counts(columns, candidates)
+    scores = f1_scores(flagged, true_positives, positives)
+
+    best = int(np.argmax(scores))
+    flagged, true_positives = int(flagged[best]), int(true_positives[best])
+
+    return {
+        'drawdown_threshold': float(candidates[best]),
+        'f1': round(float(scores[best]), 4),
+        'precision': round(true_positives / flagged, 4) if flagged else 0.0,
+        'recall': round(true_positives / positives, 4) if positives else 0.0,
+        'candidates': len(candidates),
+        'clusters': int(columns['breached'].size)
+    }
+
+def apply_calibration(model_weights, result):
+    """Write the calibrated threshold and its fit into model_weights (in place)"""
+    model_weights['drawdown_threshold'] = result['drawdown_threshold']
+    model_weights['calibration'] = {
+        key: result[key] for key in ('f1', 'precision', 'recall', 'candidates', 'clusters')
+    }
+    return model_weights
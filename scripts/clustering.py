@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+"""
+Position Clustering Engine (Python)
+Bins end-date clusters into expiry windows, optionally split by market
+category, so the predictor and the trainer measure correlated-expiry risk
+over the same clusters
+
+Windows (the model's cluster_window):
+  exact       one cluster per distinct endDate label (the original grouping)
+  daily       calendar day of the end date
+  weekly      Monday-to-Sunday week of the end date
+  rolling:N   N-day windows, each starting at the earliest expiry day not
+              covered by the previous window, so every end date lands in
+              exactly one window and no position is counted twice
+
+Windows are computed over sorted day arrays (searchsorted / reduceat), on
+per-label totals rather than positions, so the cost is O(L log L) in the
+number of distinct end dates on top of the O(n) grouped reductions.
+
+Labels a window cannot place on the calendar (missing or not ISO 8601)
+fall back to exact clusters, listed after the windowed ones.
+"""
+
+import numpy as np
+from datetime import datetime, timezone
+
+WINDOW_KINDS = ('exact', 'daily', 'weekly', 'rolling')
+
+# Weekly windows start on Monday; 1970-01-05 was the first Monday after the epoch
+WEEK_ORIGIN_DAY = 4
+
+def parse_end_date(label):
+    """endDate label ('YYYY-MM-DD' or ISO timestamp) as naive datetime64[us]
+
+    Aware timestamps are converted to UTC; naive ones are taken as UTC
+    already, so compare them against a UTC clock, not datetime.now().
+    """
+    value = datetime.fromisoformat(label)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(value, 'us')
+
+def parsed_end_date_days(labels):
+    """(day numbers, parsed mask) for endDate labels
+
+    Labels parse_end_date() rejects (None, non-strings, non-ISO text) get
+    day 0 and a False mask entry instead of raising.
+    """
+    days = np.zeros(len(labels), dtype=np.int64)
+    parsed = np.ones(len(labels), dtype=bool)
+    for i, label in enumerate(labels):
+        try:
+            days[i] = parse_end_date(label).astype('datetime64[D]').astype(np.int64)
+        except (TypeError, ValueError):
+            parsed[i] = False
+    return days, parsed
+
+def day_keys(labels):
+    """'YYYY-MM-DD' day of each endDate label (None where the label is unparsable)"""
+    days, parsed = parsed_end_date_days(labels)
+    return [key if ok else None for key, ok in zip(day_labels(days), parsed.tolist())]
+
+def day_labels(days):
+    """'YYYY-MM-DD' strings for day numbers"""
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype('datetime64[D]')).tolist()
+
+class ClusterWindow:
+    """How end dates are binned into clusters (see the module docstring)"""
+
+    def __init__(self, kind='exact', days=1):
+        if kind not in WINDOW_KINDS:
+            raise ValueError(f"Unknown cluster window: {kind!r}")
+        if days < 1:
+            raise ValueError(f"Cluster window must span at least one day, not {days}")
+        self.kind = kind
+        self.days = {'daily': 1, 'weekly': 7}.get(kind, days)
+
+    @classmethod
+    def parse(cls, spec):
+        """'exact', 'daily', 'weekly' or 'rolling:N'"""
+        kind, _, days = str(spec).partition(':')
+        if kind == 'rolling':
+            try:
+                return cls(kind, int(days))
+            except ValueError:
+                raise ValueError(f"Invalid rolling window {spec!r}; expected rolling:N") from None
+        if days:
+            raise ValueError(f"Cluster window {kind!r} takes no length")
+        return cls(kind)
+
+    def __str__(self):
+        return f'rolling:{self.days}' if self.kind == 'rolling' else self.kind
+
+    def __eq__(self, other):
+        return isinstance(other, ClusterWindow) and str(self) == str(other)
+
+    def bins(self, days):
+        """Window number of each day number (daily / weekly windows)"""
+        if self.kind == 'weekly':
+            return (days - WEEK_ORIGIN_DAY) // 7
+        return days
+
+    def bin_days(self, bins):
+        """First day number of each window number"""
+        if self.kind == 'weekly':
+            return bins * 7 + WEEK_ORIGIN_DAY
+        return bins
+
+def model_clustering(model_weights):
+    """(ClusterWindow, by_category) configured in a risk model's weights"""
+    return (ClusterWindow.parse(model_weights.get('cluster_window', 'exact')),
+            bool(model_weights.get('cluster_by_category', False)))
+
+def category_codes(categories):
+    """Integer codes for category values in first-appearance order, plus the value table"""
+    table = {}
+    codes = np.fromiter((table.setdefault(category, len(table)) for category in categories),
+                        dtype=np.int64, count=len(categories))
+    return codes, list(table)
+
+def group_codes(columns, by_category=False):
+    """Per-position group code over (end date, category), with each group's label and category
+
+    Returns (codes, labels, categories); categories is None unless
+    by_category is set. Positions without a category column count as
+    uncategorized (None).
+    """
+    end_code = columns['end_code']
+    end_dates = columns['end_dates']
+    if not by_category:
+        return end_code, end_dates, None
+
+    if 'category_code' not in columns:
+        return end_code, end_dates, [None] * len(end_dates)
+
+    num_categories = max(len(columns['categories']), 1)
+    pairs = end_code.astype(np.int64) * num_categories + columns['category_code']
+    present, codes = np.unique(pairs, return_inverse=True)
+    labels = [end_dates[pair] for pair in (present // num_categories).tolist()]
+    categories = [columns['categories'][code] for code in (present % num_categories).tolist()]
+    return codes.reshape(-1), labels, categories
+
+def _exact_clusters(labels, categories):
+    """Cluster code per group for exact windows, first-appearance order"""
+    keys = {}
+    pairs = zip(labels, categories if categories is not None else [None] * len(labels))
+    codes = np.fromiter((keys.setdefault(pair, len(keys)) for pair in pairs),
+                        dtype=np.int64, count=len(labels))
+    return (codes, [label for label, _ in keys],
+            None if categories is None else [category for _, category in keys])
+
+def cluster_codes(labels, window, categories=None):
+    """Cluster index of every group under a window
+
+    Group i is identified by labels[i] (its endDate label) and, when given,
+    categories[i]. Returns (codes, cluster labels, cluster categories or
+    None), where codes[i] indexes the cluster lists. Exact clusters keep
+    first-appearance order; windowed clusters come out by window start, then
+    category, followed by exact clusters for any unparsable labels.
+    """
+    if window.kind == 'exact':
+        return _exact_clusters(labels, categories)
+
+    days, parsed = parsed_end_date_days(labels)
+    if parsed.all():
+        return _window_clusters(days, window, categories)
+
+    def pick(values, indices):
+        return None if values is None else [values[i] for i in indices.tolist()]
+
+    placed, unplaced = np.flatnonzero(parsed), np.flatnonzero(~parsed)
+    window_codes, keys, key_categories = _window_clusters(days[placed], window,
+                                                          pick(categories, placed))
+    exact_codes, exact_keys, exact_categories = _exact_clusters(pick(labels, unplaced),
+                                                                pick(categories, unplaced))
+
+    codes = np.empty(len(labels), dtype=np.int64)
+    codes[placed] = window_codes
+    codes[unplaced] = exact_codes + len(keys)
+    return (codes, keys + exact_keys,
+            None if categories is None else key_categories + exact_categories)
+
+def cluster_groups(labels, totals, window, categories=None, minimums=()):
+    """Combine per-group totals into window clusters
+
+    Groups are clustered by cluster_codes(). totals maps names to per-group
+    arrays; names listed in minimums combine with min, the rest are summed.
+    Returns (cluster labels, cluster categories or None, cluster totals),
+    in cluster_codes() order.
+    """
+    totals = {name: np.asarray(values) for name, values in totals.items()}
+    codes, keys, key_categories = cluster_codes(labels, window, categories)
+
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(keys)))
+    return keys, key_categories, _reduce_sorted(totals, order, starts, minimums)
+
+def _reduce_sorted(totals, order, starts, minimums):
+    """reduceat over totals taken in order, one segment per start"""
+    if len(starts) == 0:
+        return {name: values[:0] for name, values in totals.items()}
+    return {
+        name: (np.minimum if name in minimums else np.add).reduceat(values[order], starts)
+        for name, values in totals.items()
+    }
+
+def _segment_codes(order, starts, ranks=None):
+    """Per-group code from a sorted order split at starts (renumbered by ranks, if given)"""
+    segments = np.zeros(len(order), dtype=np.int64)
+    segments[starts[1:]] = 1
+    segments = np.cumsum(segments)
+    if ranks is not None:
+        segments = ranks[segments]
+
+    codes = np.empty(len(order), dtype=np.int64)
+    codes[order] = segments
+    return codes
+
+def _window_clusters(days, window, categories):
+    """cluster_codes() for calendar windows over parsed day numbers"""
+    cats, cat_table = category_codes(categories if categories is not None else [None] * len(days))
+
+    if window.kind == 'rolling':
+        return _rolling_clusters(days, cats, cat_table, window, categories is not None)
+
+    bins = window.bins(days)
+    order = np.lexsort((cats, bins))
+    sorted_bins, sorted_cats = bins[order], cats[order]
+    boundaries = np.ones(len(order), dtype=bool)
+    boundaries[1:] = (sorted_bins[1:] != sorted_bins[:-1]) | (sorted_cats[1:] != sorted_cats[:-1])
+    starts = np.flatnonzero(boundaries)
+
+    return (_segment_codes(order, starts),
+            day_labels(window.bin_days(sorted_bins[starts])),
+            None if categories is None else [cat_table[c] for c in sorted_cats[starts].tolist()])
+
+def _rolling_clusters(days, cats, cat_table, window, by_category):
+    """Disjoint [day, day + N) windows per category, chained from the earliest expiry"""
+    order = np.lexsort((days, cats))
+    sorted_days, sorted_cats = days[order], cats[order]
+
+    # One ascending key per (category, day), spaced so a window never reaches the next category
+    low = int(sorted_days.min()) if len(days) else 0
+    span = (int(sorted_days.max()) - low if len(days) else 0) + window.days + 1
+    keys = sorted_cats * span + (sorted_days - low)
+
+    starts = []
+    start = 0
+    while start < len(keys):
+        starts.append(start)
+        start = int(np.searchsorted(keys, keys[start] + window.days, side='left'))
+    starts = np.array(starts, dtype=np.int64)
+
+    # Windows are found per category; number them by start day, then category
+    anchor_days, anchor_cats = sorted_days[starts], sorted_cats[starts]
+    by_start = np.lexsort((anchor_cats, anchor_days))
+    ranks = np.empty(len(starts), dtype=np.int64)
+    ranks[by_start] = np.arange(len(starts))
+
+    return (_segment_codes(order, starts, ranks),
+            day_labels(anchor_days[by_start]),
+            [cat_table[c] for c in anchor_cats[by_start].tolist()] if by_category else None)
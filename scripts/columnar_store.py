@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+"""
+Columnar Training Data Store (Python)
+Position and trader history exported as one .npy file per column, opened
+through memory maps so training reads only the pages it touches and repeated
+runs never re-parse anything
+
+Layout of a dataset directory:
+  manifest.json      kind, row count, column names, end-date table (positions)
+  <column>.npy       one array per field of the records.py layouts
+
+Usage:
+  python columnar_store.py import positions book.ndjson data/positions
+  python columnar_store.py import traders traders.ndjson data/traders
+  python columnar_store.py info data/positions
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+import records
+
+MANIFEST = 'manifest.json'
+STORE_FORMAT = 1
+
+# Record layout per dataset kind, keyed by id dtype
+KINDS = {
+    'positions': records.position_dtype,
+    'traders': records.trader_dtype,
+}
+
+# Wide enough for 0x-prefixed 32-byte hashes
+DEFAULT_ID_WIDTH = 66
+
+def count_rows(path):
+    """Number of non-blank lines in an NDJSON file"""
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+class DatasetWriter:
+    """Streams PositionTable / TraderTable chunks into a columnar dataset
+
+    Every column is a preallocated .npy memory map, so chunks are copied
+    straight into place and the whole dataset never sits in memory. End-date
+    codes are remapped into one dataset-wide table as chunks arrive.
+    """
+
+    def __init__(self, directory, kind, count, id_width=DEFAULT_ID_WIDTH):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown dataset kind: {kind!r}")
+
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.kind = kind
+        self.count = count
+        self.written = 0
+        self.end_date_codes = {}
+
+        dtype = KINDS[kind](f'S{id_width}')
+        self.columns = {
+            name: np.lib.format.open_memmap(os.path.join(directory, f'{name}.npy'), mode='w+',
+                                            dtype=dtype[name], shape=(count,))
+            for name in dtype.names
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def append(self, table):
+        """Copy one table chunk into the columns"""
+        chunk = table.records
+        start, stop = self.written, self.written + len(chunk)
+        if stop > self.count:
+            raise ValueError(f"More rows than the {self.count} the dataset was sized for")
+
+        id_width = self.columns['id'].dtype.itemsize
+        if chunk.dtype['id'].itemsize > id_width and len(chunk):
+            if np.char.str_len(chunk['id']).max() > id_width:
+                raise ValueError(f"Id longer than the dataset id width ({id_width})")
+
+        for name, column in self.columns.items():
+            if name == 'end_code':
+                codes = self.end_date_codes
+                global_codes = np.array([codes.setdefault(end_date, len(codes))
+                                         for end_date in table.end_dates], dtype=np.int32)
+                column[start:stop] = global_codes[chunk['end_code']]
+            else:
+                column[start:stop] = chunk[name]
+
+        self.written = stop
+
+    def close(self):
+        """Flush the columns and write the manifest (which makes the dataset visible)"""
+        if self.written != self.count:
+            raise ValueError(f"Dataset sized for {self.count} rows but {self.written} were written")
+
+        for column in self.columns.values():
+            column.flush()
+
+        manifest = {
+            'format': STORE_FORMAT,
+            'kind': self.kind,
+            'count': self.count,
+            'columns': list(self.columns),
+        }
+        if self.kind == 'positions':
+            manifest['end_dates'] = list(self.end_date_codes)
+
+        tmp_path = os.path.join(self.directory, f'{MANIFEST}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST))
+
+        self.columns = {}
+
+def write_dataset(directory, kind, tables, count, id_width=DEFAULT_ID_WIDTH):
+    """Write an iterable of table chunks holding count rows in total"""
+    with DatasetWriter(directory, kind, count, id_width) as writer:
+        for table in tables:
+            writer.append(table)
+    return directory
+
+def import_ndjson(source, directory, kind, chunk_size=100000, id_width=DEFAULT_ID_WIDTH):
+    """Convert an NDJSON export (position or trader dicts) into a dataset"""
+    from_dicts = (records.PositionTable if kind == 'positions' else records.TraderTable).from_dicts
+    count = count_rows(source)
+
+    def chunks():
+        with open(source, 'r') as f:
+            batch = []
+            for line in f:
+                if not line.strip():
+                    continue
+                batch.append(json.loads(line))
+                if len(batch) == chunk_size:
+                    yield from_dicts(batch)
+                    batch = []
+            if batch:
+                yield from_dicts(batch)
+
+    return write_dataset(directory, kind, chunks(), count, id_width)
+
+class ColumnarDataset:
+    """Read-only view of a dataset directory; columns are memory-mapped lazily
+
+    Opening reads only the manifest. A column file is mapped on first use and
+    its pages are read from disk only when a slice of it is touched.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+
+        if manifest.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported dataset format in {directory}: {manifest.get('format')}")
+
+        self.kind = manifest['kind']
+        self.count = manifest['count']
+        self.column_names = manifest['columns']
+        self.end_dates = manifest.get('end_dates', [])
+        self._columns = {}
+
+    def __len__(self):
+        return self.count
+
+    def column(self, name):
+        """Memory-mapped column (zero-copy; nothing is read until accessed)"""
+        column = self._columns.get(name)
+        if column is None:
+            if name not in self.column_names:
+                raise KeyError(name)
+            column = np.load(os.path.join(self.directory, f'{name}.npy'), mmap_mode='r')
+            self._columns[name] = column
+        return column
+
+    def columns(self, names=None):
+        """Several columns as a name -> memmap dict"""
+        return {name: self.column(name) for name in (names or self.column_names)}
+
+    def iter_chunks(self, names=None, chunk_size=1000000, start=0):
+        """Yield dicts of column slices (views into the maps), chunk_size rows at a time
+
+        Rows before start are skipped without being read. Position chunks
+        also carry the dataset-wide 'end_dates' table, so they can go
+        straight into predict_risk's columnar cluster engine.
+        """
+        columns = self.columns(names)
+        for start in range(start, self.count, chunk_size):
+            chunk = {name: column[start:start + chunk_size] for name, column in columns.items()}
+            if self.kind == 'positions':
+                chunk['end_dates'] = self.end_dates
+            yield chunk
+
+    def to_dicts(self, indices):
+        """Selected rows in the position / trader dict shape"""
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.zeros(indices.size, dtype=KINDS[self.kind](self.column('id').dtype))
+        for name in rows.dtype.names:
+            rows[name] = self.column(name)[indices]
+
+        if self.kind == 'positions':
+            return records.PositionTable(rows, self.end_dates).to_dicts()
+        return records.TraderTable(rows).to_dicts()
+
+def open_dataset(directory, kind=None):
+    """Open a dataset directory, checking its kind when given"""
+    dataset = ColumnarDataset(directory)
+    if kind is not None and dataset.kind != kind:
+        raise ValueError(f"{directory} holds {dataset.kind}, not {kind}")
+    return dataset
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Columnar training data store')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help='convert an NDJSON export into a dataset')
+    importer.add_argument('kind', choices=sorted(KINDS))
+    importer.add_argument('source', help='NDJSON file of position or trader dicts')
+    importer.add_argument('directory', help='dataset directory to write')
+    importer.add_argument('--chunk-size', type=int, default=100000)
+    importer.add_argument('--id-width', type=int, default=DEFAULT_ID_WIDTH,
+                          help='bytes reserved per id')
+
+    info = commands.add_parser('info', help='describe a dataset')
+    info.add_argument('directory')
+
+    return parser.parse_args(argv)
+
+def main():
+    """Import or describe columnar datasets"""
+
+    args = parse_args()
+
+    try:
+        if args.command == 'import':
+            import_ndjson(args.source, args.directory, args.kind, args.chunk_size, args.id_width)
+            dataset = open_dataset(args.directory)
+            print(f"✅ Imported {len(dataset)} {dataset.kind} into {args.directory}")
+        else:
+            dataset = open_dataset(args.directory)
+            print(json.dumps({
+                'kind': dataset.kind,
+                'count': len(dataset),
+                'columns': {name: str(dataset.column(name).dtype) for name in dataset.column_names},
+                'end_dates': len(dataset.end_dates)
+            }, indent=2))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+"""
+Expiry Horizon Index (Python)
+Cluster totals sorted by end date with prefix sums, so "exposure / PnL
+resolving within N days" is two binary searches instead of a rescan
+
+Clusters whose endDate cannot be placed on the calendar (missing or not
+ISO 8601) are the ones clustering keeps as exact fallback clusters; here
+they fall in no horizon and are totalled separately by undated().
+"""
+
+import numpy as np
+from datetime import datetime, timezone
+
+import clustering
+import predict_risk
+
+DEFAULT_HORIZONS = (7, 30, 90)
+
+MICROSECONDS_PER_DAY = 86400 * 10**6
+
+def utc_now():
+    """Current time as naive UTC, the clock parse_end_date() puts end dates on"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def parse_expiries(labels):
+    """(datetime64[us] expiries, parsed mask) for endDate labels
+
+    Unparsable labels (see clustering.parsed_end_date_days) get NaT and a
+    False mask entry instead of raising.
+    """
+    expiries = np.full(len(labels), np.datetime64('NaT'), dtype='datetime64[us]')
+    parsed = np.zeros(len(labels), dtype=bool)
+    for i, label in enumerate(labels):
+        try:
+            expiries[i] = clustering.parse_end_date(label)
+            parsed[i] = True
+        except (TypeError, ValueError):
+            pass
+    return expiries, parsed
+
+def _prefix_sums(values, order, dtype):
+    """Running totals of values taken in the given order, with a leading zero"""
+    sums = np.zeros(len(order) + 1, dtype=dtype)
+    np.cumsum(np.asarray(values, dtype=dtype)[order], out=sums[1:])
+    return sums
+
+class ExpiryIndex:
+    """Per-cluster value, PnL and position counts ordered by expiry
+
+    prefix arrays hold running totals over the sorted clusters with a leading
+    zero, so the total over clusters [lo, hi) is prefix[hi] - prefix[lo].
+    Clusters with unparsable end dates sit after the dated ones, past the
+    end of expiries, so no search ever reaches them.
+    """
+
+    def __init__(self, end_dates, total_values, total_pnls, cluster_sizes):
+        expiries, parsed = parse_expiries(end_dates)
+        dated, undated = np.flatnonzero(parsed), np.flatnonzero(~parsed)
+        order = np.concatenate([dated[np.argsort(expiries[dated], kind='stable')], undated])
+
+        self.end_dates = [end_dates[i] for i in order.tolist()]
+        self.expiries = expiries[order[:len(dated)]]
+        self.value_prefix = _prefix_sums(total_values, order, np.float64)
+        self.pnl_prefix = _prefix_sums(total_pnls, order, np.float64)
+        self.size_prefix = _prefix_sums(cluster_sizes, order, np.int64)
+
+    def __len__(self):
+        return len(self.end_dates)
+
+    @classmethod
+    def from_positions(cls, positions):
+        """Build from position dicts or a PositionTable (the predict_risk inputs)"""
+        columns = predict_risk.positions_to_columns(positions)
+        totals = predict_risk.aggregate_clusters(columns)
+
+        # Drop end dates no position refers to (e.g. a filtered PositionTable)
+        present = np.flatnonzero(totals['cluster_size'])
+        return cls([columns['end_dates'][i] for i in present.tolist()],
+                   totals['total_value'][present], totals['total_pnl'][present],
+                   totals['cluster_size'][present])
+
+    @classmethod
+    def from_accumulator(cls, accumulator):
+        """Build from a predict_risk.ClusterAccumulator (streamed positions)"""
+        return cls(accumulator.end_dates, accumulator.total_value,
+                   accumulator.total_pnl, accumulator.cluster_size)
+
+    @classmethod
+    def from_book(cls, book):
+        """Build from a RiskBook's running cluster totals"""
+        clusters = list(book.clusters.values())
+        return cls([cluster.end_date for cluster in clusters],
+                   [cluster.total_value for cluster in clusters],
+                   [cluster.total_pnl for cluster in clusters],
+                   [len(cluster.members) for cluster in clusters])
+
+    def _position(self, moment, side='right'):
+        return int(np.searchsorted(self.expiries, moment, side=side))
+
+    def window(self, start, end):
+        """Totals for clusters expiring in (start, end]"""
+        lo = self._position(np.datetime64(start, 'us'))
+        hi = self._position(np.datetime64(end, 'us'))
+        hi = max(hi, lo)
+
+        rollup = self._totals(lo, hi)
+        rollup['next_expiry'] = self.end_dates[lo] if lo < hi else None
+        return rollup
+
+    def horizon(self, days, now=None):
+        """Totals for clusters expiring after now and within the next `days` days"""
+        now = np.datetime64(now if now is not None else utc_now(), 'us')
+        rollup = self.window(now, now + np.timedelta64(int(days * MICROSECONDS_PER_DAY), 'us'))
+        rollup['days'] = days
+        return rollup
+
+    def horizons(self, days_list=DEFAULT_HORIZONS, now=None):
+        """horizon() for several horizons against the same clock reading"""
+        now = now if now is not None else utc_now()
+        return [self.horizon(days, now) for days in days_list]
+
+    def _totals(self, lo, hi):
+        return {
+            'clusters': hi - lo,
+            'positions': int(self.size_prefix[hi] - self.size_prefix[lo]),
+            'total_value': round(float(self.value_prefix[hi] - self.value_prefix[lo]), 2),
+            'total_pnl': round(float(self.pnl_prefix[hi] - self.pnl_prefix[lo]), 2)
+        }
+
+    def expired(self, now=None):
+        """Totals for clusters whose end date is already at or before now"""
+        now = np.datetime64(now if now is not None else utc_now(), 'us')
+        return self._totals(0, self._position(now))
+
+    def undated(self):
+        """Totals for clusters whose end date could not be parsed"""
+        return self._totals(len(self.expiries), len(self.end_dates))
+
+def parse_horizons(text):
+    """'7,30,90' -> [7, 30, 90] (fractional days allowed)"""
+    horizons = [float(part) for part in text.split(',') if part.strip()]
+    return [int(days) if days.is_integer() else days for days in horizons]
+
+def expiry_rollups(positions, days_list=DEFAULT_HORIZONS, now=None):
+    """Horizon rollups for a set of positions in one call"""
+    return ExpiryIndex.from_positions(positions).horizons(days_list, now)
+
+def add_expiry_metrics(prediction, index, days_list=DEFAULT_HORIZONS, now=None):
+    """Add horizon rollups to a prediction's metrics payload (in place)"""
+    prediction['metrics']['expiryHorizons'] = index.horizons(days_list, now)
+    return prediction
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+"""
+Opt-in Stage Instrumentation (Python)
+Per-stage wall time, CPU time and allocation counts for the prediction and
+training scripts, plus rolling latency histograms for long-running servers
+
+Enable with PREDICT_TIMINGS:
+  PREDICT_TIMINGS=1 (or json)  add a "_timings" block to the JSON output
+  PREDICT_TIMINGS=stderr       print the timings as one JSON line on stderr
+Scripts without JSON output (training) always report on stderr.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+ENV_VAR = 'PREDICT_TIMINGS'
+
+def timings_mode():
+    """'json', 'stderr' or None (disabled)"""
+    value = os.environ.get(ENV_VAR, '').strip().lower()
+    if value in ('', '0', 'false', 'off'):
+        return None
+    return 'stderr' if value == 'stderr' else 'json'
+
+def process_start_time():
+    """Wall-clock time this process started (Linux /proc), or None"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # Field 22 (starttime) counts clock ticks since boot; skip past the
+            # parenthesised command name, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+
+        with open('/proc/stat', 'r') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+def _gc_collections():
+    return sum(generation['collections'] for generation in gc.get_stats())
+
+class StageTimer:
+    """Collects wall/CPU time and allocation counts per named stage
+
+    Allocation counts are the net change in live interpreter memory blocks
+    (sys.getallocatedblocks) and the number of GC collections during the
+    stage. When disabled every method is a cheap no-op.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = timings_mode() if mode is None else mode
+        self.stages = []
+        self.created = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as one stage"""
+        if not self.enabled:
+            yield
+            return
+
+        blocks = sys.getallocatedblocks()
+        collections = _gc_collections()
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({
+                'name': name,
+                'wall_ms': round((time.perf_counter() - wall) * 1000, 3),
+                'cpu_ms': round((time.process_time() - cpu) * 1000, 3),
+                'allocated_blocks': sys.getallocatedblocks() - blocks,
+                'gc_collections': _gc_collections() - collections
+            })
+
+    def report(self):
+        """Timings block: stages plus process startup and totals"""
+        started = process_start_time()
+        return {
+            # Interpreter start plus module imports, up to this timer's creation
+            'startup_ms': round((self.created - started) * 1000, 1) if started else None,
+            'stages': self.stages,
+            'total_wall_ms': round((time.perf_counter() - self._wall_start) * 1000, 3),
+            'total_cpu_ms': round((time.process_time() - self._cpu_start) * 1000, 3)
+        }
+
+    def emit(self, result=None, output=None, **dumps_kwargs):
+        """Attach timings to a JSON result or write them to stderr
+
+        Returns the text to print: output unchanged unless timings go into
+        the JSON, in which case result is re-serialized with a _timings block.
+        """
+        if not self.enabled:
+            return output
+
+        if self.mode == 'json' and isinstance(result, dict):
+            return json.dumps(dict(result, _timings=self.report()), **dumps_kwargs)
+
+        print(json.dumps({'_timings': self.report()}), file=sys.stderr)
+        return output
+
+class LatencyHistogram:
+    """Rolling latency histogram with log2 buckets (1 us .. ~67 s)
+
+    Samples land in one of `slots` time slices of `slot_seconds` each; the
+    oldest slice is recycled as time moves on, so snapshots cover roughly the
+    last slots * slot_seconds seconds.
+    """
+
+    NUM_BUCKETS = 27
+
+    def __init__(self, slots=60, slot_seconds=60):
+        self.slots = slots
+        self.slot_seconds = slot_seconds
+        self._counts = [[0] * self.NUM_BUCKETS for _ in range(slots)]
+        self._slot_ids = [None] * slots
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds):
+        micros = int(seconds * 1e6)
+        return min(micros.bit_length(), self.NUM_BUCKETS - 1)
+
+    def record(self, seconds):
+        slot_id = int(time.time() // self.slot_seconds)
+        index = slot_id % self.slots
+        with self._lock:
+            if self._slot_ids[index] != slot_id:
+                self._slot_ids[index] = slot_id
+                self._counts[index] = [0] * self.NUM_BUCKETS
+            self._counts[index][self._bucket(seconds)] += 1
+
+    def snapshot(self):
+        """Counts and approximate percentiles (bucket upper bounds, in ms)"""
+        oldest = int(time.time() // self.slot_seconds) - self.slots + 1
+        totals = [0] * self.NUM_BUCKETS
+        with self._lock:
+            for slot_id, counts in zip(self._slot_ids, self._counts):
+                if slot_id is not None and slot_id >= oldest:
+                    totals = [a + b for a, b in zip(totals, counts)]
+
+        count = sum(totals)
+        summary = {'count': count, 'window_seconds': self.slots * self.slot_seconds}
+        for label, quantile in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            summary[label] = self._percentile(totals, count, quantile)
+        summary['buckets_ms'] = {
+            f"<={(1 << bucket) / 1000:g}": bucket_count
+            for bucket, bucket_count in enumerate(totals) if bucket_count
+        }
+        return summary
+
+    def _percentile(self, totals, count, quantile):
+        if not count:
+            return None
+        target = quantile * count
+        seen = 0
+        for bucket, bucket_count in enumerate(totals):
+            seen += bucket_count
+            if seen >= target:
+                return (1 << bucket) / 1000
+        return None
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+
+"""
+Prediction Memoization (Python)
+Bounded LRU cache of prediction results keyed by model version plus a
+canonical digest of the inputs, optionally backed by a small SQLite store
+shared by every worker process on the host
+
+Keys carry the model version (ModelCache.version, a content hash), so a
+retrained model never serves results computed by its predecessor; entries
+of superseded versions are dropped as soon as a new version is seen.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import records
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_STORE_ENTRIES = 10000
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot digest {type(value).__name__}")
+
+def _canonical_bytes(value):
+    if isinstance(value, (records.PositionTable, records.TraderTable)):
+        labels = json.dumps(getattr(value, 'end_dates', None)).encode('utf-8')
+        return value.records.dtype.str.encode('ascii') + labels + value.records.tobytes()
+    if isinstance(value, np.ndarray):
+        header = f'{value.dtype.str}{value.shape}'.encode('ascii')
+        return header + np.ascontiguousarray(value).tobytes()
+    return json.dumps(value, sort_keys=True, separators=(',', ':'),
+                      default=_json_default).encode('utf-8')
+
+def canonical_digest(*parts):
+    """Digest of JSON-like values, arrays or record tables, independent of dict key order"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = _canonical_bytes(part)
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+def file_stamp(path):
+    """(path, mtime, size) of an input file, so an unchanged file digests the same"""
+    st = os.stat(path)
+    return [os.path.abspath(path), st.st_mtime_ns, st.st_size]
+
+class MemoStore:
+    """SQLite table of JSON results shared across processes
+
+    Rows expire by wall-clock time; the table is trimmed to max_entries
+    (oldest first) every so often rather than on every write.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_STORE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, '
+                         'namespace TEXT, version TEXT, value TEXT, expires REAL, stored REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS memo_stored ON memo (stored)')
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._db.execute('SELECT value, expires FROM memo WHERE key = ?',
+                                   (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, namespace, version, value, expires, now):
+        text = json.dumps(value, separators=(',', ':'), default=_json_default)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO memo VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, namespace, version, text, expires, now))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._trim(now)
+
+    def _trim(self, now):
+        self._db.execute('DELETE FROM memo WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        self._db.execute('DELETE FROM memo WHERE key IN (SELECT key FROM memo '
+                         'ORDER BY stored DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def drop_versions(self, namespace, version):
+        """Delete a namespace's rows computed under any other model version"""
+        with self._lock:
+            self._db.execute('DELETE FROM memo WHERE namespace = ? AND version != ?',
+                             (namespace, version))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class MemoCache:
+    """Thread-safe LRU of results keyed by (namespace, model version, input digest)
+
+    Returned values are shared with the cache and must not be mutated.
+    max_entries=0 disables memoization (every call computes).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, store=None, clock=time.time):
+        self.max_entries = max_entries
+        self.store = store
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'store_hits': 0, 'misses': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _check_version(self, namespace, version):
+        """Forget entries of older model versions the first time a new one shows up"""
+        if self._versions.get(namespace) == version:
+            return
+        with self._lock:
+            if self._versions.get(namespace) == version:
+                return
+            stale = [key for key in self._entries
+                     if key[0] == namespace and key[1] != version]
+            for key in stale:
+                del self._entries[key]
+            self._versions[namespace] = version
+        if self.store is not None:
+            self.store.drop_versions(namespace, version)
+
+    def get(self, namespace, version, digest):
+        """Cached value or None"""
+        now = self.clock()
+        key = (namespace, version, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                del self._entries[key]
+
+        if self.store is not None:
+            value = self.store.get(':'.join(key), now)
+            if value is not None:
+                self._remember(key, value, None, 'store_hits')
+                return value
+        return None
+
+    def _remember(self, key, value, expires, counter=None):
+        with self._lock:
+            if counter is not None:
+                self.stats[counter] += 1
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, namespace, version, digest, value, ttl=None):
+        now = self.clock()
+        expires = now + ttl if ttl is not None else None
+        key = (namespace, version, digest)
+        self._remember(key, value, expires)
+        if self.store is not None:
+            self.store.put(':'.join(key), namespace, version, value, expires, now)
+
+    def memoize(self, namespace, version, inputs, compute, ttl=None):
+        """compute() once per model version and distinct inputs (for ttl seconds, if given)"""
+        if not self.enabled:
+            return compute()
+
+        self._check_version(namespace, version)
+        digest = canonical_digest(inputs)
+        value = self.get(namespace, version, digest)
+        if value is not None:
+            return value
+
+        with self._lock:
+            self.stats['misses'] += 1
+        value = compute()
+        self.put(namespace, version, digest, value, ttl)
+        return value
+
+    def snapshot(self):
+        """Entry count and hit / miss counters"""
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries,
+                        store=self.store.path if self.store is not None else None)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+"""
+Compiled Model Store (Python)
+Writes precompiled model artifacts next to the JSON models and keeps them
+cached in-process, hot-swapping when training writes a new version
+
+Artifacts are plain JSON (compiled models are only lists, dicts and
+numbers), so loading one never executes code from the model directory.
+"""
+
+import os
+import sys
+import json
+import threading
+
+# Bump when the compiled layout changes so old artifacts are recompiled
+ARTIFACT_FORMAT = 2
+
+def artifact_path(model_path):
+    """Compiled artifact path for a JSON model path (risk_model.json -> risk_model.compiled.json)"""
+    root, _ = os.path.splitext(model_path)
+    return root + '.compiled.json'
+
+def write_json(path, data, **dump_options):
+    """Write data as JSON to a temporary file and rename it into place
+
+    Readers see either the old or the new file, never a partial one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_options)
+    os.replace(tmp_path, path)
+    return path
+
+def write_artifact(model_path, kind, compiled):
+    """Atomically write the compiled model next to model_path"""
+    return write_json(artifact_path(model_path),
+                      {'format': ARTIFACT_FORMAT, 'kind': kind, 'compiled': compiled})
+
+def write_model(model_path, model, kind, compiled):
+    """Atomically write a trained JSON model and its compiled artifact
+
+    The artifact goes first, then the JSON, then the artifact is stamped
+    with the JSON's mtime so ModelCache serves it again. A reader reloading
+    in between sees the new artifact, or the new JSON (newer, so compiled
+    directly); either way a complete file of the new version.
+    """
+    artifact = write_artifact(model_path, kind, compiled)
+    write_json(model_path, model, indent=2, default=str)
+
+    mtime = os.stat(model_path).st_mtime_ns
+    os.utime(artifact, ns=(mtime, mtime))
+    return artifact
+
+class ModelCache:
+    """In-process cache of one compiled model, keyed by file mtime and content hash
+
+    get() costs one or two stat() calls when nothing changed. When the
+    artifact's mtime or size moves, its bytes are re-hashed and only
+    parsed if the content really differs; the new model then replaces the
+    old one in a single reference assignment. If no artifact exists (or the
+    JSON is newer), the JSON model is compiled once per JSON version instead.
+    """
+
+    def __init__(self, model_path, kind, compile_fn, default=None):
+        # compile_fn(model_dict) -> compiled model. default is compiled when
+        # no model file exists; a file that fails to load compiles None.
+        self.model_path = model_path
+        self.kind = kind
+        self.compile_fn = compile_fn
+        self.default = default
+
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._digest = None
+        self._current = (None, None)  # (compiled, version), swapped as one reference
+        self._loaded = False
+        self.version = None
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size)
+
+    def _current_source(self):
+        """Stamp of the file to load: the artifact unless the JSON is newer"""
+        artifact = self._stat(artifact_path(self.model_path))
+        source = self._stat(self.model_path)
+
+        if artifact is not None and (source is None or artifact[1] >= source[1]):
+            return artifact
+        return source
+
+    def get(self):
+        """Current compiled model (reloading if the files changed)"""
+        return self.snapshot()[0]
+
+    def snapshot(self):
+        """(compiled model, version) from the same load
+
+        Read both from here when results are keyed by version: reading get()
+        and .version separately can pair one model with the next one's
+        version if a hot swap lands in between.
+        """
+        stamp = self._current_source()
+        if not self._loaded or stamp != self._stamp:
+            with self._lock:
+                if not self._loaded or stamp != self._stamp:
+                    self._load(stamp)
+        return self._current
+
+    def reload(self):
+        """Drop the cached model and load it again"""
+        with self._lock:
+            self._loaded = False
+            self._digest = None
+            self._load(self._current_source())
+        return self._current[0]
+
+    def _load(self, stamp):
+        if stamp is None:
+            # Neither file exists: serve the default model
+            self._set(self.compile_fn(self.default), None, None, 'default')
+            return
+
+        # Only needed once a model file exists; kept off the cold-start path otherwise
+        import hashlib
+
+        path = stamp[0]
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"Error loading model {path}: {e}", file=sys.stderr)
+            self._set(self.compile_fn(None), stamp, None, 'unavailable')
+            return
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == self._digest:
+            # Touched but unchanged; keep the compiled model
+            self._stamp = stamp
+            return
+
+        try:
+            compiled = None
+            if path != self.model_path:
+                artifact = json.loads(data)
+                if artifact.get('format') == ARTIFACT_FORMAT and artifact.get('kind') == self.kind:
+                    compiled = artifact['compiled']
+                else:
+                    # Stale artifact layout: compile the JSON model instead
+                    with open(self.model_path, 'r') as f:
+                        compiled = self.compile_fn(json.load(f))
+            else:
+                compiled = self.compile_fn(json.loads(data))
+        except Exception as e:
+            print(f"Error loading model {path}: {e}", file=sys.stderr)
+            self._set(self.compile_fn(None), stamp, digest, 'unavailable')
+            return
+
+        self._set(compiled, stamp, digest, digest[:16])
+
+    def _set(self, compiled, stamp, digest, version):
+        self._current = (compiled, version)
+        self._stamp = stamp
+        self._digest = digest
+        self.version = version
+        self._loaded = True
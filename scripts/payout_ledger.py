@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+"""
+LP Payout Ledger (Python)
+Distributes each epoch's trader fee and profit-split revenue to the vault's
+LPs in integer cents, so every cent of revenue is accounted for exactly
+
+Per epoch and revenue stream (fees, splits):
+  pool   = sum over traders of revenue_cents * allocation
+  payout = pool split pro rata over LP share balances
+
+The yield model's fees_allocation / splits_allocation are applied in basis
+points; sub-cent pool remainders carry over to the next epoch. The pro-rata
+split uses the largest remainder method: every LP gets floor(pool * shares /
+total), and the cents left over go one each to the LPs with the largest
+remainders (ties to the earlier LP), so payouts always sum to the pool.
+A block of epochs is distributed as one (epochs x LPs) array operation.
+
+LP balances are a JSON array or NDJSON of {"lp": "...", "shares": 1000000}
+(integer share units). Epoch history is NDJSON, one epoch per line, revenue in
+integer cents per trader; "shares" optionally updates balances from that
+epoch on:
+  {"epoch": 1, "fees": {"0xabc...": 1250}, "splits": {"0xabc...": -300},
+   "shares": {"lp_7": 0}}
+
+Usage:
+  python payout_ledger.py lps.ndjson epochs.ndjson --output ledger.ndjson
+  python payout_ledger.py --mock-lps 100000 --mock-traders 5000 --mock-epochs 1000
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import numpy as np
+
+import instrumentation
+
+# Allocations are applied in basis points
+BPS = 10000
+
+# Epochs distributed per (epochs x LPs) block; bounds the block's working set
+DEFAULT_BLOCK_EPOCHS = 32
+
+STREAMS = ('fees', 'splits')
+
+def allocation_bps(allocation_model):
+    """Trader ids and their (fee, split) allocations in basis points"""
+    trader_ids = list(allocation_model)
+    fee_bps = np.fromiter((round(allocation_model[trader_id]['fees_allocation'] * BPS)
+                           for trader_id in trader_ids), np.int64, len(trader_ids))
+    split_bps = np.fromiter((round(allocation_model[trader_id]['splits_allocation'] * BPS)
+                             for trader_id in trader_ids), np.int64, len(trader_ids))
+    return trader_ids, fee_bps, split_bps
+
+def epoch_pools(units, carry):
+    """Whole-cent pool per epoch from pool units (cents * bps), and the new sub-cent carry"""
+    carried = carry + np.cumsum(units)
+    cents = carried // BPS
+    return np.diff(cents, prepend=0), int(carried[-1] - cents[-1] * BPS)
+
+def _long_divmod(pools, shares, total):
+    """divmod(pools * shares, total) for pools >= 0, one base-2^k digit of pools at a time
+
+    Keeps every intermediate below 2^63 as long as total < 2^61, for pools
+    and share balances whose product would overflow int64.
+    """
+    bits = 62 - int(total).bit_length()
+    if bits < 1:
+        raise ValueError(f"Total shares {total} too large for exact int64 payouts")
+    mask = (1 << bits) - 1
+    digits = -(-int(pools.max()).bit_length() // bits)
+
+    quotients = np.zeros((len(pools), len(shares)), dtype=np.int64)
+    remainders = np.zeros_like(quotients)
+    for digit in range(digits - 1, -1, -1):
+        step = ((pools >> (digit * bits)) & mask)[:, None] * shares
+        step, remainders = np.divmod((remainders << bits) + step, total)
+        quotients = (quotients << bits) + step
+    return quotients, remainders
+
+def share_divmod(pools, shares, total):
+    """(floor(pool * shares / total), remainder) for each epoch pool and LP, exactly"""
+    magnitudes = np.abs(pools)
+    if int(magnitudes.max(initial=0)) * int(shares.max(initial=0)) < 2 ** 63:
+        quotients, remainders = np.divmod(magnitudes[:, None] * shares, total)
+    else:
+        quotients, remainders = _long_divmod(magnitudes, shares, total)
+
+    # Negative pools (net split losses): floor(-x) = -ceil(x)
+    negative = (pools < 0)[:, None]
+    if negative.any():
+        inexact = negative & (remainders > 0)
+        quotients = np.where(negative, -quotients, quotients) - inexact
+        remainders = np.where(inexact, total - remainders, remainders)
+    return quotients, remainders
+
+def largest_remainder(quotients, remainders, leftover):
+    """Add one cent to the leftover LPs with the largest remainders (ties to the lower index)"""
+    if leftover <= 0:
+        return quotients
+    kth = len(remainders) - leftover
+    threshold = np.partition(remainders, kth)[kth]
+    above = np.flatnonzero(remainders > threshold)
+    ties = np.flatnonzero(remainders == threshold)[:leftover - len(above)]
+    quotients[above] += 1
+    quotients[ties] += 1
+    return quotients
+
+def distribute(pools, shares):
+    """(epochs x LPs) integer-cent payouts of each epoch pool over share balances
+
+    Each row sums exactly to its pool. shares must not all be zero.
+    """
+    pools = np.asarray(pools, dtype=np.int64)
+    shares = np.asarray(shares, dtype=np.int64)
+    total = int(shares.sum())
+    payouts, remainders = share_divmod(pools, shares, total)
+
+    leftovers = (pools - payouts.sum(axis=1)).tolist()
+    for row, leftover in enumerate(leftovers):
+        largest_remainder(payouts[row], remainders[row], leftover)
+    return payouts
+
+class PayoutLedger:
+    """Accrued fee and split earnings per LP over a stream of epochs"""
+
+    def __init__(self, allocation_model, balances=(), breakdown_ratios=None):
+        self.trader_ids, fee_bps, split_bps = allocation_bps(allocation_model)
+        self.trader_index = {trader_id: i for i, trader_id in enumerate(self.trader_ids)}
+        self.bps = {'fees': fee_bps, 'splits': split_bps}
+        self.breakdown_ratios = breakdown_ratios
+
+        self.lp_ids = []
+        self.lp_index = {}
+        self.shares = np.zeros(0, dtype=np.int64)
+        self.accrued = {stream: np.zeros(0, dtype=np.int64) for stream in STREAMS}
+
+        self.carry = {stream: 0 for stream in STREAMS}
+        self.revenue = {stream: 0 for stream in STREAMS}
+        self.distributed = {stream: 0 for stream in STREAMS}
+        self.epochs = 0
+
+        self.set_shares(balances)
+
+    def set_shares(self, balances):
+        """Apply (lp, shares) balance updates; unknown LPs join the ledger"""
+        if isinstance(balances, dict):
+            balances = balances.items()
+        positions = []
+        values = []
+        for lp, shares in balances:
+            if lp not in self.lp_index:
+                self.lp_index[lp] = len(self.lp_ids)
+                self.lp_ids.append(lp)
+            positions.append(self.lp_index[lp])
+            values.append(shares)
+
+        grow = len(self.lp_ids) - len(self.shares)
+        if grow:
+            self.shares = np.concatenate([self.shares, np.zeros(grow, dtype=np.int64)])
+            for stream in STREAMS:
+                self.accrued[stream] = np.concatenate([self.accrued[stream],
+                                                       np.zeros(grow, dtype=np.int64)])
+        if positions:
+            values = np.asarray(values, dtype=np.int64)
+            if (values < 0).any():
+                raise ValueError("Share balances cannot be negative")
+            self.shares[positions] = values
+        return self
+
+    def add_epochs(self, fee_cents, split_cents):
+        """Distribute a block of epochs; revenue is (epochs x traders) cents in trader_ids order
+
+        Returns the block's {'fees', 'splits'} (epochs x LPs) payouts, which
+        are also added to the accrued totals.
+        """
+        revenue = {'fees': np.asarray(fee_cents, dtype=np.int64),
+                   'splits': np.asarray(split_cents, dtype=np.int64)}
+        epochs = len(revenue['fees'])
+        total_shares = int(self.shares.sum())
+        payouts = {}
+
+        for stream in STREAMS:
+            if epochs == 0:
+                payouts[stream] = np.zeros((0, len(self.shares)), dtype=np.int64)
+                continue
+            units = revenue[stream] @ self.bps[stream]
+            self.revenue[stream] += int(revenue[stream].sum())
+            pools, self.carry[stream] = epoch_pools(units, self.carry[stream])
+
+            if total_shares == 0:
+                # Nobody to pay; the pools wait for the next epoch with LPs
+                self.carry[stream] += int(pools.sum()) * BPS
+                payouts[stream] = np.zeros((epochs, len(self.shares)), dtype=np.int64)
+                continue
+
+            payouts[stream] = distribute(pools, self.shares)
+            self.accrued[stream] += payouts[stream].sum(axis=0)
+            self.distributed[stream] += int(pools.sum())
+
+        self.epochs += epochs
+        return payouts
+
+    def revenue_matrix(self, epochs, stream):
+        """(epochs x traders) cents from per-epoch {trader_id: cents} maps; unallocated traders drop out"""
+        matrix = np.zeros((len(epochs), len(self.trader_ids)), dtype=np.int64)
+        for row, epoch in enumerate(epochs):
+            for trader_id, cents in epoch.get(stream, {}).items():
+                column = self.trader_index.get(trader_id)
+                if column is not None:
+                    matrix[row, column] = _cents(cents)
+        return matrix
+
+    def add_epoch_records(self, epochs):
+        """add_epochs() for epoch dicts (see the module docstring), applying share updates in order"""
+        for has_update, group in itertools.groupby(enumerate(epochs),
+                                                   key=lambda item: 'shares' in item[1]):
+            group = [epoch for _, epoch in group]
+            if has_update:
+                # Each update takes effect from its own epoch
+                for epoch in group:
+                    self.set_shares(epoch['shares'])
+                    self.add_epochs(self.revenue_matrix([epoch], 'fees'),
+                                    self.revenue_matrix([epoch], 'splits'))
+            else:
+                self.add_epochs(self.revenue_matrix(group, 'fees'),
+                                self.revenue_matrix(group, 'splits'))
+        return self
+
+    def rows(self):
+        """Per-LP ledger rows: shares and accrued cents"""
+        fees, splits = self.accrued['fees'].tolist(), self.accrued['splits'].tolist()
+        return [{'lp': lp, 'shares': shares, 'fees_cents': fees[i], 'splits_cents': splits[i],
+                 'total_cents': fees[i] + splits[i]}
+                for i, (lp, shares) in enumerate(zip(self.lp_ids, self.shares.tolist()))]
+
+    def summary(self):
+        """Epoch count, revenue, distributed cents and carried sub-cent remainders"""
+        distributed = self.distributed['fees'] + self.distributed['splits']
+        summary = {
+            'epochs': self.epochs,
+            'lps': len(self.lp_ids),
+            'traders': len(self.trader_ids),
+            'revenue_cents': dict(self.revenue),
+            'distributed_cents': dict(self.distributed),
+            # Pool units (cents * bps) not yet paid out: sub-cent remainders and unpaid pools
+            'carried_units': dict(self.carry),
+            'breakdown': {stream: round(self.distributed[stream] / distributed, 4)
+                          if distributed else 0.0 for stream in STREAMS}
+        }
+        if self.breakdown_ratios is not None:
+            summary['model_breakdown'] = self.breakdown_ratios
+        return summary
+
+def _cents(value):
+    """Integer cents, refusing fractional amounts"""
+    cents = int(value)
+    if cents != value:
+        raise ValueError(f"Revenue must be whole cents, not {value!r}")
+    return cents
+
+def accrue(allocation_model, balances, blocks, breakdown_ratios=None):
+    """Ledger after distributing (fee_cents, split_cents) blocks over fixed balances"""
+    ledger = PayoutLedger(allocation_model, balances, breakdown_ratios)
+    for fee_cents, split_cents in blocks:
+        ledger.add_epochs(fee_cents, split_cents)
+    return ledger
+
+def load_balances(path):
+    """(lp, shares) pairs from a JSON array or NDJSON of {"lp", "shares"}"""
+    with open(path, 'r') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    return [(entry['lp'], int(entry['shares'])) for entry in entries]
+
+def iter_epoch_records(path, block_epochs=DEFAULT_BLOCK_EPOCHS):
+    """Lists of up to block_epochs epoch dicts from an NDJSON history"""
+    with open(path, 'r') as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            epochs = [json.loads(line) for line in itertools.islice(lines, block_epochs)]
+            if not epochs:
+                return
+            yield epochs
+
+def load_yield_model(path):
+    """Allocation model and breakdown ratios of a saved yield model"""
+    with open(path, 'r') as f:
+        model = json.load(f)
+    return model.get('allocation_model', {}), model.get('breakdown_ratios')
+
+def write_rows(rows, path):
+    """Write ledger rows as NDJSON, replacing path atomically"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+    os.replace(tmp_path, path)
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Distribute trader revenue to LPs in integer cents')
+    parser.add_argument('balances', nargs='?', default=None,
+                        help='LP share balances (JSON array or NDJSON)')
+    parser.add_argument('epochs', nargs='?', default=None, help='epoch revenue history (NDJSON)')
+    parser.add_argument('--model', default=None, metavar='PATH',
+                        help='yield model with the allocation (default: $MODEL_OUTPUT_PATH '
+                             'or yield_model.json)')
+    parser.add_argument('--block-epochs', type=int, default=DEFAULT_BLOCK_EPOCHS,
+                        help='epochs distributed per array operation')
+    parser.add_argument('--output', default=None, help='write per-LP ledger rows here (NDJSON)')
+    parser.add_argument('--mock-lps', type=float, default=None, metavar='COUNT',
+                        help='use synthetic balances, revenue and allocation instead of files')
+    parser.add_argument('--mock-traders', type=int, default=1000)
+    parser.add_argument('--mock-epochs', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None, help='seed for --mock-lps')
+    return parser.parse_args(argv)
+
+def main():
+    """Run the ledger over an epoch history and print its summary"""
+
+    args = parse_args()
+    if args.mock_lps is None and (args.balances is None or args.epochs is None):
+        print("Error: Give LP balances and an epoch history, or --mock-lps COUNT", file=sys.stderr)
+        sys.exit(1)
+
+    timer = instrumentation.StageTimer()
+
+    try:
+        if args.mock_lps is not None:
+            import synthetic
+
+            with timer.stage('data_load'):
+                allocation_model, balances = synthetic.payout_setup(
+                    int(args.mock_lps), args.mock_traders, args.seed)
+                ledger = PayoutLedger(allocation_model, balances)
+            with timer.stage('distribute'):
+                for fee_cents, split_cents in synthetic.iter_epoch_revenue(
+                        args.mock_epochs, args.mock_traders, args.block_epochs, args.seed):
+                    ledger.add_epochs(fee_cents, split_cents)
+        else:
+            with timer.stage('data_load'):
+                model_path = args.model or os.environ.get('MODEL_OUTPUT_PATH', 'yield_model.json')
+                allocation_model, breakdown_ratios = load_yield_model(model_path)
+                ledger = PayoutLedger(allocation_model, load_balances(args.balances),
+                                      breakdown_ratios)
+            with timer.stage('distribute'):
+                for epochs in iter_epoch_records(args.epochs, args.block_epochs):
+                    ledger.add_epoch_records(epochs)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Error: Payout run failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        with timer.stage('save'):
+            write_rows(ledger.rows(), args.output)
+
+    print(json.dumps(ledger.summary(), indent=2))
+    timer.emit()
+
+if __name__ == "__main__":
+    main()
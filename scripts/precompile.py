@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Bytecode Precompiler (Python)
+Compiles the prediction and training modules into __pycache__ ahead of
+time, for deployments that spawn the scripts cold on a read-only
+filesystem (where every spawn would otherwise recompile them from source)
+
+Usage:
+  python precompile.py               # timestamp-checked .pyc (safe while editing)
+  python precompile.py --unchecked   # hash-based .pyc that is never re-validated
+                                     # (immutable images: skips a stat per import)
+
+A script run by path (python predict_yield.py) is still compiled on every
+spawn; run it as a module from this directory (python -m predict_yield) to
+load its precompiled bytecode as well.
+"""
+
+import os
+import sys
+import argparse
+import compileall
+import py_compile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def precompile(directory=SCRIPTS_DIR, unchecked=False, optimize=-1):
+    """Compile every module in directory; returns True when all compiled"""
+    if unchecked:
+        mode = py_compile.PycInvalidationMode.UNCHECKED_HASH
+    else:
+        mode = py_compile.PycInvalidationMode.TIMESTAMP
+    return bool(compileall.compile_dir(directory, maxlevels=0, quiet=1, force=True,
+                                       optimize=optimize, invalidation_mode=mode))
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Precompile the scripts to bytecode')
+    parser.add_argument('--unchecked', action='store_true',
+                        help='write hash-based .pyc files that are never checked against the source')
+    parser.add_argument('--directory', default=SCRIPTS_DIR, help='directory to compile')
+    return parser.parse_args(argv)
+
+def main():
+    """Compile the scripts directory"""
+
+    args = parse_args()
+    if not precompile(args.directory, args.unchecked):
+        print(f"Error: Failed to compile modules in {args.directory}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"✅ Precompiled {args.directory}"
+          f"{' (unchecked hash-based .pyc)' if args.unchecked else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,38 @@ Loads trained risk model and makes risk predictions
 """
 
 import os
+import sys
 import json
+import argparse
+import itertools
 import numpy as np
 from datetime import datetime, timedelta
 
-def load_risk_model():
+import clustering
+import expiry_index
+import instrumentation
+import model_store
+import records
+import synthetic
+import tail_risk
+
+HIGH_RISK_RECOMMENDATIONS = [
+    "Consider reducing position sizes in clustered markets",
+    "Monitor markets ending in the same time period",
+    "Diversify across different market categories",
+    "Consider taking partial profits if positions are profitable"
+]
+
+LOW_RISK_RECOMMENDATIONS = [
+    "Risk levels are within acceptable ranges",
+    "Continue monitoring position clusters",
+    "Consider gradual position sizing increases"
+]
+
+def load_risk_model(model_path=None):
     """Load the trained risk model"""
-    model_path = os.environ.get('MODEL_OUTPUT_PATH', 'risk_model.json')
+    if model_path is None:
+        model_path = os.environ.get('MODEL_OUTPUT_PATH', 'risk_model.json')
 
     if not os.path.exists(model_path):
         # Return default structure if no model exists
@@ -37,63 +62,89 @@ def load_risk_model():
         with open(model_path, 'r') as f:
             return json.load(f)
     except Exception as e:
-        print(f"Error loading risk model: {e}", file=__import__('sys').stderr)
+        print(f"Error loading risk model: {e}", file=sys.stderr)
         return None
 
-def generate_mock_positions():
+def generate_mock_positions(seed=None):
     """Generate mock position data for risk assessment"""
-    positions = []
+    rng = synthetic.make_rng(seed)
 
     # Create some positions with potential risk
     base_date = datetime.now()
     risk_end_date = base_date + timedelta(days=30)
 
-    # High-risk cluster
-    for i in range(8):  # 8 positions in risky cluster
-        position = {
-            'id': f'pos_high_{i}',
-            'endDate': risk_end_date.strftime('%Y-%m-%d'),
-            'entryPrice': np.random.uniform(0.1, 1.0),
-            'shares': np.random.randint(50, 200),
-            'pnl': np.random.uniform(-500, -50),  # All negative PnL
-            'status': 'open'
-        }
-        positions.append(position)
+    # High-risk cluster: 8 positions, all negative PnL
+    positions = synthetic.cluster_positions(
+        rng, 8, risk_end_date.strftime('%Y-%m-%d'), 'pos_high_',
+        share_range=(50, 200), pnl_range=(-500, -50))
 
-    # Low-risk cluster
+    # Low-risk cluster: 3 positions, mixed PnL
     safe_end_date = base_date + timedelta(days=90)
-    for i in range(3):  # 3 positions in safe cluster
-        position = {
-            'id': f'pos_low_{i}',
-            'endDate': safe_end_date.strftime('%Y-%m-%d'),
-            'entryPrice': np.random.uniform(0.1, 1.0),
-            'shares': np.random.randint(10, 50),
-            'pnl': np.random.uniform(-20, 50),  # Mixed PnL
-            'status': 'open'
-        }
-        positions.append(position)
+    positions += synthetic.cluster_positions(
+        rng, 3, safe_end_date.strftime('%Y-%m-%d'), 'pos_low_',
+        share_range=(10, 50), pnl_range=(-20, 50))
 
     return positions
 
-def assess_cluster_risk(positions, model_weights):
-    """Assess risk for position clusters"""
+def positions_to_columns(positions, categories=False):
+    """Columnar view of positions (a list of dicts or a PositionTable)
+
+    End dates are integer-coded in first-appearance order, so code i maps to
+    end_dates[i] and clusters come out in the same order as the dict-based
+    grouping. With categories, dicts also get category_code / categories
+    columns (a PositionTable carries them whenever its positions had any).
+    """
+    if isinstance(positions, records.PositionTable):
+        return positions.columns()
+
+    # Dicts: extract only the columns the cluster engine needs
+    count = len(positions)
+    end_date_codes = {}
+
+    if categories:
+        columns = positions_to_columns(positions)
+        category_codes = {}
+        columns['category_code'] = np.fromiter(
+            (category_codes.setdefault(p.get('category'), len(category_codes)) for p in positions),
+            dtype=np.int32, count=count)
+        columns['categories'] = list(category_codes)
+        return columns
 
-    # Group positions by end date
-    clusters = {}
-    for position in positions:
-        end_date = position['endDate']
-        if end_date not in clusters:
-            clusters[end_date] = []
-        clusters[end_date].append(position)
+    return {
+        'entry_price': np.fromiter((p['entryPrice'] for p in positions), dtype=np.float64, count=count),
+        'shares': np.fromiter((p['shares'] for p in positions), dtype=np.float64, count=count),
+        'pnl': np.fromiter((p['pnl'] for p in positions), dtype=np.float64, count=count),
+        'end_code': np.fromiter(
+            (end_date_codes.setdefault(p['endDate'], len(end_date_codes)) for p in positions),
+            dtype=np.int32, count=count),
+        'end_dates': list(end_date_codes)
+    }
 
-    risk_assessments = []
+def aggregate_clusters(columns):
+    """Per-cluster totals via grouped reductions over the end-date codes"""
+    num_clusters = len(columns['end_dates'])
+    end_code = columns['end_code']
 
-    for end_date, cluster_positions in clusters.items():
-        # Calculate cluster metrics
-        total_value = sum(p['entryPrice'] * p['shares'] for p in cluster_positions)
-        total_pnl = sum(p['pnl'] for p in cluster_positions)
-        cluster_size = len(cluster_positions)
+    return {
+        'total_value': np.bincount(end_code, weights=columns['entry_price'] * columns['shares'],
+                                   minlength=num_clusters),
+        'total_pnl': np.bincount(end_code, weights=columns['pnl'], minlength=num_clusters),
+        'cluster_size': np.bincount(end_code, minlength=num_clusters)
+    }
 
+def assess_cluster_totals(end_dates, total_values, total_pnls, cluster_sizes, model_weights,
+                          categories=None):
+    """Build risk assessments from per-cluster totals
+
+    categories, given for category-aware clustering, adds each cluster's
+    market category to its assessment.
+    """
+
+    drawdown_threshold = model_weights.get('drawdown_threshold', 4.0)
+    risk_assessments = []
+
+    for code, (end_date, total_value, total_pnl, cluster_size) in enumerate(zip(
+            end_dates, total_values, total_pnls, cluster_sizes)):
         # Calculate drawdown percentage
         if total_value > 0:
             drawdown_pct = abs(total_pnl) / total_value if total_pnl < 0 else 0
@@ -101,7 +152,7 @@ def assess_cluster_risk(positions, model_weights):
             drawdown_pct = 0
 
         # Assess risk level
-        if drawdown_pct > model_weights.get('drawdown_threshold', 4.0):
+        if drawdown_pct > drawdown_threshold:
             risk_level = 'high'
             severity = 'high'
         elif drawdown_pct > 2.0:
@@ -111,7 +162,7 @@ def assess_cluster_risk(positions, model_weights):
             risk_level = 'low'
             severity = 'low'
 
-        risk_assessments.append({
+        assessment = {
             'end_date': end_date,
             'cluster_size': cluster_size,
             'drawdown_percentage': round(drawdown_pct * 100, 2),
@@ -119,10 +170,181 @@ def assess_cluster_risk(positions, model_weights):
             'total_pnl': round(total_pnl, 2),
             'risk_level': risk_level,
             'severity': severity
-        })
+        }
+        if categories is not None:
+            assessment['category'] = categories[code]
+        risk_assessments.append(assessment)
 
     return risk_assessments
 
+def assess_windowed_totals(labels, totals, model_weights, categories=None):
+    """Assessments for per-group totals binned into the model's cluster windows
+
+    labels[i] (and categories[i]) identify group i of the totals arrays.
+    """
+    window, by_category = clustering.model_clustering(model_weights)
+    keys, key_categories, clustered = clustering.cluster_groups(
+        labels, totals, window, categories if by_category else None)
+
+    return assess_cluster_totals(
+        keys,
+        clustered['total_value'].tolist(),
+        clustered['total_pnl'].tolist(),
+        clustered['cluster_size'].tolist(),
+        model_weights,
+        key_categories
+    )
+
+def assess_cluster_risk_columns(columns, model_weights):
+    """Assess risk for position clusters held as columnar arrays
+
+    Positions are first grouped by end date (and category) code; the
+    model's cluster_window then bins those groups into clusters.
+    """
+    window, by_category = clustering.model_clustering(model_weights)
+    if window.kind != 'exact' or by_category:
+        codes, labels, categories = clustering.group_codes(columns, by_category)
+        totals = aggregate_clusters(dict(columns, end_code=codes, end_dates=labels))
+        return assess_windowed_totals(labels, totals, model_weights, categories)
+
+    totals = aggregate_clusters(columns)
+
+    return assess_cluster_totals(
+        columns['end_dates'],
+        totals['total_value'].tolist(),
+        totals['total_pnl'].tolist(),
+        totals['cluster_size'].tolist(),
+        model_weights
+    )
+
+class ClusterAccumulator:
+    """Running per-cluster totals that positions are folded into chunk by chunk
+
+    Totals are kept per distinct end date (per end date and category with
+    by_category) and binned into the model's cluster windows only when
+    assessed, so memory grows with the number of groups, not positions.
+    """
+
+    def __init__(self, by_category=False):
+        self.by_category = by_category
+        self.group_codes = {}
+        # First-appearance ranks across the whole stream, for group_codes() order
+        self._end_date_ranks = {}
+        self._category_ranks = {}
+        self.total_value = np.zeros(0)
+        self.total_pnl = np.zeros(0)
+        self.cluster_size = np.zeros(0, dtype=np.int64)
+        self.positions_seen = 0
+
+    @property
+    def end_dates(self):
+        """endDate label of each group"""
+        return [end_date for end_date, _ in self.group_codes]
+
+    @property
+    def categories(self):
+        """Category of each group (None when not accumulating by category)"""
+        if not self.by_category:
+            return None
+        return [category for _, category in self.group_codes]
+
+    def add_columns(self, columns):
+        """Fold one columnar chunk into the running totals"""
+        chunk_codes, labels, categories = clustering.group_codes(columns, self.by_category)
+        if categories is None:
+            categories = [None] * len(labels)
+        for label in labels:
+            self._end_date_ranks.setdefault(label, len(self._end_date_ranks))
+        for category in columns.get('categories', ()):
+            self._category_ranks.setdefault(category, len(self._category_ranks))
+
+        codes = self.group_codes
+        global_codes = np.array([codes.setdefault(key, len(codes))
+                                 for key in zip(labels, categories)], dtype=np.int64)
+
+        num_clusters = len(codes)
+        if num_clusters > self.total_value.size:
+            grow = num_clusters - self.total_value.size
+            self.total_value = np.concatenate([self.total_value, np.zeros(grow)])
+            self.total_pnl = np.concatenate([self.total_pnl, np.zeros(grow)])
+            self.cluster_size = np.concatenate([self.cluster_size, np.zeros(grow, dtype=np.int64)])
+
+        # Chunk-local codes are unique, so plain fancy-index addition is safe
+        totals = aggregate_clusters(dict(columns, end_code=chunk_codes, end_dates=labels))
+        self.total_value[global_codes] += totals['total_value']
+        self.total_pnl[global_codes] += totals['total_pnl']
+        self.cluster_size[global_codes] += totals['cluster_size']
+        self.positions_seen += columns['end_code'].size
+
+    def add_positions(self, positions):
+        """Fold a list of position dicts into the running totals"""
+        if positions:
+            self.add_columns(positions_to_columns(positions, self.by_category))
+
+    def assessments(self, model_weights):
+        """Risk assessments for everything folded in so far"""
+        window, by_category = clustering.model_clustering(model_weights)
+        if window.kind != 'exact' or by_category:
+            # Groups in the order group_codes() gives the whole book in memory:
+            # by first appearance of the end date, then of the category
+            keys = list(self.group_codes)
+            order = sorted(range(len(keys)), key=lambda i: (
+                self._end_date_ranks[keys[i][0]], self._category_ranks.get(keys[i][1], 0)))
+            totals = {'total_value': self.total_value[order], 'total_pnl': self.total_pnl[order],
+                      'cluster_size': self.cluster_size[order]}
+            categories = self.categories
+            return assess_windowed_totals(
+                [keys[i][0] for i in order], totals, model_weights,
+                None if categories is None else [categories[i] for i in order])
+
+        return assess_cluster_totals(
+            self.end_dates,
+            self.total_value.tolist(),
+            self.total_pnl.tolist(),
+            self.cluster_size.tolist(),
+            model_weights
+        )
+
+def iter_position_chunks(stream, chunk_size=10000):
+    """Yield lists of at most chunk_size positions parsed from NDJSON lines"""
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = [json.loads(line) for line in itertools.islice(lines, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+def read_position_dicts(source, chunk_size=10000):
+    """Load an NDJSON position file ('-' for stdin) as a list of dicts"""
+    if source == '-':
+        chunks = list(iter_position_chunks(sys.stdin, chunk_size))
+    else:
+        with open(source, 'r') as f:
+            chunks = list(iter_position_chunks(f, chunk_size))
+    return [p for chunk in chunks for p in chunk]
+
+def read_positions(source, chunk_size=10000):
+    """Load an NDJSON position file ('-' for stdin) into a PositionTable"""
+    return records.PositionTable.from_dicts(read_position_dicts(source, chunk_size))
+
+def accumulate_stream(stream, chunk_size=10000, by_category=False):
+    """Fold an NDJSON position stream into a ClusterAccumulator"""
+    accumulator = ClusterAccumulator(by_category)
+    for chunk in iter_position_chunks(stream, chunk_size):
+        accumulator.add_positions(chunk)
+    return accumulator
+
+def stream_risk_prediction(stream, model_weights, chunk_size=10000):
+    """Score an NDJSON position stream with bounded memory"""
+    _, by_category = clustering.model_clustering(model_weights)
+    accumulator = accumulate_stream(stream, chunk_size, by_category)
+    return generate_risk_prediction(accumulator.assessments(model_weights), model_weights)
+
+def assess_cluster_risk(positions, model_weights):
+    """Assess risk for position clusters (dicts or a PositionTable)"""
+    _, by_category = clustering.model_clustering(model_weights)
+    return assess_cluster_risk_columns(positions_to_columns(positions, by_category), model_weights)
+
 def generate_risk_prediction(risk_assessments, model_weights):
     """Generate overall risk prediction"""
 
@@ -155,23 +377,14 @@ def generate_risk_prediction(risk_assessments, model_weights):
         severity = max_risk['severity']
         max_drawdown = max_risk['drawdown_percentage']
 
-        recommendations = [
-            "Consider reducing position sizes in clustered markets",
-            "Monitor markets ending in the same time period",
-            "Diversify across different market categories",
-            "Consider taking partial profits if positions are profitable"
-        ]
+        recommendations = list(HIGH_RISK_RECOMMENDATIONS)
     else:
         alert = False
         message = ""
         severity = "low"
         max_drawdown = max([ra['drawdown_percentage'] for ra in risk_assessments]) if risk_assessments else 0
 
-        recommendations = [
-            "Risk levels are within acceptable ranges",
-            "Continue monitoring position clusters",
-            "Consider gradual position sizing increases"
-        ]
+        recommendations = list(LOW_RISK_RECOMMENDATIONS)
 
     # Calculate additional metrics
     total_exposure = sum(ra['total_value'] for ra in risk_assessments)
@@ -194,37 +407,469 @@ def generate_risk_prediction(risk_assessments, model_weights):
         'recommendations': recommendations
     }
 
+def trader_columns(positions, trader_key='trader', categories=False):
+    """Columnar view of trader-tagged position dicts, plus trader codes
+
+    Traders are integer-coded in first-appearance order like end dates.
+    """
+    columns = positions_to_columns(positions, categories)
+    trader_codes = {}
+    columns['trader_code'] = np.fromiter(
+        (trader_codes.setdefault(p[trader_key], len(trader_codes)) for p in positions),
+        dtype=np.int64, count=len(positions))
+    columns['traders'] = list(trader_codes)
+    return columns
+
+def aggregate_trader_clusters(columns):
+    """Totals per (trader, end date) group from one grouped pass
+
+    Groups come back ordered by trader code, then by first appearance of the
+    end date within that trader, which is the cluster order a separate
+    single-trader run would produce.
+    """
+    num_end_dates = max(len(columns['end_dates']), 1)
+    keys = columns['trader_code'] * num_end_dates + columns['end_code']
+    values = columns['entry_price'] * columns['shares']
+    key_space = len(columns['traders']) * num_end_dates
+
+    if key_space <= 4 * keys.size + 1024:
+        # Dense key space: bincount straight over the composite keys, O(N + keys)
+        sizes = np.bincount(keys, minlength=key_space)
+        group_keys = np.flatnonzero(sizes)
+        first_index = np.full(key_space, keys.size)
+        np.minimum.at(first_index, keys, np.arange(keys.size))
+
+        first_index = first_index[group_keys]
+        cluster_sizes = sizes[group_keys]
+        total_values = np.bincount(keys, weights=values, minlength=key_space)[group_keys]
+        total_pnls = np.bincount(keys, weights=columns['pnl'], minlength=key_space)[group_keys]
+    else:
+        # Sparse: sort-based grouping
+        group_keys, first_index, group_of = np.unique(keys, return_index=True, return_inverse=True)
+        cluster_sizes = np.bincount(group_of, minlength=group_keys.size)
+        total_values = np.bincount(group_of, weights=values, minlength=group_keys.size)
+        total_pnls = np.bincount(group_of, weights=columns['pnl'], minlength=group_keys.size)
+
+    totals = {
+        'total_value': total_values,
+        'total_pnl': total_pnls,
+        'cluster_size': cluster_sizes,
+        'trader_code': group_keys // num_end_dates,
+        'end_code': group_keys % num_end_dates
+    }
+
+    order = np.lexsort((first_index, totals['trader_code']))
+    return {name: values[order] for name, values in totals.items()}
+
+def _first_seen(keys):
+    """Index of the first position sharing each position's key"""
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return first[inverse.reshape(-1)]
+
+def aggregate_trader_category_clusters(columns):
+    """Totals per (trader, end date, category) group
+
+    Groups come back ordered by trader code, then by first appearance of the
+    end date and then of the category within that trader, which is the
+    group order a separate single-trader run's group_codes() produces.
+    """
+    trader_code = columns['trader_code']
+    end_code = columns['end_code'].astype(np.int64)
+    if 'category_code' in columns:
+        category_code = columns['category_code'].astype(np.int64)
+        num_categories = max(len(columns['categories']), 1)
+    else:
+        category_code = np.zeros_like(end_code)
+        num_categories = 1
+    num_end_dates = max(len(columns['end_dates']), 1)
+
+    end_first = _first_seen(trader_code * num_end_dates + end_code)
+    category_first = _first_seen(trader_code * num_categories + category_code)
+
+    keys = (trader_code * num_end_dates + end_code) * num_categories + category_code
+    group_keys, first_index, group_of = np.unique(keys, return_index=True, return_inverse=True)
+    group_of = group_of.reshape(-1)
+    values = columns['entry_price'] * columns['shares']
+
+    totals = {
+        'total_value': np.bincount(group_of, weights=values, minlength=group_keys.size),
+        'total_pnl': np.bincount(group_of, weights=columns['pnl'], minlength=group_keys.size),
+        'cluster_size': np.bincount(group_of, minlength=group_keys.size),
+        'trader_code': group_keys // (num_end_dates * num_categories),
+        'end_code': group_keys // num_categories % num_end_dates,
+        'category_code': group_keys % num_categories
+    }
+
+    order = np.lexsort((category_first[first_index], end_first[first_index],
+                        totals['trader_code']))
+    return {name: values[order] for name, values in totals.items()}
+
+def windowed_trader_clusters(columns, window, by_category=False):
+    """Per-trader clusters binned into window (and category) clusters
+
+    The (trader, end date[, category]) groups go through
+    clustering.cluster_groups() in one call, with the trader folded into the
+    category key so no cluster spans traders. Returns cluster totals ordered
+    by trader, plus each cluster's label, in single-trader cluster order.
+    """
+    end_dates = columns['end_dates']
+    if by_category:
+        groups = aggregate_trader_category_clusters(columns)
+        table = columns.get('categories', [None])
+        keys = list(zip(groups['trader_code'].tolist(),
+                        [table[code] for code in groups['category_code'].tolist()]))
+    else:
+        groups = aggregate_trader_clusters(columns)
+        keys = groups['trader_code'].tolist()
+
+    labels, cluster_keys, clustered = clustering.cluster_groups(
+        [end_dates[code] for code in groups['end_code'].tolist()],
+        {name: groups[name] for name in ('total_value', 'total_pnl', 'cluster_size')},
+        window, keys)
+
+    cluster_traders = np.array([key[0] if by_category else key for key in cluster_keys],
+                               dtype=np.int64)
+    order = np.argsort(cluster_traders, kind='stable')
+    clustered = {name: values[order] for name, values in clustered.items()}
+    clustered['trader_code'] = cluster_traders[order]
+    return clustered, [labels[i] for i in order.tolist()]
+
+def round_values(values, ndigits):
+    """round(value, ndigits) for each value, as an array
+
+    np.round scales before rounding, so values within a hair of a halfway
+    point can round the other way from round(); those few are redone with
+    round() itself.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half).tolist():
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+def generate_risk_predictions_batch(columns, model_weights):
+    """generate_risk_prediction()-shaped result for every trader in the columns
+
+    Cluster metrics and per-trader maxima/sums are computed over all groups
+    at once; Python only loops over traders to build the result dicts.
+    Clusters follow the model's cluster_window and cluster_by_category, as
+    in assess_cluster_risk().
+    """
+    traders = columns['traders']
+    if not traders:
+        return {}
+
+    window, by_category = clustering.model_clustering(model_weights)
+    if window.kind != 'exact' or by_category:
+        groups, labels = windowed_trader_clusters(columns, window, by_category)
+    else:
+        groups = aggregate_trader_clusters(columns)
+        end_dates = columns['end_dates']
+        labels = [end_dates[code] for code in groups['end_code'].tolist()]
+    drawdown_threshold = model_weights.get('drawdown_threshold', 4.0)
+
+    total_values = groups['total_value']
+    total_pnls = groups['total_pnl']
+    losing = (total_values > 0) & (total_pnls < 0)
+    drawdowns = np.zeros_like(total_values)
+    np.divide(-total_pnls, total_values, out=drawdowns, where=losing)
+
+    drawdown_pcts = round_values(drawdowns * 100, 2)
+    rounded_values = round_values(total_values, 2)
+    is_high = drawdowns > drawdown_threshold
+
+    # Every trader owns at least one group, so groups split into contiguous runs
+    group_trader = groups['trader_code']
+    starts = np.searchsorted(group_trader, np.arange(len(traders)))
+    cluster_counts = np.diff(np.append(starts, group_trader.size))
+
+    max_high = np.maximum.reduceat(np.where(is_high, drawdown_pcts, -np.inf), starts)
+    max_drawdown = np.maximum.reduceat(drawdown_pcts, starts)
+    max_cluster_size = np.maximum.reduceat(groups['cluster_size'], starts)
+    max_value = np.maximum.reduceat(rounded_values, starts)
+    exposure = np.add.reduceat(rounded_values, starts)
+
+    # First high-risk cluster (in cluster order) reaching the trader's maximum
+    candidates = np.flatnonzero(is_high & (drawdown_pcts == max_high[group_trader]))
+    candidate_traders, first = np.unique(group_trader[candidates], return_index=True)
+    worst_group = np.full(len(traders), -1)
+    worst_group[candidate_traders] = candidates[first]
+
+    threshold = model_weights.get('drawdown_threshold', 4.0)
+    predictions = {}
+
+    for code, trader in enumerate(traders):
+        group = int(worst_group[code])
+        if group >= 0:
+            alert, message, severity = True, ".2f", 'high'
+            drawdown = float(drawdown_pcts[group])
+            drawdown_date = labels[group]
+            recommendations = list(HIGH_RISK_RECOMMENDATIONS)
+        else:
+            alert, message, severity = False, "", "low"
+            drawdown = float(max_drawdown[code])
+            drawdown_date = None
+            recommendations = list(LOW_RISK_RECOMMENDATIONS)
+
+        predictions[trader] = {
+            'alert': alert,
+            'message': message,
+            'severity': severity,
+            'metrics': {
+                'maxDrawdown': drawdown,
+                'drawdownDate': drawdown_date,
+                'clusterSize': int(max_cluster_size[code]),
+                'totalExposure': round(float(exposure[code]), 2),
+                'maxSinglePosition': float(max_value[code]),
+                'concentrationRisk': round(
+                    int(max_cluster_size[code]) / int(cluster_counts[code]) * 100, 2),
+                'threshold': threshold
+            },
+            'recommendations': recommendations
+        }
+
+    return predictions
+
+def predict_risk_batch(model_data, positions, trader_key='trader'):
+    """Score many traders' portfolios at once from trader-tagged positions"""
+    model_weights = model_data.get('model_weights', {})
+    _, by_category = clustering.model_clustering(model_weights)
+    return generate_risk_predictions_batch(trader_columns(positions, trader_key, by_category),
+                                           model_weights)
+
+def default_model_data():
+    """Fallback model used when the trained risk model cannot be loaded"""
+    return {
+        'model_weights': {
+            'drawdown_threshold': 4.0,
+            'cluster_size_weight': 0.3,
+            'time_to_expiry_weight': 0.2,
+            'pnl_volatility_weight': 0.5,
+            'historical_patterns': 5,
+            'confidence_score': 0.75
+        }
+    }
+
+def compile_risk_model(model_data):
+    """Keep only what scoring needs from the model dict, with defaults filled in
+
+    This is what training writes into the compiled artifact.
+    """
+    if not model_data:
+        model_data = default_model_data()
+
+    return {
+        'model_weights': dict(model_data.get('model_weights', {})),
+        'risk_thresholds': dict(model_data.get('risk_thresholds', {'high': 4.0, 'medium': 2.0, 'low': 1.0}))
+    }
+
+def load_compiled_model(model_path=None):
+    """Compiled risk model, from the compiled artifact when training wrote one"""
+    if model_path is None:
+        model_path = os.environ.get('MODEL_OUTPUT_PATH', 'risk_model.json')
+    return model_store.ModelCache(model_path, 'risk', compile_risk_model).get()
+
+def predict_risk(model_data, positions=None):
+    """Score a portfolio (mock positions when none are given)"""
+
+    if positions is None:
+        positions = records.PositionTable.from_dicts(generate_mock_positions())
+
+    model_weights = model_data.get('model_weights', {})
+    risk_assessments = assess_cluster_risk(positions, model_weights)
+    return generate_risk_prediction(risk_assessments, model_weights)
+
+def with_cluster_options(model_data, cluster_window=None, by_category=False):
+    """Copy of model_data with its clustering overridden (unchanged when no overrides)"""
+    if cluster_window is None and not by_category:
+        return model_data
+
+    model_weights = dict(model_data.get('model_weights', {}))
+    if cluster_window is not None:
+        model_weights['cluster_window'] = str(clustering.ClusterWindow.parse(cluster_window))
+    if by_category:
+        model_weights['cluster_by_category'] = True
+    return dict(model_data, model_weights=model_weights)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Predict position cluster risk')
+    parser.add_argument('--json', action='store_true',
+                        help='Print only the prediction JSON (no banner lines)')
+    parser.add_argument('--positions', default=None,
+                        help="NDJSON file of positions to score, or '-' for stdin (implies --json)")
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='Positions parsed per chunk when streaming --positions')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the mock positions and tail-risk scenarios (default: random)')
+    parser.add_argument('--tail-risk', action='store_true',
+                        help='Add Monte Carlo VaR / expected shortfall to the metrics')
+    parser.add_argument('--scenarios', type=int, default=None,
+                        help='Resolution scenarios for --tail-risk (default: from the model)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes for --tail-risk scenario chunks (default: in-process)')
+    parser.add_argument('--batch', default=None, metavar='FILE',
+                        help="NDJSON of trader-tagged positions ('-' for stdin); prints one "
+                             "prediction per trader (implies --json)")
+    parser.add_argument('--trader-key', default='trader',
+                        help='Position field holding the trader id for --batch')
+    parser.add_argument('--horizons', default=None, metavar='DAYS',
+                        help='Comma-separated day horizons (e.g. 7,30,90) for expiring-exposure rollups')
+    parser.add_argument('--prices', default=None, metavar='URL',
+                        help='Midpoint source (e.g. http://localhost:3000/api/midpoint) to mark '
+                             '--positions carrying a tokenId to market before scoring')
+    parser.add_argument('--cluster-window', default=None, metavar='WINDOW',
+                        help="Cluster positions by 'exact' end date, 'daily', 'weekly' or "
+                             "'rolling:N' day windows (default: the model's cluster_window)")
+    parser.add_argument('--by-category', action='store_true',
+                        help='Also split clusters by the positions\' market category')
+    return parser.parse_args(argv)
+
 def main():
     """Main risk prediction function"""
 
+    args = parse_args()
+    timer = instrumentation.StageTimer()
+
+    try:
+        horizons = expiry_index.parse_horizons(args.horizons) if args.horizons else None
+    except ValueError:
+        print(f"Error: Invalid --horizons '{args.horizons}'", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.cluster_window is not None:
+            clustering.ClusterWindow.parse(args.cluster_window)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.batch:
+        with timer.stage('model_load'):
+            model_data = with_cluster_options(load_compiled_model(), args.cluster_window,
+                                              args.by_category)
+
+        with timer.stage('data_load'):
+            if args.batch == '-':
+                positions = [json.loads(line) for line in sys.stdin if line.strip()]
+            else:
+                with open(args.batch, 'r') as f:
+                    positions = [json.loads(line) for line in f if line.strip()]
+        try:
+            with timer.stage('aggregation'):
+                predictions = predict_risk_batch(model_data, positions, args.trader_key)
+        except KeyError as e:
+            print(f"Error: Position without trader field {e}", file=sys.stderr)
+            sys.exit(1)
+
+        with timer.stage('serialization'):
+            output = json.dumps(predictions)
+        print(timer.emit(predictions, output))
+        return
+
+    if args.positions:
+        with timer.stage('model_load'):
+            model_data = with_cluster_options(load_compiled_model(), args.cluster_window,
+                                              args.by_category)
+        model_weights = model_data.get('model_weights', {})
+
+        # Simulation and repricing need every position at once, so load instead of streaming
+        load_all = args.tail_risk or args.prices
+        if load_all:
+            with timer.stage('data_load'):
+                positions = read_position_dicts(args.positions, args.chunk_size)
+            if args.prices:
+                # asyncio is only worth importing when there is a book to reprice
+                import price_provider
+
+                with timer.stage('repricing'):
+                    try:
+                        price_provider.reprice_book(positions, args.prices)
+                    except ValueError as e:
+                        print(f"Error: {e}", file=sys.stderr)
+                        sys.exit(1)
+            positions = records.PositionTable.from_dicts(positions)
+            with timer.stage('aggregation'):
+                prediction = predict_risk(model_data, positions)
+            if args.tail_risk:
+                with timer.stage('tail_risk'):
+                    tail_risk.apply_tail_risk(prediction, positions, model_weights, args.seed,
+                                              args.workers, scenarios=args.scenarios)
+        else:
+            _, by_category = clustering.model_clustering(model_weights)
+            with timer.stage('stream_aggregation'):
+                if args.positions == '-':
+                    accumulator = accumulate_stream(sys.stdin, args.chunk_size, by_category)
+                else:
+                    with open(args.positions, 'r') as f:
+                        accumulator = accumulate_stream(f, args.chunk_size, by_category)
+                prediction = generate_risk_prediction(accumulator.assessments(model_weights),
+                                                      model_weights)
+
+        if horizons:
+            with timer.stage('expiry_index'):
+                if load_all:
+                    index = expiry_index.ExpiryIndex.from_positions(positions)
+                else:
+                    index = expiry_index.ExpiryIndex.from_accumulator(accumulator)
+                expiry_index.add_expiry_metrics(prediction, index, horizons)
+
+        with timer.stage('serialization'):
+            output = json.dumps(prediction, default=float)
+        print(timer.emit(prediction, output, default=float))
+        return
+
+    # --json prints only the prediction, for callers that parse stdout
+    if args.json:
+        with timer.stage('model_load'):
+            model_data = with_cluster_options(load_compiled_model(), args.cluster_window,
+                                              args.by_category)
+        model_weights = model_data.get('model_weights', {})
+
+        with timer.stage('data_generation'):
+            positions = records.PositionTable.from_dicts(generate_mock_positions(args.seed))
+        with timer.stage('aggregation'):
+            risk_assessments = assess_cluster_risk(positions, model_weights)
+        with timer.stage('prediction'):
+            prediction = generate_risk_prediction(risk_assessments, model_weights)
+        if args.tail_risk:
+            with timer.stage('tail_risk'):
+                tail_risk.apply_tail_risk(prediction, positions, model_weights, args.seed,
+                                          args.workers, scenarios=args.scenarios)
+        if horizons:
+            with timer.stage('expiry_index'):
+                expiry_index.add_expiry_metrics(
+                    prediction, expiry_index.ExpiryIndex.from_positions(positions), horizons)
+
+        with timer.stage('serialization'):
+            output = json.dumps(prediction)
+        print(timer.emit(prediction, output))
+        return
+
     print("🛡️  Starting AI Risk Prediction")
     print("=" * 50)
 
     # Load risk model
-    model_data = load_risk_model()
+    with timer.stage('model_load'):
+        model_data = load_risk_model()
     if not model_data:
         print("❌ Failed to load risk model, using defaults")
-        model_data = {
-            'model_weights': {
-                'drawdown_threshold': 4.0,
-                'cluster_size_weight': 0.3,
-                'time_to_expiry_weight': 0.2,
-                'pnl_volatility_weight': 0.5,
-                'historical_patterns': 5,
-                'confidence_score': 0.75
-            }
-        }
+        model_data = default_model_data()
+    model_data = with_cluster_options(model_data, args.cluster_window, args.by_category)
 
     # Generate mock positions for assessment
-    positions = generate_mock_positions()
+    with timer.stage('data_generation'):
+        positions = generate_mock_positions(args.seed)
     print(f"✅ Generated {len(positions)} positions for risk assessment")
 
     # Assess cluster risks
-    risk_assessments = assess_cluster_risk(positions, model_data.get('model_weights', {}))
+    with timer.stage('aggregation'):
+        risk_assessments = assess_cluster_risk(positions, model_data.get('model_weights', {}))
     print(f"✅ Analyzed {len(risk_assessments)} position clusters")
 
     # Generate overall risk prediction
-    prediction = generate_risk_prediction(risk_assessments, model_data.get('model_weights', {}))
+    with timer.stage('prediction'):
+        prediction = generate_risk_prediction(risk_assessments, model_data.get('model_weights', {}))
 
     if prediction['alert']:
         print(f"🚨 HIGH RISK ALERT: {prediction['message']}")
@@ -233,9 +878,30 @@ def main():
     else:
         print("✅ Risk levels are within acceptable ranges")
 
+    # Simulate resolution outcomes for VaR / expected shortfall
+    if args.tail_risk:
+        with timer.stage('tail_risk'):
+            tail_risk.apply_tail_risk(prediction, positions, model_data.get('model_weights', {}),
+                                      args.seed, args.workers, scenarios=args.scenarios)
+        metrics = prediction['metrics']
+        print(f"📉 {metrics['tailConfidence']:.0%} VaR: ${metrics['valueAtRisk']:,.2f}, "
+              f"expected shortfall: ${metrics['expectedShortfall']:,.2f} "
+              f"({metrics['tailScenarios']} scenarios)")
+
+    # Exposure resolving within each horizon
+    if horizons:
+        with timer.stage('expiry_index'):
+            expiry_index.add_expiry_metrics(
+                prediction, expiry_index.ExpiryIndex.from_positions(positions), horizons)
+        for rollup in prediction['metrics']['expiryHorizons']:
+            print(f"⏳ Next {rollup['days']} days: {rollup['positions']} positions, "
+                  f"${rollup['total_value']:,.2f} exposure, ${rollup['total_pnl']:,.2f} PnL")
+
     # Output JSON result
     print("\n📊 Risk Prediction Results:")
-    print(json.dumps(prediction, indent=2))
+    with timer.stage('serialization'):
+        output = json.dumps(prediction, indent=2)
+    print(timer.emit(prediction, output, indent=2))
 
 if __name__ == "__main__":
     main()
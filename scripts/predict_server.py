@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+
+"""
+AI Prediction Server (Python)
+Loads the risk and yield models once and answers newline-delimited JSON
+requests over stdin/stdout or a Unix socket
+
+Request:  {"id": 1, "type": "yield", "tvl": 50000}
+          {"id": 1, "type": "yield_batch", "tvls": [5000, 50000, ...]}
+          {"id": 1, "type": "yield_backtest", "history_file": "history.npy", "points": 30}
+                                             (backtest summary plus downsampled chart series)
+          {"id": 2, "type": "risk", "positions": [...]}   (positions optional)
+          {"id": 3, "type": "risk", "positions_file": "book.ndjson"}
+          {"id": 3, "type": "risk", "tail_risk": true, "scenarios": 5000}   (adds VaR / ES)
+          {"id": 3, "type": "risk_batch", "positions": [{"trader": "0x..", ...}, ...]}
+          {"id": 3, "type": "expiry", "horizons": [7, 30, 90]}   (live book, or positions)
+          {"id": 4, "type": "book_open", "position": {...}}    (also book_close,
+                                                               book_reprice, book_snapshot)
+          {"id": 4, "type": "rank_update", "traders": [{"id": "0x..", "roi": 0.1, "win_rate": 0.7}]}
+                                             (or "score"; also rank_remove with "trader_id")
+          {"id": 4, "type": "leaderboard", "top": 20, "offset": 0}
+          {"id": 4, "type": "rank", "trader_id": "0x.."}
+          {"id": 4, "type": "allocation"}   (yield allocation tiers of the live ranking)
+          {"id": 5, "type": "stats"}   (memo counters; rolling latencies with PREDICT_TIMINGS)
+Response: {"id": 1, "ok": true, "result": {...}}
+          {"id": 2, "ok": false, "error": "..."}
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import socketserver
+
+import backtest_yield
+import expiry_index
+import instrumentation
+import memo
+import model_store
+import predict_risk
+import predict_yield
+import ranking
+import records
+import risk_book
+import tail_risk
+import train_yield
+
+class PredictionServer:
+    """Holds the loaded models and dispatches requests by type"""
+
+    def __init__(self, risk_model_path='risk_model.json', yield_model_path='yield_model.json',
+                 memo_size=memo.DEFAULT_MAX_ENTRIES, memo_db=None, traders=None):
+        # Compiled models, hot-swapped whenever training writes a new version
+        self.risk_models = model_store.ModelCache(
+            risk_model_path, 'risk', predict_risk.compile_risk_model)
+        self.yield_models = model_store.ModelCache(
+            yield_model_path, 'yield', predict_yield.compile_yield_model,
+            predict_yield.default_model_data())
+
+        # Live book fed by order flow; guarded because socket clients are threaded
+        model, self._book_version = self.risk_models.snapshot()
+        self.book = risk_book.RiskBook(model['model_weights'])
+        self._book_lock = threading.Lock()
+
+        # Live trader ranking behind the leaderboard and the allocation tiers
+        self.ranking = ranking.RankingIndex.from_traders(traders or [])
+        self._ranking_lock = threading.Lock()
+
+        self.handlers = {
+            'ping': self.handle_ping,
+            'reload': self.handle_reload,
+            'risk': self.handle_risk,
+            'risk_batch': self.handle_risk_batch,
+            'expiry': self.handle_expiry,
+            'yield': self.handle_yield,
+            'yield_batch': self.handle_yield_batch,
+            'yield_backtest': self.handle_yield_backtest,
+            'book_open': self.handle_book_open,
+            'book_close': self.handle_book_close,
+            'book_reprice': self.handle_book_reprice,
+            'book_snapshot': self.handle_book_snapshot,
+            'rank_update': self.handle_rank_update,
+            'rank_remove': self.handle_rank_remove,
+            'rank': self.handle_rank,
+            'leaderboard': self.handle_leaderboard,
+            'allocation': self.handle_allocation,
+            'stats': self.handle_stats,
+        }
+
+        # Results of deterministic requests, keyed by model version and input digest
+        store = memo.MemoStore(memo_db) if memo_db and memo_size else None
+        self.memo = memo.MemoCache(memo_size, store)
+
+        # Rolling per-type latency histograms, only kept when timings are enabled
+        self.latencies = {} if instrumentation.timings_mode() else None
+
+    def handle_ping(self, request):
+        return {'pong': True}
+
+    def handle_reload(self, request):
+        self.risk_models.reload()
+        self.yield_models.reload()
+        return {
+            'reloaded': True,
+            'risk_model_version': self.risk_models.version,
+            'yield_model_version': self.yield_models.version
+        }
+
+    def handle_risk(self, request):
+        if request.get('tail_risk'):
+            return self.handle_tail_risk(request)
+
+        model, version = self.risk_models.snapshot()
+
+        # A positions_file is streamed in chunks instead of sent inline
+        if 'positions_file' in request:
+            path = request['positions_file']
+
+            def score_file():
+                with open(path, 'r') as f:
+                    return predict_risk.stream_risk_prediction(f, model['model_weights'])
+            return self.memo.memoize('risk', version, memo.file_stamp(path), score_file)
+
+        if request.get('positions') is None:
+            # Fresh mock portfolio on every call
+            return predict_risk.predict_risk(model)
+        return self.memo.memoize('risk', version, request['positions'],
+                                 lambda: predict_risk.predict_risk(model, request['positions']))
+
+    def handle_risk_batch(self, request):
+        # One prediction per trader, keyed by trader id
+        model, version = self.risk_models.snapshot()
+        trader_key = request.get('trader_key', 'trader')
+
+        if 'positions_file' in request:
+            path = request['positions_file']
+            inputs = [memo.file_stamp(path), trader_key]
+
+            def load():
+                with open(path, 'r') as f:
+                    return [json.loads(line) for line in f if line.strip()]
+        elif 'positions' in request:
+            inputs = [request['positions'], trader_key]
+
+            def load():
+                return request['positions']
+        else:
+            raise ValueError("Missing 'positions' or 'positions_file'")
+
+        return self.memo.memoize(
+            'risk_batch', version, inputs,
+            lambda: predict_risk.predict_risk_batch(model, load(), trader_key))
+
+    def handle_tail_risk(self, request):
+        model, version = self.risk_models.snapshot()
+
+        def simulate():
+            # Simulation needs the whole book in memory, so files are loaded, not streamed
+            if 'positions_file' in request:
+                positions = predict_risk.read_positions(request['positions_file'])
+            elif request.get('positions') is not None:
+                positions = records.PositionTable.from_dicts(request['positions'])
+            else:
+                positions = records.PositionTable.from_dicts(
+                    predict_risk.generate_mock_positions())
+
+            prediction = predict_risk.predict_risk(model, positions)
+            return tail_risk.apply_tail_risk(
+                prediction, positions, model['model_weights'], request.get('seed'),
+                scenarios=request.get('scenarios'), confidence=request.get('confidence'),
+                correlation=request.get('correlation'))
+
+        # Only seeded simulations of a given book are repeatable
+        if request.get('seed') is None:
+            return simulate()
+        if 'positions_file' in request:
+            book = memo.file_stamp(request['positions_file'])
+        elif request.get('positions') is not None:
+            book = request['positions']
+        else:
+            return simulate()
+
+        options = [request.get(key) for key in ('seed', 'scenarios', 'confidence', 'correlation')]
+        return self.memo.memoize('tail_risk', version, [book, options], simulate)
+
+    def handle_expiry(self, request):
+        # Rollups over the live book by default, or over the given positions
+        horizons = request.get('horizons', expiry_index.DEFAULT_HORIZONS)
+        if 'positions_file' in request:
+            with open(request['positions_file'], 'r') as f:
+                index = expiry_index.ExpiryIndex.from_accumulator(predict_risk.accumulate_stream(f))
+        elif request.get('positions') is not None:
+            index = expiry_index.ExpiryIndex.from_positions(request['positions'])
+        else:
+            with self._book_lock:
+                index = expiry_index.ExpiryIndex.from_book(self.book)
+        return {'horizons': index.horizons(horizons), 'expired': index.expired(),
+                'undated': index.undated()}
+
+    def handle_yield(self, request):
+        if 'tvl' not in request:
+            raise ValueError("Missing 'tvl'")
+        # A tier lookup is cheaper than a memo digest, so yield is never memoized
+        return predict_yield.predict_yield_compiled(float(request['tvl']),
+                                                    self.yield_models.get())
+
+    def handle_yield_batch(self, request):
+        if 'tvls' not in request:
+            raise ValueError("Missing 'tvls'")
+        return predict_yield.predict_yield_batch_compiled(request['tvls'],
+                                                          self.yield_models.get())
+
+    def handle_yield_backtest(self, request):
+        # Deterministic for a given history file and model
+        if 'history_file' not in request:
+            raise ValueError("Missing 'history_file'")
+        path = request['history_file']
+        bucket_seconds = int(request.get('bucket_seconds', backtest_yield.DEFAULT_BUCKET_SECONDS))
+        points = request.get('points')
+        fee_share = request.get('fee_share')
+        split_share = request.get('split_share')
+        compiled, version = self.yield_models.snapshot()
+
+        def run():
+            results = backtest_yield.backtest(backtest_yield.iter_history_chunks(path),
+                                              {'model': compiled}, fee_share, split_share,
+                                              bucket_seconds, points)
+            return results['model']
+        return self.memo.memoize(
+            'yield_backtest', version,
+            [memo.file_stamp(path), bucket_seconds, points, fee_share, split_share], run)
+
+    def _live_book(self):
+        """The live book, re-scored first if the risk model was hot-swapped; call under _book_lock"""
+        model, version = self.risk_models.snapshot()
+        if version != self._book_version:
+            self.book.set_model_weights(model['model_weights'])
+            self._book_version = version
+        return self.book
+
+    def handle_book_open(self, request):
+        with self._book_lock:
+            book = self._live_book()
+            for position in request.get('positions', [request.get('position')]):
+                book.open_position(position)
+            return book.prediction()
+
+    def handle_book_close(self, request):
+        with self._book_lock:
+            book = self._live_book()
+            book.close_position(request['position_id'])
+            return book.prediction()
+
+    def handle_book_reprice(self, request):
+        with self._book_lock:
+            book = self._live_book()
+            book.reprice_position(request['position_id'], request['pnl'],
+                                  request.get('entry_price'), request.get('shares'))
+            return book.prediction()
+
+    def handle_book_snapshot(self, request):
+        with self._book_lock:
+            book = self._live_book()
+            if 'end_date' in request:
+                return book.cluster_assessment(request['end_date'], request.get('category'))
+            return book.prediction()
+
+    def handle_rank_update(self, request):
+        traders = request.get('traders', [request.get('trader')])
+        with self._ranking_lock:
+            for trader in traders:
+                self.ranking.update_trader(trader)
+            return {'updated': len(traders), 'count': len(self.ranking)}
+
+    def handle_rank_remove(self, request):
+        with self._ranking_lock:
+            removed = self.ranking.remove(request['trader_id'])
+            return {'removed': removed, 'count': len(self.ranking)}
+
+    def handle_rank(self, request):
+        trader_id = request['trader_id']
+        with self._ranking_lock:
+            return {'id': trader_id, 'rank': self.ranking.rank(trader_id),
+                    'score': self.ranking.score(trader_id), 'count': len(self.ranking)}
+
+    def handle_leaderboard(self, request):
+        with self._ranking_lock:
+            return {'traders': self.ranking.top(int(request.get('top', 20)),
+                                                int(request.get('offset', 0))),
+                    'count': len(self.ranking)}
+
+    def handle_allocation(self, request):
+        with self._ranking_lock:
+            top_traders = self.ranking.top_records(train_yield.TOP_TRADERS)
+        return train_yield.allocate_ranked_traders(top_traders)
+
+    def handle_stats(self, request):
+        if self.latencies is None:
+            return {'enabled': False, 'memo': self.memo.snapshot()}
+        return {
+            'enabled': True,
+            'memo': self.memo.snapshot(),
+            'latency': {request_type: histogram.snapshot()
+                        for request_type, histogram in list(self.latencies.items())}
+        }
+
+    def handle_line(self, line):
+        """Handle one NDJSON request line and return the response line"""
+        request_id = None
+        request_type = None
+        started = time.perf_counter()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+            request_id = request.get('id')
+
+            handler = self.handlers.get(request.get('type'))
+            if handler is None:
+                raise ValueError(f"Unknown request type: {request.get('type')!r}")
+            request_type = request['type']
+
+            response = {'id': request_id, 'ok': True, 'result': handler(request)}
+        except Exception as e:
+            response = {'id': request_id, 'ok': False, 'error': str(e)}
+
+        output = json.dumps(response, separators=(',', ':'), default=float)
+        if self.latencies is not None and request_type is not None:
+            histogram = self.latencies.get(request_type)
+            if histogram is None:
+                histogram = self.latencies.setdefault(request_type,
+                                                      instrumentation.LatencyHistogram())
+            histogram.record(time.perf_counter() - started)
+        return output
+
+    def serve_stream(self, infile, outfile):
+        """Answer requests line by line until EOF"""
+        for line in infile:
+            if not line.strip():
+                continue
+            outfile.write(self.handle_line(line) + '\n')
+            outfile.flush()
+
+    def serve_unix(self, socket_path):
+        """Answer requests from any number of clients on a Unix socket"""
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for raw in self.rfile:
+                    line = raw.decode('utf-8')
+                    if not line.strip():
+                        continue
+                    self.wfile.write((server.handle_line(line) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            try:
+                unix_server.serve_forever()
+            finally:
+                os.unlink(socket_path)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve risk and yield predictions over NDJSON')
+    parser.add_argument('--risk-model', default='risk_model.json',
+                        help='Path to risk_model.json (a compiled risk_model.compiled.json beside it is preferred)')
+    parser.add_argument('--yield-model', default='yield_model.json',
+                        help='Path to yield_model.json (a compiled yield_model.compiled.json beside it is preferred)')
+    parser.add_argument('--socket', default=None,
+                        help='Listen on this Unix socket instead of stdin/stdout')
+    parser.add_argument('--memo-size', type=int, default=memo.DEFAULT_MAX_ENTRIES,
+                        help='Memoized results kept in memory (0 disables memoization)')
+    parser.add_argument('--memo-db', default=os.environ.get('PREDICT_MEMO_DB'),
+                        help='SQLite file sharing memoized results between server processes '
+                             '(default: $PREDICT_MEMO_DB)')
+    parser.add_argument('--traders', default=None, metavar='FILE',
+                        help='trader export (JSON array or NDJSON) to seed the live ranking with')
+    return parser.parse_args(argv)
+
+def main():
+    """Main serving function"""
+
+    args = parse_args()
+    try:
+        traders = train_yield.load_trader_shard(args.traders) if args.traders else None
+    except (OSError, ValueError) as e:
+        print(f"Error: Failed to load traders from {args.traders}: {e}", file=sys.stderr)
+        sys.exit(1)
+    server = PredictionServer(args.risk_model, args.yield_model, args.memo_size, args.memo_db,
+                              traders)
+
+    # Exit through the normal unwind path so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # stdout carries responses only; diagnostics go to stderr
+    print(f"Prediction server ready (pid {os.getpid()})", file=sys.stderr)
+
+    try:
+        if args.socket:
+            server.serve_unix(args.socket)
+        else:
+            server.serve_stream(sys.stdin, sys.stdout)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
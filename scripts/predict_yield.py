@@ -3,35 +3,50 @@
 """
 AI Yield Prediction Script (Python)
 Loads trained model and makes yield predictions based on TVL input
+
+A single-TVL call only needs the stdlib; numpy is imported on first use by
+the batch path, so cold one-shot spawns skip its import cost.
 """
 
 import os
 import json
 import sys
-import numpy as np
+import bisect
+import random
 from datetime import datetime
 
-def load_model():
+import instrumentation
+import model_store
+
+# Tier APYs used when a model omits a threshold (matches train_yield.save_model)
+DEFAULT_THRESHOLDS = {
+    '100000': 18.0,
+    '50000': 15.0,
+    '25000': 12.5,
+    '10000': 10.5,
+    'default': 8.0
+}
+
+def default_model_data():
+    """Model structure used when no trained yield model exists"""
+    return {
+        'apy_formula': {
+            'thresholds': dict(DEFAULT_THRESHOLDS)
+        },
+        'breakdown_ratios': {
+            'fees': 0.60,
+            'splits': 0.40
+        }
+    }
+
+def load_model(model_path=None):
     """Load the trained yield model"""
-    model_path = os.environ.get('MODEL_OUTPUT_PATH', 'yield_model.json')
+    if model_path is None:
+        model_path = os.environ.get('MODEL_OUTPUT_PATH', 'yield_model.json')
 
     if not os.path.exists(model_path):
         # If no model exists, return default structure
-        return {
-            'apy_formula': {
-                'thresholds': {
-                    '100000': 18.0,
-                    '50000': 15.0,
-                    '25000': 12.5,
-                    '10000': 10.5,
-                    'default': 8.0
-                }
-            },
-            'breakdown_ratios': {
-                'fees': 0.60,
-                'splits': 0.40
-            }
-        }
+        return default_model_data()
 
     try:
         with open(model_path, 'r') as f:
@@ -40,48 +55,103 @@ def load_model():
         print(f"Error loading model: {e}", file=sys.stderr)
         return None
 
-def predict_yield(tvl, model_data):
-    """Predict yield based on TVL using the trained model"""
+def threshold_table(thresholds):
+    """Turn the thresholds dict into sorted (bounds, apys) lookup lists
+
+    apys[i] is the base APY for a TVL above bounds[i - 1] and not above
+    bounds[i]; apys[0] is the default tier.
+    """
+    merged = dict(DEFAULT_THRESHOLDS)
+    merged.update(thresholds)
+
+    tiers = sorted((float(key), apy) for key, apy in merged.items() if key != 'default')
+    bounds = [bound for bound, _ in tiers]
+    apys = [merged['default']] + [apy for _, apy in tiers]
+    return bounds, apys
+
+def lookup_base_apy(tvl, bounds, apys):
+    """Base APY for one TVL (strictly above a bound selects its tier)"""
+    return apys[bisect.bisect_left(bounds, tvl)]
+
+def tier_indices(bounds, tvls):
+    """Vectorized lookup_base_apy index for an array of TVLs
+
+    searchsorted 'left' == bisect_left, except that it sorts NaN above every
+    bound; bisect_left never finds NaN above a bound, so NaN TVLs are sent to
+    the default tier like the single-TVL path does.
+    """
+    import numpy as np
+
+    tiers = np.searchsorted(bounds, tvls, side='left')
+    return np.where(np.isnan(tvls), 0, tiers)
+
+def top_performer_allocation(allocation_model):
+    """Fee/split allocation of the most confident trader in the model"""
+    if not allocation_model:
+        return 0.60, 0.40
 
+    top_performer = max(allocation_model.values(),
+                        key=lambda x: x.get('confidence', 0))
+    return (top_performer.get('fees_allocation', 0.60),
+            top_performer.get('splits_allocation', 0.40))
+
+def compile_yield_model(model_data):
+    """Resolve everything a prediction needs from the model dict up front
+
+    Returns None when there is no model (predictions then use the fallback).
+    This is what training writes into the compiled artifact.
+    """
     if not model_data:
-        return generate_fallback_prediction(tvl)
+        return None
 
-    # Use APY formula from model
     apy_formula = model_data.get('apy_formula', {})
-    thresholds = apy_formula.get('thresholds', {})
+    bounds, apys = threshold_table(apy_formula.get('thresholds', {}))
+    variance_range = apy_formula.get('variance_range', [-2.0, 2.0])
+    recommended_fees, recommended_splits = top_performer_allocation(
+        model_data.get('allocation_model', {}))
+
+    return {
+        'bounds': bounds,
+        'apys': apys,
+        'variance_range': (variance_range[0], variance_range[1]),
+        'min_apy': apy_formula.get('min_apy', 8.0),
+        'max_apy': apy_formula.get('max_apy', 20.0),
+        'recommended_fees': recommended_fees,
+        'recommended_splits': recommended_splits,
+        'breakdown_ratios': model_data.get('breakdown_ratios', {'fees': 0.60, 'splits': 0.40})
+    }
+
+def load_compiled_model(model_path=None):
+    """Compiled yield model, from the compiled artifact when training wrote one"""
+    if model_path is None:
+        model_path = os.environ.get('MODEL_OUTPUT_PATH', 'yield_model.json')
+    return model_store.ModelCache(model_path, 'yield', compile_yield_model,
+                                  default_model_data()).get()
+
+def predict_yield(tvl, model_data):
+    """Predict yield based on TVL using the trained model"""
+    return predict_yield_compiled(tvl, compile_yield_model(model_data))
+
+def predict_yield_compiled(tvl, compiled):
+    """Predict yield for one TVL from a compiled model"""
+
+    if not compiled:
+        return generate_fallback_prediction(tvl)
 
     # Determine base APY based on TVL thresholds
-    if tvl > 100000:
-        base_apy = thresholds.get('100000', 18.0)
-    elif tvl > 50000:
-        base_apy = thresholds.get('50000', 15.0)
-    elif tvl > 25000:
-        base_apy = thresholds.get('25000', 12.5)
-    elif tvl > 10000:
-        base_apy = thresholds.get('10000', 10.5)
-    else:
-        base_apy = thresholds.get('default', 8.0)
+    base_apy = lookup_base_apy(tvl, compiled['bounds'], compiled['apys'])
 
     # Apply variance from model
-    variance_range = apy_formula.get('variance_range', [-2.0, 2.0])
-    variance = np.random.uniform(variance_range[0], variance_range[1])
-    final_apy = max(apy_formula.get('min_apy', 8.0),
-                    min(apy_formula.get('max_apy', 20.0), base_apy + variance))
+    variance_low, variance_high = compiled['variance_range']
+    variance = random.uniform(variance_low, variance_high)
+    final_apy = max(compiled['min_apy'], min(compiled['max_apy'], base_apy + variance))
 
     # Generate AI insights
     ai_insight = f"AI optimized for ${tvl:,.0f} TVL - predicted {final_apy:.1f}% APY"
 
-    # Get recommended allocation from model
-    allocation_model = model_data.get('allocation_model', {})
-    if allocation_model:
-        # Use top performer's allocation as recommendation
-        top_performer = max(allocation_model.values(),
-                          key=lambda x: x.get('confidence', 0))
-        recommended_fees = top_performer.get('fees_allocation', 0.60)
-        recommended_splits = top_performer.get('splits_allocation', 0.40)
-    else:
-        recommended_fees = 0.60
-        recommended_splits = 0.40
+    # Use top performer's allocation from the model as recommendation
+    recommended_fees = compiled['recommended_fees']
+    recommended_splits = compiled['recommended_splits']
 
     return {
         'apy': round(final_apy, 2),
@@ -93,6 +163,66 @@ def predict_yield(tvl, model_data):
         'prediction_timestamp': datetime.now().isoformat()
     }
 
+def predict_yield_batch(tvls, model_data, rng=None):
+    """Predict APYs for many TVLs at once"""
+    return predict_yield_batch_compiled(tvls, compile_yield_model(model_data), rng)
+
+def predict_yield_batch_compiled(tvls, compiled, rng=None):
+    """Predict APYs for many TVLs at once from a compiled model
+
+    Tier lookup, variance and clamping run as whole-array operations, so one
+    call handles thousands of TVLs (every vault plus chart points).
+    """
+    import numpy as np
+
+    tvls = np.asarray(tvls, dtype=np.float64)
+    if rng is None:
+        rng = np.random.default_rng()
+
+    if not compiled:
+        return generate_fallback_batch(tvls)
+
+    # A TVL must exceed a bound to reach its tier
+    base_apy = np.asarray(compiled['apys'])[tier_indices(compiled['bounds'], tvls)]
+
+    variance_low, variance_high = compiled['variance_range']
+    variance = rng.uniform(variance_low, variance_high, size=tvls.shape)
+    final_apy = np.clip(base_apy + variance, compiled['min_apy'], compiled['max_apy'])
+
+    return {
+        'count': int(tvls.size),
+        'tvl': tvls.tolist(),
+        'apy': np.round(final_apy, 2).tolist(),
+        'recommended_fees': compiled['recommended_fees'],
+        'recommended_splits': compiled['recommended_splits'],
+        'model_used': True,
+        'prediction_timestamp': datetime.now().isoformat()
+    }
+
+def generate_fallback_batch(tvls):
+    """Vectorized counterpart of generate_fallback_prediction"""
+    import numpy as np
+
+    bounds = [10000.0, 25000.0, 50000.0, 100000.0]
+    apys = np.array([8.5, 10.5, 12.5, 15.0, 18.0])
+
+    return {
+        'count': int(tvls.size),
+        'tvl': tvls.tolist(),
+        'apy': apys[tier_indices(bounds, tvls)].tolist(),
+        'recommended_fees': 0.60,
+        'recommended_splits': 0.40,
+        'model_used': False,
+        'prediction_timestamp': datetime.now().isoformat()
+    }
+
+def read_batch_tvls(source):
+    """Read a JSON array of TVLs from a file path or '-' for stdin"""
+    if source == '-':
+        return json.load(sys.stdin)
+    with open(source, 'r') as f:
+        return json.load(f)
+
 def generate_fallback_prediction(tvl):
     """Generate fallback prediction when model is not available"""
 
@@ -121,8 +251,29 @@ def generate_fallback_prediction(tvl):
 def main():
     """Main prediction function"""
 
+    timer = instrumentation.StageTimer()
+
+    # --batch [FILE]: JSON array of TVLs from FILE or stdin, one JSON result
+    if len(sys.argv) in (2, 3) and sys.argv[1] == '--batch':
+        source = sys.argv[2] if len(sys.argv) == 3 else '-'
+        try:
+            with timer.stage('input'):
+                tvls = read_batch_tvls(source)
+            with timer.stage('model_load'):
+                compiled = load_compiled_model()
+            with timer.stage('prediction'):
+                prediction = predict_yield_batch_compiled(tvls, compiled)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error: Invalid TVL batch: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        with timer.stage('serialization'):
+            output = json.dumps(prediction)
+        print(timer.emit(prediction, output))
+        return
+
     if len(sys.argv) != 2:
-        print("Usage: python predict_yield.py <tvl>", file=sys.stderr)
+        print("Usage: python predict_yield.py <tvl> | --batch [file]", file=sys.stderr)
         sys.exit(1)
 
     try:
@@ -131,14 +282,18 @@ def main():
         print(f"Error: Invalid TVL value '{sys.argv[1]}'", file=sys.stderr)
         sys.exit(1)
 
-    # Load model
-    model_data = load_model()
+    # Load compiled model (compiled artifact, or the JSON compiled once)
+    with timer.stage('model_load'):
+        compiled = load_compiled_model()
 
     # Make prediction
-    prediction = predict_yield(tvl, model_data)
+    with timer.stage('prediction'):
+        prediction = predict_yield_compiled(tvl, compiled)
 
     # Output JSON result
-    print(json.dumps(prediction, indent=2))
+    with timer.stage('serialization'):
+        output = json.dumps(prediction, indent=2)
+    print(timer.emit(prediction, output, indent=2))
 
 if __name__ == "__main__":
     main()
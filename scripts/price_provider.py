@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+
+"""
+Mark-to-Market Price Provider (Python)
+Fetches midpoints for many token ids at once over a bounded pool of
+keep-alive HTTP connections, with in-flight deduplication, request batching
+and a TTL/LRU cache
+
+The source serves the app's midpoint shape ({tokenId, yesPrice, noPrice,
+timestamp}, as from app/api/midpoint/[tokenId]); the upstream snake_case
+shape (yes_price / no_price) is accepted too. The source URL is either a
+base the token id is appended to, or a template containing {tokenId}.
+
+Usage:
+  python price_provider.py http://localhost:3000/api/midpoint TOKEN [TOKEN ...]
+  python price_provider.py 'https://gamma-api.polymarket.com/markets/{tokenId}/midpoint' TOKEN
+"""
+
+import ssl
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from urllib.parse import quote, urlsplit
+
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_TTL = 5.0
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_TIMEOUT = 10.0
+
+# Single lookups arriving within this many seconds share one fetch round
+DEFAULT_BATCH_WINDOW = 0.002
+
+# Same fallback the app applies to missing prices
+FALLBACK_PRICE = 0.5
+
+USER_AGENT = 'PredictProp/1.0'
+
+class PriceError(Exception):
+    """A midpoint could not be fetched or parsed"""
+
+class TTLCache:
+    """LRU cache whose entries also expire ttl seconds after being stored"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached value, or None when missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class ConnectionPool:
+    """At most max_connections HTTP/1.1 keep-alive connections to one host
+
+    Idle connections are reused; a reused connection the server has since
+    closed is replaced once before the request fails.
+    """
+
+    def __init__(self, host, port, use_ssl=False, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.ssl = ssl.create_default_context() if use_ssl else None
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max_connections)
+        self._idle = []
+        self.opened = 0
+        self.active = 0
+        self.peak_active = 0
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        self.opened += 1
+        return reader, writer
+
+    async def get(self, target, headers):
+        """GET target; returns (status, body bytes)"""
+        async with self._slots:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            try:
+                return await self._get(target, headers)
+            finally:
+                self.active -= 1
+
+    async def _get(self, target, headers):
+        reused = bool(self._idle)
+        connection = self._idle.pop() if reused else await self._connect()
+        try:
+            status, body, keep_alive = await asyncio.wait_for(
+                self._exchange(connection, target, headers), self.timeout)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            self._close(connection)
+            if not reused:
+                raise
+            connection = await self._connect()
+            try:
+                status, body, keep_alive = await asyncio.wait_for(
+                    self._exchange(connection, target, headers), self.timeout)
+            except BaseException:
+                self._close(connection)
+                raise
+        except BaseException:
+            self._close(connection)
+            raise
+
+        if keep_alive:
+            self._idle.append(connection)
+        else:
+            self._close(connection)
+        return status, body
+
+    async def _exchange(self, connection, target, headers):
+        reader, writer = connection
+        lines = [f'GET {target} HTTP/1.1', f'Host: {self.host}:{self.port}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readuntil(b'\r\n')
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise ValueError(f"Malformed status line: {status_line!r}")
+        status = int(parts[1])
+
+        response_headers = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (parts[0] != b'HTTP/1.0'
+                      and response_headers.get('connection', '').lower() != 'close')
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        return status, body, keep_alive
+
+    def _close(self, connection):
+        connection[1].close()
+
+    def close(self):
+        """Close idle connections"""
+        while self._idle:
+            self._close(self._idle.pop())
+
+def _price_field(data, name, alias):
+    """A price field, falling back only when it is missing (0 is a resolved-NO market)"""
+    for key in (name, alias):
+        if data.get(key) is not None:
+            return data[key]
+    return FALLBACK_PRICE
+
+def parse_midpoint(token_id, payload):
+    """Normalize a midpoint response body to {tokenId, yesPrice, noPrice, timestamp}"""
+    data = json.loads(payload)
+    if not isinstance(data, dict):
+        raise PriceError(f"Unexpected midpoint payload for {token_id}")
+
+    yes_price = _price_field(data, 'yesPrice', 'yes_price')
+    no_price = _price_field(data, 'noPrice', 'no_price')
+    return {
+        'tokenId': token_id,
+        'yesPrice': float(yes_price),
+        'noPrice': float(no_price),
+        'timestamp': data.get('timestamp') or int(time.time() * 1000)
+    }
+
+class PriceProvider:
+    """Cached, deduplicated, batched midpoint lookups against one price source
+
+    Belongs to the event loop it is first used on. Lookups for a token that
+    is already being fetched wait on the same request; single lookups made
+    within batch_window seconds of each other go out as one round, and
+    get_midpoints() sends its whole list as one round straight away.
+    """
+
+    def __init__(self, source, max_connections=DEFAULT_MAX_CONNECTIONS, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, batch_window=DEFAULT_BATCH_WINDOW,
+                 timeout=DEFAULT_TIMEOUT, api_key=None, clock=time.monotonic):
+        url = urlsplit(source)
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise ValueError(f"Unsupported price source: {source!r}")
+
+        self.template = url.path if '{tokenId}' in url.path else url.path.rstrip('/') + '/{tokenId}'
+        self.query = f'?{url.query}' if url.query else ''
+        self.pool = ConnectionPool(url.hostname, url.port or (443 if url.scheme == 'https' else 80),
+                                   url.scheme == 'https', max_connections, timeout)
+        self.cache = TTLCache(ttl, max_entries, clock)
+        self.batch_window = batch_window
+        self.headers = {'Accept': 'application/json', 'User-Agent': USER_AGENT}
+        if api_key:
+            self.headers['Authorization'] = f'Bearer {api_key}'
+
+        self._inflight = {}
+        self._pending = []
+        self._flush_handle = None
+        self._rounds = set()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'deduplicated': 0, 'rounds': 0, 'errors': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Wait for in-flight rounds, then close pooled connections"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush()
+        if self._rounds:
+            await asyncio.gather(*self._rounds, return_exceptions=True)
+        self.pool.close()
+
+    def _target(self, token_id):
+        return self.template.replace('{tokenId}', quote(str(token_id), safe='')) + self.query
+
+    async def _fetch(self, token_id):
+        self.stats['requests'] += 1
+        status, body = await self.pool.get(self._target(token_id), self.headers)
+        if status != 200:
+            raise PriceError(f"Price source returned {status} for {token_id}")
+        return parse_midpoint(token_id, body)
+
+    async def _resolve(self, token_id):
+        future = self._inflight[token_id]
+        try:
+            midpoint = await self._fetch(token_id)
+        except Exception as e:
+            self.stats['errors'] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.cache.put(token_id, midpoint)
+            if not future.done():
+                future.set_result(midpoint)
+        finally:
+            del self._inflight[token_id]
+
+    def _flush(self):
+        """Send every pending token as one round"""
+        self._flush_handle = None
+        tokens, self._pending = self._pending, []
+        if not tokens:
+            return
+        self.stats['rounds'] += 1
+        task = asyncio.ensure_future(asyncio.gather(*(self._resolve(t) for t in tokens)))
+        self._rounds.add(task)
+        task.add_done_callback(self._rounds.discard)
+
+    def _schedule(self, token_id):
+        """Future for a token's midpoint, joining an in-flight fetch when there is one"""
+        future = self._inflight.get(token_id)
+        if future is not None:
+            self.stats['deduplicated'] += 1
+            return future
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[token_id] = future
+        self._pending.append(token_id)
+        return future
+
+    async def get_midpoint(self, token_id):
+        """Midpoint for one token; raises PriceError / OSError when unavailable"""
+        cached = self.cache.get(token_id)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        future = self._schedule(token_id)
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window,
+                                                                       self._flush)
+        return await asyncio.shield(future)
+
+    async def get_midpoints(self, token_ids):
+        """tokenId -> midpoint for many tokens in one round; failed tokens are left out"""
+        midpoints = {}
+        waiting = {}
+        for token_id in dict.fromkeys(token_ids):
+            cached = self.cache.get(token_id)
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                midpoints[token_id] = cached
+            else:
+                waiting[token_id] = self._schedule(token_id)
+
+        if self._pending:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._flush()
+
+        if waiting:
+            outcomes = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()),
+                                            return_exceptions=True)
+            for token_id, outcome in zip(waiting, outcomes):
+                if not isinstance(outcome, BaseException):
+                    midpoints[token_id] = outcome
+
+        return midpoints
+
+def fetch_midpoints(token_ids, source, **options):
+    """Synchronous get_midpoints() with a one-off provider"""
+    async def fetch():
+        async with PriceProvider(source, **options) as provider:
+            return await provider.get_midpoints(token_ids)
+    return asyncio.run(fetch())
+
+def position_tokens(positions, token_key='tokenId'):
+    """Distinct token ids referenced by position dicts"""
+    return list(dict.fromkeys(p[token_key] for p in positions if p.get(token_key)))
+
+def reprice_positions(positions, midpoints, token_key='tokenId'):
+    """Mark position dicts to the given midpoints (in place); returns the count repriced
+
+    Positions hold YES shares, so the mark is yesPrice and pnl becomes
+    (mark - entryPrice) * shares. Positions without a fetched price keep
+    their existing currentPrice / pnl.
+    """
+    repriced = 0
+    for position in positions:
+        midpoint = midpoints.get(position.get(token_key))
+        if midpoint is None:
+            continue
+        mark = midpoint['yesPrice']
+        position['currentPrice'] = mark
+        position['pnl'] = (mark - position['entryPrice']) * position['shares']
+        repriced += 1
+    return repriced
+
+def reprice_book(positions, source, token_key='tokenId', **options):
+    """Fetch every token in the book in one round and reprice it; returns the count repriced"""
+    midpoints = fetch_midpoints(position_tokens(positions, token_key), source, **options)
+    return reprice_positions(positions, midpoints, token_key)
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Fetch midpoints for token ids')
+    parser.add_argument('source', help='midpoint URL base, or a template containing {tokenId}')
+    parser.add_argument('tokens', nargs='+', help='token ids')
+    parser.add_argument('--connections', type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help='maximum concurrent connections')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='seconds per request')
+    return parser.parse_args(argv)
+
+def main():
+    """Fetch and print midpoints"""
+
+    args = parse_args()
+
+    try:
+        midpoints = fetch_midpoints(args.tokens, args.source, max_connections=args.connections,
+                                    timeout=args.timeout)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    missing = [token for token in args.tokens if token not in midpoints]
+    if missing:
+        print(f"⚠️  No midpoint for {len(missing)} token(s): {', '.join(missing)}", file=sys.stderr)
+
+    print(json.dumps(midpoints, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+"""
+Trader Ranking Index (Python)
+Live leaderboard over trader scores (ROI * win rate by default), held in an
+indexable skiplist so a score update, "rank of trader X" and the top-N page
+are O(log n) instead of re-sorting every trader
+
+Ordering matches train_yield.select_top_traders: highest score first, ties
+in the order traders were first added. The yield allocation tiers are just
+the top TOP_TRADERS entries of the same index.
+
+Usage:
+  python ranking.py traders.ndjson --top 20
+  python ranking.py traders.ndjson --rank 0x0000000000000000000000000000000000000007
+"""
+
+import sys
+import json
+import random
+import argparse
+
+# Enough levels for ~2^32 traders at p = 1/2
+MAX_LEVELS = 32
+
+class _Node:
+    __slots__ = ('key', 'trader_id', 'next', 'width')
+
+    def __init__(self, key, trader_id, levels):
+        self.key = key
+        self.trader_id = trader_id
+        self.next = [None] * levels
+        # width[i]: how many positions next[i] is ahead of this node
+        self.width = [0] * levels
+
+def trader_score(trader):
+    """Ranking score of a trader dict (the allocation score, ROI * win rate)"""
+    if 'score' in trader:
+        return float(trader['score'])
+    return float(trader['roi']) * float(trader['win_rate'])
+
+class RankingIndex:
+    """Indexable skiplist of traders ordered by descending score
+
+    Each node's key is (-score, sequence), where sequence is the order the
+    trader was first added in and survives score updates, so equal scores
+    keep a stable order. Per-level link widths give positional access.
+    """
+
+    def __init__(self, seed=None):
+        self._random = random.Random(seed)
+        self._clear()
+
+    def _clear(self):
+        self._head = _Node(None, None, MAX_LEVELS)
+        self._head.width = [1] * MAX_LEVELS
+        self._levels = 1
+        self._size = 0
+        self._next_sequence = 0
+        self._keys = {}
+        self._records = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, trader_id):
+        return trader_id in self._keys
+
+    @classmethod
+    def from_traders(cls, traders, seed=None):
+        """Bulk-build from trader dicts in input order (one sort, linear linking)"""
+        index = cls(seed)
+        index.load(((trader['id'], trader_score(trader), trader) for trader in traders))
+        return index
+
+    def load(self, entries):
+        """Replace the contents with (trader_id, score, record) entries, in input order
+
+        Sorts once and links every level in a single pass, instead of n
+        O(log n) inserts. A repeated trader id keeps its last score.
+        """
+        latest = {}
+        for trader_id, score, record in entries:
+            if trader_id in latest:
+                sequence = latest[trader_id][1][1]
+            else:
+                sequence = len(latest)
+            latest[trader_id] = (record, (-float(score), sequence))
+
+        ordered = sorted(latest.items(), key=lambda item: item[1][1])
+        self._clear()
+        self._next_sequence = len(ordered)
+
+        size = len(ordered)
+        last = [self._head] * MAX_LEVELS
+        last_position = [-1] * MAX_LEVELS
+        levels = 1
+
+        for position, (trader_id, (record, key)) in enumerate(ordered):
+            node = _Node(key, trader_id, self._random_levels())
+            levels = max(levels, len(node.next))
+            for level in range(len(node.next)):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level], last_position[level] = node, position
+            self._keys[trader_id] = key
+            self._records[trader_id] = record
+
+        # Links to the end of the list span the remaining positions
+        for level in range(MAX_LEVELS):
+            last[level].width[level] = size - last_position[level]
+
+        self._size = size
+        self._levels = levels
+        return self
+
+    def _random_levels(self):
+        # 1 + trailing one bits of a random word: P(levels >= k) = 2^-(k - 1)
+        bits = self._random.getrandbits(MAX_LEVELS - 1)
+        return (bits ^ (bits + 1)).bit_length()
+
+    def _predecessors(self, key):
+        """(per-level last node before key, its position); position -1 is the head"""
+        chain = [None] * self._levels
+        positions = [0] * self._levels
+        node, position = self._head, -1
+        for level in range(self._levels - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            chain[level], positions[level] = node, position
+        return chain, positions
+
+    def _insert(self, trader_id, key):
+        levels = self._random_levels()
+        if levels > self._levels:
+            self._levels = levels
+        chain, positions = self._predecessors(key)
+        position = positions[0] + 1
+        node = _Node(key, trader_id, levels)
+
+        for level in range(self._levels):
+            previous = chain[level]
+            if level < levels:
+                # Everything after the new node moves up one position
+                node.next[level] = previous.next[level]
+                node.width[level] = positions[level] + previous.width[level] + 1 - position
+                previous.next[level] = node
+                previous.width[level] = position - positions[level]
+            else:
+                previous.width[level] += 1
+        for level in range(self._levels, MAX_LEVELS):
+            self._head.width[level] += 1
+        self._size += 1
+
+    def _delete(self, key):
+        chain, _ = self._predecessors(key)
+        node = chain[0].next[0]
+
+        for level in range(self._levels):
+            previous = chain[level]
+            if previous.next[level] is node:
+                previous.width[level] += node.width[level] - 1
+                previous.next[level] = node.next[level]
+            else:
+                previous.width[level] -= 1
+        for level in range(self._levels, MAX_LEVELS):
+            self._head.width[level] -= 1
+        self._size -= 1
+
+    def update(self, trader_id, score, record=None):
+        """Set a trader's score (adding the trader if new); O(log n)
+
+        record, if given, replaces what top() returns for the trader.
+        """
+        key = self._keys.get(trader_id)
+        if key is not None:
+            if key[0] == -float(score):
+                if record is not None:
+                    self._records[trader_id] = record
+                return self
+            self._delete(key)
+            key = (-float(score), key[1])
+        else:
+            key = (-float(score), self._next_sequence)
+            self._next_sequence += 1
+
+        self._keys[trader_id] = key
+        if record is not None or trader_id not in self._records:
+            self._records[trader_id] = record
+        self._insert(trader_id, key)
+        return self
+
+    def update_trader(self, trader):
+        """update() from a trader dict carrying id and score (or roi and win_rate)"""
+        return self.update(trader['id'], trader_score(trader), trader)
+
+    def remove(self, trader_id):
+        """Drop a trader; returns whether it was present"""
+        key = self._keys.pop(trader_id, None)
+        if key is None:
+            return False
+        self._records.pop(trader_id, None)
+        self._delete(key)
+        return True
+
+    def score(self, trader_id):
+        """Current score of a trader, or None"""
+        key = self._keys.get(trader_id)
+        return None if key is None else -key[0]
+
+    def rank(self, trader_id):
+        """1-based rank of a trader, or None when absent; O(log n)"""
+        key = self._keys.get(trader_id)
+        if key is None:
+            return None
+        _, positions = self._predecessors(key)
+        return positions[0] + 2
+
+    def _node_at(self, position):
+        node, current = self._head, -1
+        for level in range(self._levels - 1, -1, -1):
+            while node.next[level] is not None and current + node.width[level] <= position:
+                current += node.width[level]
+                node = node.next[level]
+        return node
+
+    def entries(self, count, offset=0):
+        """(rank, trader_id, score) for ranks offset + 1 .. offset + count"""
+        if offset >= self._size or count <= 0:
+            return []
+        node = self._node_at(offset)
+        entries = []
+        for rank in range(offset + 1, min(offset + count, self._size) + 1):
+            entries.append((rank, node.trader_id, -node.key[0]))
+            node = node.next[0]
+        return entries
+
+    def top(self, count, offset=0):
+        """Leaderboard page: the stored trader records with rank and score added"""
+        page = []
+        for rank, trader_id, score in self.entries(count, offset):
+            entry = dict(self._records.get(trader_id) or {'id': trader_id})
+            entry['rank'] = rank
+            entry['score'] = score
+            page.append(entry)
+        return page
+
+    def top_records(self, count):
+        """Stored records of the top count traders, best first (train_yield's ranked input)"""
+        return [self._records.get(trader_id) or {'id': trader_id, 'score': score}
+                for _, trader_id, score in self.entries(count)]
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Rank traders by ROI * win rate')
+    parser.add_argument('traders', help='trader export (JSON array or NDJSON)')
+    parser.add_argument('--top', type=int, default=20, help='leaderboard size')
+    parser.add_argument('--offset', type=int, default=0, help='leaderboard start rank - 1')
+    parser.add_argument('--rank', default=None, metavar='TRADER_ID',
+                        help='print the rank of one trader instead of the leaderboard')
+    return parser.parse_args(argv)
+
+def main():
+    """Build the index from a trader export and print a leaderboard page or a rank"""
+
+    # train_yield imports this module, so its shard reader is imported here
+    import train_yield
+
+    args = parse_args()
+    try:
+        index = RankingIndex.from_traders(train_yield.load_trader_shard(args.traders))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Error: Failed to load traders from {args.traders}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.rank is not None:
+        result = {'id': args.rank, 'rank': index.rank(args.rank),
+                  'score': index.score(args.rank), 'count': len(index)}
+    else:
+        result = {'traders': index.top(args.top, args.offset), 'count': len(index)}
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
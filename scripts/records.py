@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+
+"""
+Compact Record Layer (Python)
+Numpy structured-array storage for positions and trader stats, with
+conversion to and from the dict/JSON shape used at the script edges
+"""
+
+import itertools
+import numpy as np
+
+# Status strings are stored as small integer codes
+POSITION_STATUSES = ('open', 'closed', 'resolved')
+
+def _id_dtype(ids):
+    """Fixed-width bytes dtype just wide enough for the given ids"""
+    width = max((len(i) for i in ids), default=1)
+    return f'S{max(width, 1)}'
+
+def position_dtype(id_dtype='S16'):
+    """Packed record layout for one position"""
+    return np.dtype([
+        ('id', id_dtype),
+        ('end_code', np.int32),       # index into PositionTable.end_dates
+        ('entry_price', np.float64),
+        ('current_price', np.float64),  # NaN when unknown
+        ('shares', np.float64),
+        ('pnl', np.float64),
+        ('status', np.uint8),         # index into POSITION_STATUSES
+    ])
+
+def trader_dtype(id_dtype='S42'):
+    """Packed record layout for one trader's performance stats"""
+    return np.dtype([
+        ('id', id_dtype),
+        ('roi', np.float64),
+        ('fees_earned', np.float64),
+        ('splits_earned', np.float64),
+        ('total_trades', np.int32),
+        ('win_rate', np.float64),
+        ('avg_position_size', np.float64),
+        ('trading_days', np.int32),
+    ])
+
+class PositionTable:
+    """Positions as one structured array plus a table of distinct end dates
+
+    End dates are integer-coded in first-appearance order, so grouping by
+    end_code gives clusters in the same order as grouping the dicts. Market
+    categories, when the positions carry any, are coded the same way in a
+    separate array (category_codes indexes categories, where None means
+    uncategorized).
+    """
+
+    __slots__ = ('records', 'end_dates', 'category_codes', 'categories')
+
+    def __init__(self, records, end_dates, category_codes=None, categories=None):
+        self.records = records
+        self.end_dates = end_dates
+        self.category_codes = category_codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_dicts(cls, positions):
+        """Build a table from position dicts (fields outside the layout are dropped)"""
+        ids = [str(p['id']).encode('utf-8') for p in positions]
+        records = np.zeros(len(positions), dtype=position_dtype(_id_dtype(ids)))
+        status_codes = {status: code for code, status in enumerate(POSITION_STATUSES)}
+        end_date_codes = {}
+
+        count = len(positions)
+        records['id'] = ids
+        records['end_code'] = np.fromiter(
+            (end_date_codes.setdefault(p['endDate'], len(end_date_codes)) for p in positions),
+            dtype=np.int32, count=count)
+        records['entry_price'] = np.fromiter((p['entryPrice'] for p in positions),
+                                             dtype=np.float64, count=count)
+        records['current_price'] = np.fromiter((p.get('currentPrice', np.nan) for p in positions),
+                                               dtype=np.float64, count=count)
+        records['shares'] = np.fromiter((p['shares'] for p in positions),
+                                        dtype=np.float64, count=count)
+        records['pnl'] = np.fromiter((p['pnl'] for p in positions), dtype=np.float64, count=count)
+        records['status'] = np.fromiter((status_codes.get(p.get('status', 'open'), 0)
+                                         for p in positions), dtype=np.uint8, count=count)
+
+        category_codes = categories = None
+        if any('category' in p for p in positions):
+            codes = {}
+            category_codes = np.fromiter(
+                (codes.setdefault(p.get('category'), len(codes)) for p in positions),
+                dtype=np.int32, count=count)
+            categories = list(codes)
+
+        return cls(records, list(end_date_codes), category_codes, categories)
+
+    def to_dicts(self):
+        """Convert back to the position dict shape"""
+        end_dates = self.end_dates
+        positions = []
+
+        if self.category_codes is not None:
+            categories = [self.categories[code] for code in self.category_codes.tolist()]
+        else:
+            categories = itertools.repeat(None)
+
+        for record, category in zip(self.records.tolist(), categories):
+            position_id, end_code, entry_price, current_price, shares, pnl, status = record
+            position = {
+                'id': position_id.decode('utf-8'),
+                'endDate': end_dates[end_code],
+                'entryPrice': entry_price,
+                'shares': shares,
+                'pnl': pnl,
+                'status': POSITION_STATUSES[status]
+            }
+            if current_price == current_price:  # not NaN
+                position['currentPrice'] = current_price
+            if category is not None:
+                position['category'] = category
+            positions.append(position)
+
+        return positions
+
+    def columns(self):
+        """Column views in the shape predict_risk's cluster engine consumes"""
+        records = self.records
+        columns = {
+            'entry_price': records['entry_price'],
+            'shares': records['shares'],
+            'pnl': records['pnl'],
+            'end_code': records['end_code'],
+            'end_dates': self.end_dates
+        }
+        if self.category_codes is not None:
+            columns['category_code'] = self.category_codes
+            columns['categories'] = self.categories
+        return columns
+
+class TraderTable:
+    """Trader performance stats as one structured array"""
+
+    __slots__ = ('records',)
+
+    FIELDS = ('roi', 'fees_earned', 'splits_earned', 'total_trades',
+              'win_rate', 'avg_position_size', 'trading_days')
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_dicts(cls, traders):
+        """Build a table from trader dicts"""
+        ids = [str(t['id']).encode('utf-8') for t in traders]
+        records = np.zeros(len(traders), dtype=trader_dtype(_id_dtype(ids)))
+        records['id'] = ids
+
+        for field in cls.FIELDS:
+            records[field] = np.fromiter((t[field] for t in traders),
+                                         dtype=records.dtype[field], count=len(traders))
+
+        return cls(records)
+
+    def to_dicts(self, indices=None):
+        """Convert (optionally selected rows) back to the trader dict shape"""
+        records = self.records if indices is None else self.records[indices]
+        names = ('id',) + self.FIELDS
+
+        traders = []
+        for record in records.tolist():
+            trader = dict(zip(names, record))
+            trader['id'] = trader['id'].decode('utf-8')
+            traders.append(trader)
+
+        return traders
+
+    def scores(self):
+        """Allocation ranking score (roi * win_rate) for every trader"""
+        return self.records['roi'] * self.records['win_rate']
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+"""
+Incremental Risk Book (Python)
+Keeps per-end-date cluster totals so opening, closing or repricing one
+position only touches its own cluster
+
+Cluster totals are kept in integer micro-units (MICRO per unit), so
+opening, closing and repricing adjust them by exact deltas that never drift.
+A full recompute (assess_cluster_risk plus generate_risk_prediction over the
+live positions) sums the same values as floats, so the two agree to within
+float rounding: at most a cent on the rounded metrics. Models with a
+cluster_window or cluster_by_category bin the book's end-date (and category)
+groups through the same clustering engine as the predictor.
+"""
+
+import heapq
+from collections import OrderedDict
+
+import clustering
+import predict_risk
+
+# Integer units per dollar for the running totals
+MICRO = 10 ** 6
+
+def _micro(value):
+    return round(value * MICRO)
+
+class _Cluster:
+    """Running totals for one end-date (and category) group"""
+
+    __slots__ = ('end_date', 'category', 'version', 'value_micro', 'pnl_micro', 'total_value',
+                 'total_pnl', 'total_cents', 'members', 'position_heap', 'assessment')
+
+    def __init__(self, end_date, category=None):
+        self.end_date = end_date
+        self.category = category
+        self.version = 0
+        self.value_micro = 0
+        self.pnl_micro = 0
+        self.total_value = 0.0
+        self.total_pnl = 0.0
+        self.total_cents = 0  # rounded total_value, in cents
+        self.members = OrderedDict()  # position_id -> None, in book order; O(1) first member
+        self.position_heap = []  # (-value, position_id), stale entries skipped lazily
+        self.assessment = None
+
+class RiskBook:
+    """Live risk state for one portfolio
+
+    A position change adjusts its own cluster's totals in O(1) and pushes
+    the refreshed assessment onto lazily-invalidated heaps (O(log clusters)).
+    The portfolio payload reads cluster maxima off those heaps, so neither
+    updates nor snapshots rescan other clusters.
+
+    Positions are kept in book order: a new (or reopened) position goes to
+    the end, a repriced one keeps its place. Clusters are ordered by their
+    earliest member, which is the order the batch path discovers them in.
+
+    When the model bins clusters into windows or splits them by category,
+    the book keeps one group per end date (and category) and the payload
+    bins the group totals with clustering.cluster_groups() on each call:
+    O(groups log groups) rather than a heap read, still without touching
+    positions.
+    """
+
+    def __init__(self, model_weights=None):
+        if model_weights is None:
+            model_weights = predict_risk.default_model_data()['model_weights']
+
+        # position_id -> (group key, value, pnl, order, category), in book order
+        self.positions = {}
+        self.clusters = {}  # group key -> _Cluster; the key is (end_date, category or None)
+        self.total_cents = 0  # sum of the clusters' rounded total values, in cents
+        self._next_order = 0
+        self._next_version = 0  # book-wide, so a recreated cluster never revives stale entries
+        self._set_clustering(model_weights)
+        self._clear_heaps()
+
+    def _set_clustering(self, model_weights):
+        self.model_weights = model_weights
+        window, self.by_category = clustering.model_clustering(model_weights)
+        self._windowed = window.kind != 'exact' or self.by_category
+
+    def _clear_heaps(self):
+        # Portfolio-level heaps of (-metric, first member order, version, group key)
+        self._by_drawdown = []
+        self._by_high_drawdown = []
+        self._by_size = []
+        self._by_value = []
+
+    def set_model_weights(self, model_weights):
+        """Re-score every cluster against new model weights (e.g. a reloaded model)"""
+        by_category = self.by_category
+        self._set_clustering(model_weights)
+        self._clear_heaps()
+
+        if self.by_category != by_category:
+            # Regroup every position under the new keys, in book order
+            self.clusters = {}
+            self.total_cents = 0
+            for position_id, (key, value, pnl, order, category) in list(self.positions.items()):
+                key = (key[0], category if self.by_category else None)
+                self.positions[position_id] = (key, value, pnl, order, category)
+                cluster = self._cluster(key)
+                self._add(cluster, position_id, value, pnl)
+                self._push_position(cluster, value, position_id)
+
+        for cluster in list(self.clusters.values()):
+            self._refresh(cluster)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def open_position(self, position):
+        """Add a position dict (replaces any position with the same id)"""
+        position_id = position['id']
+        if position_id in self.positions:
+            self.close_position(position_id)
+
+        category = position.get('category')
+        key = (position['endDate'], category if self.by_category else None)
+        value = float(position['entryPrice']) * float(position['shares'])
+        pnl = float(position['pnl'])
+
+        self.positions[position_id] = (key, value, pnl, self._next_order, category)
+        self._next_order += 1
+        cluster = self._cluster(key)
+        self._add(cluster, position_id, value, pnl)
+        self._push_position(cluster, value, position_id)
+        self._refresh(cluster)
+
+    def close_position(self, position_id):
+        """Remove a position; unknown ids are ignored"""
+        entry = self.positions.pop(position_id, None)
+        if entry is None:
+            return
+
+        key, value, pnl, _, _ = entry
+        cluster = self.clusters[key]
+        del cluster.members[position_id]
+        cluster.value_micro -= _micro(value)
+        cluster.pnl_micro -= _micro(pnl)
+        self._refresh(cluster)
+
+    def reprice_position(self, position_id, pnl, entry_price=None, shares=None):
+        """Update a position's PnL (and optionally its size) in place"""
+        key, value, old_pnl, order, category = self.positions[position_id]
+
+        if entry_price is not None or shares is not None:
+            if entry_price is None or shares is None:
+                raise ValueError('entry_price and shares must be repriced together')
+            new_value = float(entry_price) * float(shares)
+        else:
+            new_value = value
+
+        pnl = float(pnl)
+        self.positions[position_id] = (key, new_value, pnl, order, category)
+
+        cluster = self.clusters[key]
+        cluster.value_micro += _micro(new_value) - _micro(value)
+        cluster.pnl_micro += _micro(pnl) - _micro(old_pnl)
+        if new_value != value:
+            self._push_position(cluster, new_value, position_id)
+        self._refresh(cluster)
+
+    def cluster_assessment(self, end_date, category=None):
+        """Assessment for one end-date (and category) group, plus its largest single position
+
+        This is the group's own totals, before any window binning.
+        """
+        cluster = self.clusters.get((end_date, category))
+        if cluster is None:
+            return None
+
+        assessment = dict(cluster.assessment)
+        assessment['max_single_position'] = round(self._max_position(cluster), 2)
+        return assessment
+
+    def prediction(self):
+        """Portfolio payload in the same shape as generate_risk_prediction()"""
+        if not self.clusters:
+            return predict_risk.generate_risk_prediction([], self.model_weights)
+        if self._windowed:
+            return self._windowed_prediction()
+
+        max_risk = self._top(self._by_high_drawdown)
+        if max_risk is not None:
+            alert = True
+            message = ".2f"
+            severity = max_risk['severity']
+            max_drawdown = max_risk['drawdown_percentage']
+            recommendations = list(predict_risk.HIGH_RISK_RECOMMENDATIONS)
+        else:
+            alert = False
+            message = ""
+            severity = "low"
+            max_drawdown = self._top(self._by_drawdown)['drawdown_percentage']
+            recommendations = list(predict_risk.LOW_RISK_RECOMMENDATIONS)
+
+        max_cluster_size = self._top(self._by_size)['cluster_size']
+        concentration_risk = (max_cluster_size / len(self.clusters)) * 100
+
+        return {
+            'alert': alert,
+            'message': message,
+            'severity': severity,
+            'metrics': {
+                'maxDrawdown': max_drawdown,
+                'drawdownDate': max_risk['end_date'] if max_risk is not None else None,
+                'clusterSize': max_cluster_size,
+                'totalExposure': round(self.total_cents / 100, 2),
+                'maxSinglePosition': self._top(self._by_value)['total_value'],
+                'concentrationRisk': round(concentration_risk, 2),
+                'threshold': self.model_weights.get('drawdown_threshold', 4.0)
+            },
+            'recommendations': recommendations
+        }
+
+    def _windowed_prediction(self):
+        """Payload for windowed or category models, binning the groups like a full recompute"""
+        groups = list(self.clusters.values())
+
+        # A full recompute orders groups by the first appearance of their end date, then category
+        label_first = {}
+        category_first = {}
+        for group in groups:
+            first = self._first_order(group)
+            label_first[group.end_date] = min(first, label_first.get(group.end_date, first))
+            category_first[group.category] = min(first, category_first.get(group.category, first))
+        groups.sort(key=lambda group: (label_first[group.end_date],
+                                       category_first[group.category]))
+
+        totals = {
+            'total_value': [group.total_value for group in groups],
+            'total_pnl': [group.total_pnl for group in groups],
+            'cluster_size': [len(group.members) for group in groups]
+        }
+        assessments = predict_risk.assess_windowed_totals(
+            [group.end_date for group in groups], totals, self.model_weights,
+            [group.category for group in groups] if self.by_category else None)
+        return predict_risk.generate_risk_prediction(assessments, self.model_weights)
+
+    def _cluster(self, key):
+        cluster = self.clusters.get(key)
+        if cluster is None:
+            cluster = _Cluster(*key)
+            self.clusters[key] = cluster
+        return cluster
+
+    def _first_order(self, cluster):
+        return self.positions[next(iter(cluster.members))][3]
+
+    def _add(self, cluster, position_id, value, pnl):
+        cluster.members[position_id] = None
+        cluster.value_micro += _micro(value)
+        cluster.pnl_micro += _micro(pnl)
+
+    def _refresh(self, cluster):
+        """Republish one cluster's assessment from its running totals"""
+        self._next_version += 1
+        cluster.version = self._next_version
+        self.total_cents -= cluster.total_cents
+
+        if not cluster.members:
+            del self.clusters[(cluster.end_date, cluster.category)]
+            return
+
+        total_value = cluster.value_micro / MICRO
+        total_pnl = cluster.pnl_micro / MICRO
+        cluster.total_value = total_value
+        cluster.total_pnl = total_pnl
+
+        cluster.assessment = predict_risk.assess_cluster_totals(
+            [cluster.end_date], [total_value], [total_pnl], [len(cluster.members)],
+            self.model_weights, [cluster.category] if self.by_category else None)[0]
+
+        # Exposure sums the rounded cluster values; whole cents keep that sum exact
+        cluster.total_cents = round(cluster.assessment['total_value'] * 100)
+        self.total_cents += cluster.total_cents
+
+        if self._windowed:
+            return
+
+        key = (self._first_order(cluster), cluster.version, (cluster.end_date, cluster.category))
+        assessment = cluster.assessment
+        self._push(self._by_drawdown, -assessment['drawdown_percentage'], key)
+        self._push(self._by_size, -assessment['cluster_size'], key)
+        self._push(self._by_value, -assessment['total_value'], key)
+        if assessment['risk_level'] == 'high':
+            self._push(self._by_high_drawdown, -assessment['drawdown_percentage'], key)
+
+    def _push(self, heap, metric, key):
+        heapq.heappush(heap, (metric,) + key)
+
+        # Rebuild once stale entries dominate; amortized O(1) per update
+        if len(heap) > 4 * len(self.clusters) + 64:
+            live = [entry for entry in heap if self._is_live(entry)]
+            heapq.heapify(live)
+            heap[:] = live
+
+    def _is_live(self, entry):
+        _, _, version, key = entry
+        cluster = self.clusters.get(key)
+        return cluster is not None and cluster.version == version
+
+    def _top(self, heap):
+        """Assessment of the cluster at the top of a heap, skipping stale entries"""
+        while heap:
+            if self._is_live(heap[0]):
+                return self.clusters[heap[0][3]].assessment
+            heapq.heappop(heap)
+        return None
+
+    def _push_position(self, cluster, value, position_id):
+        heap = cluster.position_heap
+        heapq.heappush(heap, (-value, position_id))
+
+        if len(heap) > 2 * len(cluster.members) + 16:
+            heap[:] = [(-self.positions[member][1], member) for member in cluster.members]
+            heapq.heapify(heap)
+
+    def _max_position(self, cluster):
+        heap = cluster.position_heap
+        while heap:
+            value, position_id = heap[0]
+            entry = self.positions.get(position_id)
+            if (entry is not None and entry[0] == (cluster.end_date, cluster.category)
+                    and entry[1] == -value):
+                return -value
+            heapq.heappop(heap)
+
+        return 0.0
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic Data Generator (Python)
+Seeded, vectorized positions and trader stats for load testing the risk and
+yield paths, streamed to NDJSON or .npy
+
+Usage:
+  python synthetic.py positions --count 1000000 --seed 7 --clusters 365 --output book.ndjson
+  python synthetic.py traders --count 1000000 --seed 7 --format npy --output traders.npy
+  python synthetic.py positions --count 10000000 --format columns --output data/positions
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+
+import columnar_store
+import records
+
+# Cluster distributions accepted by cluster_codes()
+DISTRIBUTIONS = ('uniform', 'zipf', 'front')
+
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+def make_rng(seed=None):
+    """Random generator for a seed (None draws fresh OS entropy)"""
+    return np.random.default_rng(seed)
+
+def end_dates(num_clusters, base_date=None, spread_days=1, offset_days=0):
+    """num_clusters end dates, spread_days apart, starting offset_days after base_date"""
+    if base_date is None:
+        base_date = datetime.now()
+    return [base_date + timedelta(days=offset_days + i * spread_days) for i in range(num_clusters)]
+
+def end_date_labels(dates, date_format=None):
+    """endDate strings for the given dates (ISO timestamps unless date_format is set)"""
+    if date_format is None:
+        return [date.isoformat() for date in dates]
+    return [date.strftime(date_format) for date in dates]
+
+def cluster_weights(num_clusters, distribution='uniform', skew=1.2):
+    """Probability of each end-date cluster, or None for uniform"""
+    if distribution == 'uniform':
+        return None
+
+    ranks = np.arange(1, num_clusters + 1, dtype=np.float64)
+    if distribution == 'zipf':
+        # A few heavy clusters, long thin tail, in random date order
+        weights = ranks ** -skew
+    elif distribution == 'front':
+        # Near-dated clusters dominate, decaying with horizon
+        weights = np.exp(-skew * ranks / num_clusters)
+    else:
+        raise ValueError(f"Unknown cluster distribution: {distribution!r}")
+
+    return weights / weights.sum()
+
+def cluster_codes(rng, count, num_clusters, distribution='uniform', skew=1.2):
+    """Cluster index for each of count positions"""
+    weights = cluster_weights(num_clusters, distribution, skew)
+    if weights is None:
+        return rng.integers(0, num_clusters, size=count, dtype=np.int32)
+
+    if distribution == 'zipf':
+        weights = weights[rng.permutation(num_clusters)]
+    return rng.choice(num_clusters, size=count, p=weights).astype(np.int32)
+
+def decimal_ids(prefix, start, count):
+    """Byte ids prefix + decimal index, built without a Python loop"""
+    numbers = np.arange(start, start + count, dtype=np.int64).astype('S')
+    return np.char.add(prefix.encode('utf-8'), numbers)
+
+def hex_ids(start, count, width=40):
+    """Byte ids '0x' + zero-padded hex index (the trader address shape)"""
+    numbers = np.arange(start, start + count, dtype=np.uint64)
+    digits = min(width, 16)
+    shifts = (np.arange(digits - 1, -1, -1, dtype=np.uint64) * np.uint64(4))
+
+    buf = np.full((count, width + 2), ord('0'), dtype=np.uint8)
+    buf[:, 1] = ord('x')
+    buf[:, width + 2 - digits:] = _HEX_DIGITS[(numbers[:, None] >> shifts) & np.uint64(15)]
+    return buf.view(f'S{width + 2}').ravel()
+
+def position_records(rng, codes, id_start=0, id_prefix='pos_', id_dtype=None,
+                     price_range=(0.1, 1.0), current_price_range=(0.05, 1.2),
+                     share_range=(10, 1000), pnl_range=None):
+    """Position records for the given cluster codes, one array call per field
+
+    PnL is marked from a random current price unless pnl_range is given, in
+    which case it is drawn directly and current_price is left unknown (NaN).
+    """
+    count = len(codes)
+    ids = decimal_ids(id_prefix, id_start, count)
+    table = np.zeros(count, dtype=records.position_dtype(id_dtype or ids.dtype))
+
+    table['id'] = ids
+    table['end_code'] = codes
+    table['entry_price'] = rng.uniform(*price_range, size=count)
+    table['shares'] = rng.integers(*share_range, size=count)
+
+    if pnl_range is None:
+        table['current_price'] = rng.uniform(*current_price_range, size=count)
+        table['pnl'] = (table['current_price'] - table['entry_price']) * table['shares']
+    else:
+        table['current_price'] = np.nan
+        table['pnl'] = rng.uniform(*pnl_range, size=count)
+
+    return table
+
+def iter_position_tables(count, chunk_size=100000, num_clusters=365, seed=None,
+                         distribution='uniform', skew=1.2, spread_days=1, offset_days=0,
+                         base_date=None, date_format=None, cluster_sizes=None, **fields):
+    """Yield PositionTables of up to chunk_size positions sharing one end-date table
+
+    cluster_sizes, if given, fixes how many positions land in each cluster
+    (in order) and overrides count and distribution. Extra keyword arguments
+    go to position_records(). The same seed and chunk_size always produce the
+    same data.
+    """
+    rng = make_rng(seed)
+    dates = end_dates(num_clusters if cluster_sizes is None else len(cluster_sizes),
+                      base_date, spread_days, offset_days)
+    labels = end_date_labels(dates, date_format)
+
+    if cluster_sizes is not None:
+        all_codes = np.repeat(np.arange(len(cluster_sizes), dtype=np.int32), cluster_sizes)
+        count = len(all_codes)
+
+    # One id width for every chunk so chunks can be concatenated or written to one .npy
+    id_dtype = f"S{len(fields.get('id_prefix', 'pos_')) + len(str(max(count - 1, 0)))}"
+
+    # An empty request still yields one (empty) table carrying the end dates
+    for start in range(0, max(count, 1), chunk_size):
+        size = min(chunk_size, count - start)
+        if cluster_sizes is not None:
+            codes = all_codes[start:start + size]
+        else:
+            codes = cluster_codes(rng, size, num_clusters, distribution, skew)
+        table = position_records(rng, codes, id_start=start, id_dtype=id_dtype, **fields)
+        yield records.PositionTable(table, labels), dates
+
+def position_table(count, **options):
+    """One PositionTable of count positions, plus the cluster end dates"""
+    options.setdefault('chunk_size', sys.maxsize)
+    chunks = list(iter_position_tables(count, **options))
+
+    table = np.concatenate([chunk.records for chunk, _ in chunks])
+    first, dates = chunks[0]
+    return records.PositionTable(table, first.end_dates), dates
+
+def cluster_positions(rng, count, end_date, id_prefix='pos_', **fields):
+    """count position dicts in a single end-date cluster"""
+    table = position_records(rng, np.zeros(count, dtype=np.int32),
+                             id_prefix=id_prefix, **fields)
+    return records.PositionTable(table, [end_date]).to_dicts()
+
+def trader_records(rng, count, id_start=0):
+    """Trader stats records, drawn from the training mock distributions"""
+    table = np.zeros(count, dtype=records.trader_dtype('S42'))
+    table['id'] = hex_ids(id_start, count)
+    table['roi'] = rng.normal(0.12, 0.05, size=count)  # Mean 12% ROI with variance
+    table['fees_earned'] = rng.exponential(1000, size=count)
+    table['splits_earned'] = rng.exponential(800, size=count)
+    table['total_trades'] = rng.integers(10, 200, size=count)
+    table['win_rate'] = rng.beta(3, 1, size=count)
+    table['avg_position_size'] = rng.lognormal(8, 1, size=count)
+    table['trading_days'] = rng.integers(30, 365, size=count)
+    return table
+
+def iter_trader_tables(count, chunk_size=100000, seed=None):
+    """Yield TraderTables of up to chunk_size traders"""
+    rng = make_rng(seed)
+    for start in range(0, max(count, 1), chunk_size):
+        yield records.TraderTable(trader_records(rng, min(chunk_size, count - start), start))
+
+def trader_table(count, seed=None):
+    """One TraderTable of count traders"""
+    return records.TraderTable(trader_records(make_rng(seed), count))
+
+def cluster_outcomes(count, seed=None, threshold=0.04, noise=0.01):
+    """Labeled cluster outcomes (calibration.py columns) from a known threshold
+
+    A cluster is breached when its drawdown, plus Gaussian noise of scale
+    `noise`, crosses threshold; calibration should recover a threshold close
+    to it.
+    """
+    rng = make_rng(seed)
+    drawdown = rng.beta(1.5, 40, size=count)
+    return {
+        'drawdown': drawdown,
+        'breached': drawdown + rng.normal(0, noise, size=count) > threshold
+    }
+
+def iter_yield_history(count, chunk_size=1000000, seed=None, tick_seconds=60, start=None,
+                       tvl=50000.0, volatility=0.002):
+    """Yield backtest_yield.py history chunks: a TVL random walk with revenue
+
+    log TVL takes a Gaussian step per tick and is reflected into
+    [tvl / 10, tvl * 10], so the walk keeps crossing the APY tiers. Fees
+    accrue at roughly 10% a year of TVL; profit splits are noisier and
+    sometimes negative.
+    """
+    rng = make_rng(seed)
+    if start is None:
+        start = datetime(2024, 1, 1).timestamp()
+    low, width = np.log(tvl / 10), np.log(100.0)
+    level = np.log(tvl) - low
+    year_fraction = tick_seconds / (365 * 86400)
+
+    for offset in range(0, count, chunk_size):
+        size = min(chunk_size, count - offset)
+        walk = level + np.cumsum(rng.normal(0, volatility, size=size))
+        level = walk[-1]
+
+        # Fold the unbounded walk into the band (reflecting at both edges)
+        folded = np.mod(walk, 2 * width)
+        log_tvl = low + np.where(folded > width, 2 * width - folded, folded)
+
+        tvls = np.exp(log_tvl)
+        yield {
+            'timestamp': start + (offset + np.arange(size, dtype=np.float64)) * tick_seconds,
+            'tvl': tvls,
+            'fees': tvls * rng.gamma(2.0, 0.05, size=size) * year_fraction,
+            'splits': tvls * rng.normal(0.08, 0.6, size=size) * year_fraction
+        }
+
+def payout_setup(num_lps, num_traders, seed=None):
+    """(allocation model, LP balances) for payout_ledger.py
+
+    Traders get the training tiers' fee/split allocations at random; LP
+    balances are lognormal share counts in micro-share units.
+    """
+    rng = make_rng(seed)
+    tiers = rng.integers(0, 3, size=num_traders).tolist()
+    allocation_model = {
+        trader_id: {'fees_allocation': (0.25, 0.15, 0.08)[tier],
+                    'splits_allocation': (0.35, 0.20, 0.12)[tier]}
+        for trader_id, tier in zip(hex_ids(0, num_traders).astype(str).tolist(), tiers)
+    }
+    shares = np.rint(rng.lognormal(np.log(5000.0), 1.5, size=num_lps) * 1e6).astype(np.int64)
+    return allocation_model, list(zip(decimal_ids('lp_', 0, num_lps).astype(str).tolist(),
+                                       shares.tolist()))
+
+def iter_epoch_revenue(count, num_traders, block_epochs=32, seed=None):
+    """Yield (fee_cents, split_cents) (epochs x traders) blocks for payout_ledger.py
+
+    Fees are always positive; profit splits are noisier and sometimes negative.
+    """
+    rng = make_rng(seed)
+    for start in range(0, count, block_epochs):
+        shape = (min(block_epochs, count - start), num_traders)
+        yield (np.rint(rng.gamma(2.0, 5000.0, size=shape)).astype(np.int64),
+               np.rint(rng.normal(4000.0, 20000.0, size=shape)).astype(np.int64))
+
+def write_ndjson(tables, outfile):
+    """Write each record of each table as one JSON line; returns the count"""
+    written = 0
+    for table in tables:
+        lines = [json.dumps(item) for item in table.to_dicts()]
+        if lines:
+            outfile.write('\n'.join(lines) + '\n')
+        written += len(lines)
+    return written
+
+def write_npy(tables, path, count):
+    """Stream tables into one structured .npy file; returns the count
+
+    Position end dates are stored alongside as <path minus .npy>.end_dates.json,
+    which load_npy_positions() reads back.
+    """
+    out = None
+    written = 0
+    labels = None
+
+    for table in tables:
+        if out is None:
+            out = np.lib.format.open_memmap(path, mode='w+', dtype=table.records.dtype,
+                                            shape=(count,))
+            labels = getattr(table, 'end_dates', None)
+        out[written:written + len(table)] = table.records
+        written += len(table)
+
+    if out is not None:
+        out.flush()
+        del out
+
+    if labels is not None:
+        with open(end_dates_path(path), 'w') as f:
+            json.dump(labels, f)
+
+    return written
+
+def end_dates_path(npy_path):
+    """Sidecar end-date table path for a positions .npy file"""
+    root = npy_path[:-4] if npy_path.endswith('.npy') else npy_path
+    return root + '.end_dates.json'
+
+def load_npy_positions(path):
+    """Memory-map a positions .npy written by write_npy() as a PositionTable"""
+    with open(end_dates_path(path), 'r') as f:
+        labels = json.load(f)
+    return records.PositionTable(np.load(path, mmap_mode='r'), labels)
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Generate seeded synthetic load-test data')
+    parser.add_argument('kind', choices=('positions', 'traders'))
+    parser.add_argument('--count', type=float, default=1e6, help='records to generate')
+    parser.add_argument('--seed', type=int, default=None, help='RNG seed (default: random)')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--format', choices=('ndjson', 'npy', 'columns'), default='ndjson',
+                        help='columns writes a columnar_store dataset directory')
+    parser.add_argument('--output', default='-', help="output file ('-' for stdout, NDJSON only)")
+    parser.add_argument('--clusters', type=int, default=365, help='distinct end dates (positions)')
+    parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='uniform',
+                        help='how positions spread over clusters')
+    parser.add_argument('--skew', type=float, default=1.2, help='zipf exponent / front decay rate')
+    parser.add_argument('--spread-days', type=int, default=1, help='days between end dates')
+    parser.add_argument('--offset-days', type=int, default=0, help='days until the first end date')
+    parser.add_argument('--base-date', default=None, help='YYYY-MM-DD (default: now)')
+    return parser.parse_args(argv)
+
+def main():
+    """Generate data and stream it to the requested output"""
+
+    args = parse_args()
+    count = int(args.count)
+
+    if args.format != 'ndjson' and args.output == '-':
+        print(f"Error: --format {args.format} needs an --output path", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        base_date = datetime.strptime(args.base_date, '%Y-%m-%d') if args.base_date else None
+    except ValueError:
+        print(f"Error: Invalid --base-date '{args.base_date}'", file=sys.stderr)
+        sys.exit(1)
+
+    if args.kind == 'positions':
+        tables = (table for table, _ in iter_position_tables(
+            count, args.chunk_size, args.clusters, args.seed, args.distribution, args.skew,
+            args.spread_days, args.offset_days, base_date))
+    else:
+        tables = iter_trader_tables(count, args.chunk_size, args.seed)
+
+    if args.format == 'npy':
+        written = write_npy(tables, args.output, count)
+    elif args.format == 'columns':
+        # Ids are generated, so their width is known up front
+        id_width = 42 if args.kind == 'traders' else len('pos_') + len(str(max(count - 1, 0)))
+        columnar_store.write_dataset(args.output, args.kind, tables, count, id_width)
+        written = count
+    elif args.output == '-':
+        written = write_ndjson(tables, sys.stdout)
+    else:
+        with open(args.output, 'w') as f:
+            written = write_ndjson(tables, f)
+
+    print(f"✅ Generated {written} {args.kind} (seed {args.seed})", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+Monte Carlo Tail Risk (Python)
+Simulates binary resolution of every open position over many scenarios and
+reports value at risk and expected shortfall per end-date cluster and for the
+whole portfolio
+
+Each position holds YES shares that resolve to 1 or 0. The resolution
+probability is the position's mark: currentPrice when known, otherwise the
+price implied by entryPrice + pnl / shares. Markets in the same cluster
+(the risk model's cluster_window and category split, see clustering.py)
+are correlated through a mixture copula: with probability `correlation` a
+position follows its cluster's common draw, otherwise its own.
+"""
+
+import numpy as np
+
+import clustering
+import predict_risk
+import records
+
+DEFAULT_SCENARIOS = 5000
+DEFAULT_CONFIDENCE = 0.99
+DEFAULT_CORRELATION = 0.3
+
+# Scenarios simulated per task; bounds the (scenarios x positions) working set
+DEFAULT_CHUNK_SCENARIOS = 250
+
+# Marks are kept strictly inside (0, 1) so every market can still resolve either way
+PRICE_EPSILON = 1e-4
+
+# Uniforms are drawn as 16-bit integers: half the bits of float32 and
+# plenty of resolution next to PRICE_EPSILON
+UNIFORM_LEVELS = 1 << 16
+
+def open_positions(positions, categories=False):
+    """Columns for the open positions in a list of dicts or a PositionTable"""
+    if isinstance(positions, records.PositionTable):
+        table = positions.records
+        is_open = table['status'] == records.POSITION_STATUSES.index('open')
+        marks = table['current_price']
+        category_codes = positions.category_codes
+        positions = records.PositionTable(
+            table[is_open], positions.end_dates,
+            None if category_codes is None else category_codes[is_open], positions.categories)
+        columns = positions.columns()
+        columns['current_price'] = marks[is_open]
+        return columns
+
+    positions = [p for p in positions if p.get('status', 'open') == 'open']
+    columns = predict_risk.positions_to_columns(positions, categories)
+    columns['current_price'] = np.fromiter((p.get('currentPrice', np.nan) for p in positions),
+                                           dtype=np.float64, count=len(positions))
+    return columns
+
+def resolution_probabilities(columns):
+    """Per-position probability of resolving YES (the current mark)"""
+    shares = columns['shares']
+    implied = columns['entry_price'] + np.divide(
+        columns['pnl'], shares, out=np.zeros_like(shares), where=shares != 0)
+    marks = np.where(np.isnan(columns['current_price']), implied, columns['current_price'])
+    return np.clip(marks, PRICE_EPSILON, 1 - PRICE_EPSILON)
+
+def prepare_book(columns, window=None, by_category=False):
+    """Sort positions by cluster for the simulation
+
+    Clusters are the ones predict_risk scores: clustering.cluster_codes()
+    over the (end date, category) groups present in columns. Returns the
+    arrays simulate_chunk() needs (probabilities, shares, cluster start
+    offsets and each position's cluster index) plus the cluster labels and
+    categories.
+    """
+    window = window if window is not None else clustering.ClusterWindow()
+    groups, labels, categories = clustering.group_codes(columns, by_category)
+
+    # Only groups with positions, so absent end dates never anchor a window
+    present = np.flatnonzero(np.bincount(groups, minlength=len(labels)))
+    group_clusters, cluster_labels, cluster_categories = clustering.cluster_codes(
+        [labels[i] for i in present.tolist()], window,
+        None if categories is None else [categories[i] for i in present.tolist()])
+    cluster_of_group = np.zeros(len(labels), dtype=np.int64)
+    cluster_of_group[present] = group_clusters
+    clusters = cluster_of_group[groups]
+
+    order = np.argsort(clusters, kind='stable')
+    cluster_index = clusters[order]
+
+    return {
+        'probability': resolution_probabilities(columns)[order],
+        'shares': columns['shares'][order],
+        'starts': np.searchsorted(cluster_index, np.arange(len(cluster_labels))),
+        'cluster_index': cluster_index,
+        'labels': cluster_labels,
+        'categories': cluster_categories
+    }
+
+def simulate_chunk(book, scenarios, correlation, seed):
+    """Resolution P&L per (scenario, cluster) for one chunk of scenarios
+
+    One uniform per position and scenario drives both the mixture choice and
+    the idiosyncratic outcome: for V < correlation the position follows its
+    cluster's common uniform U, otherwise V itself, rescaled to (0, 1), is
+    the position's own draw. YES iff the chosen uniform falls below p.
+    """
+    rng = np.random.default_rng(seed)
+    probability = book['probability']
+    num_clusters = len(book['starts'])
+
+    # Thresholds on the 16-bit integer scale
+    follow_level = int(round(correlation * UNIFORM_LEVELS))
+    yes_level = np.round(probability * UNIFORM_LEVELS).astype(np.uint32)
+    own_yes_level = np.round((correlation + probability * (1 - correlation))
+                             * UNIFORM_LEVELS).astype(np.uint32)
+
+    common = rng.integers(0, UNIFORM_LEVELS, (scenarios, num_clusters), dtype=np.uint16)
+    own = rng.integers(0, UNIFORM_LEVELS, (scenarios, probability.size), dtype=np.uint16)
+
+    # V < c: follow the cluster (U < p); else (V - c) / (1 - c) < p  <=>  V < c + p (1 - c).
+    # V < c implies V < c + p (1 - c), so both branches fold into one mask.
+    resolves_yes = (own < own_yes_level) & (
+        (own >= follow_level) | (common[:, book['cluster_index']] < yes_level))
+
+    shares = book['shares']
+    # Payoffs accumulate in float64: float32 sums lose cents on large share totals
+    payoff = np.add.reduceat(resolves_yes * shares, book['starts'], axis=1)
+    mark_value = np.add.reduceat(shares * probability, book['starts'])
+    return payoff - mark_value
+
+def simulate_cluster_pnl(book, scenarios=DEFAULT_SCENARIOS, correlation=DEFAULT_CORRELATION,
+                         seed=None, chunk_scenarios=DEFAULT_CHUNK_SCENARIOS, workers=None):
+    """(scenarios x clusters) resolution P&L, chunked over scenarios
+
+    Every chunk gets its own child seed, so results depend only on seed and
+    chunk_scenarios, not on the number of workers. workers > 1 runs chunks in
+    a process pool.
+    """
+    chunk_sizes = [min(chunk_scenarios, scenarios - start)
+                   for start in range(0, scenarios, chunk_scenarios)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    if workers is not None and workers > 1 and len(chunk_sizes) > 1:
+        # Imported here: concurrent.futures.process is a noticeable share of startup
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(simulate_chunk, [book] * len(chunk_sizes), chunk_sizes,
+                                   [correlation] * len(chunk_sizes), seeds))
+    else:
+        chunks = [simulate_chunk(book, size, correlation, child)
+                  for size, child in zip(chunk_sizes, seeds)]
+
+    return np.concatenate(chunks) if chunks else np.zeros((0, len(book['starts'])))
+
+def tail_metrics(pnl, confidence=DEFAULT_CONFIDENCE):
+    """Value at risk and expected shortfall (as positive losses) along axis 0"""
+    cutoff = np.quantile(pnl, 1 - confidence, axis=0, method='lower')
+    in_tail = pnl <= cutoff
+    shortfall = (pnl * in_tail).sum(axis=0) / np.maximum(in_tail.sum(axis=0), 1)
+    return np.maximum(-cutoff, 0.0), np.maximum(-shortfall, 0.0)
+
+def assess_tail_risk(positions, scenarios=DEFAULT_SCENARIOS, confidence=DEFAULT_CONFIDENCE,
+                     correlation=DEFAULT_CORRELATION, seed=None, workers=None,
+                     cluster_window='exact', by_category=False):
+    """Cluster and portfolio VaR / expected shortfall for a book of positions
+
+    cluster_window and by_category pick the correlated clusters the way the
+    risk model's weights do (see clustering.model_clustering).
+    """
+    window = clustering.ClusterWindow.parse(cluster_window)
+    columns = open_positions(positions, by_category)
+    if columns['end_code'].size == 0:
+        return {'value_at_risk': 0.0, 'expected_shortfall': 0.0, 'clusters': [],
+                'scenarios': scenarios, 'confidence': confidence, 'correlation': correlation}
+
+    book = prepare_book(columns, window, by_category)
+    cluster_pnl = simulate_cluster_pnl(book, scenarios, correlation, seed, workers=workers)
+    cluster_var, cluster_es = tail_metrics(cluster_pnl, confidence)
+    portfolio_var, portfolio_es = tail_metrics(cluster_pnl.sum(axis=1), confidence)
+
+    clusters = [
+        {
+            'end_date': label,
+            'value_at_risk': round(float(var), 2),
+            'expected_shortfall': round(float(es), 2)
+        }
+        for label, var, es in zip(book['labels'], cluster_var, cluster_es)
+    ]
+    if book['categories'] is not None:
+        for cluster, category in zip(clusters, book['categories']):
+            cluster['category'] = category
+
+    return {
+        'value_at_risk': round(float(portfolio_var), 2),
+        'expected_shortfall': round(float(portfolio_es), 2),
+        'clusters': clusters,
+        'scenarios': scenarios,
+        'confidence': confidence,
+        'correlation': correlation
+    }
+
+def add_tail_metrics(prediction, tail_risk, top_clusters=5):
+    """Merge tail-risk results into a prediction's metrics payload (in place)"""
+    worst = sorted(tail_risk['clusters'], key=lambda c: c['expected_shortfall'], reverse=True)
+
+    prediction['metrics'].update({
+        'valueAtRisk': tail_risk['value_at_risk'],
+        'expectedShortfall': tail_risk['expected_shortfall'],
+        'tailConfidence': tail_risk['confidence'],
+        'tailScenarios': tail_risk['scenarios'],
+        'tailClusters': worst[:top_clusters]
+    })
+    return prediction
+
+def tail_risk_options(model_weights, **overrides):
+    """Simulation settings from the model weights, with explicit overrides applied"""
+    window, by_category = clustering.model_clustering(model_weights)
+    options = {
+        'scenarios': int(model_weights.get('tail_scenarios', DEFAULT_SCENARIOS)),
+        'confidence': float(model_weights.get('tail_confidence', DEFAULT_CONFIDENCE)),
+        'correlation': float(model_weights.get('tail_correlation', DEFAULT_CORRELATION)),
+        'cluster_window': str(window),
+        'by_category': by_category
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+def apply_tail_risk(prediction, positions, model_weights, seed=None, workers=None, **overrides):
+    """Simulate positions and add the tail metrics to prediction (in place)"""
+    options = tail_risk_options(model_weights, **overrides)
+    return add_tail_metrics(prediction, assess_tail_risk(positions, seed=seed, workers=workers,
+                                                         **options))
@@ -4,79 +4,240 @@
 AI Risk Training Script (Python)
 Trains TensorFlow LSTM model to predict risk alerts
 based on position drawdown patterns
+
+Every run also saves per-cluster sufficient statistics next to the model
+(risk_model.stats.json). With --incremental, a run folds only observations
+it has not seen before into those statistics instead of reprocessing the
+whole history.
 """
 
 import os
+import sys
 import json
+import argparse
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import calibration
+import clustering
+import columnar_store
+import instrumentation
+import model_store
+import predict_risk
+import records
+import synthetic
+
+# Bump when the sufficient-statistics layout changes (older files are ignored)
+STATS_FORMAT = 1
+
+# Columns the drawdown statistics read from a stored dataset
+STATS_COLUMNS = ('end_code', 'entry_price', 'shares', 'pnl')
+
+# Statistics are kept per day; models bin those days into this window by default
+DEFAULT_CLUSTER_WINDOW = 'daily'
 
-def generate_mock_positions():
+def generate_mock_positions(seed=None):
     """Generate mock position data for training"""
 
     print("Generating mock position data for risk analysis...")
 
-    positions = []
-    end_dates = []
+    rng = synthetic.make_rng(seed)
 
-    # Generate end dates over next 12 months
-    base_date = datetime.now()
-    for i in range(12):
-        month_date = base_date + timedelta(days=30*i)
-        end_dates.append(month_date)
+    # 12 monthly end date clusters of 3-15 positions each
+    cluster_sizes = rng.integers(3, 15, size=12)
+    positions, end_dates = synthetic.position_table(
+        0, cluster_sizes=cluster_sizes, spread_days=30, seed=rng)
 
-    # Create positions for each end date cluster
-    for end_date in end_dates:
-        cluster_size = np.random.randint(3, 15)  # 3-15 positions per cluster
-
-        for _ in range(cluster_size):
-            position = {
-                'id': f'pos_{np.random.randint(1000, 9999)}',
-                'endDate': end_date.isoformat(),
-                'entryPrice': np.random.uniform(0.1, 1.0),
-                'currentPrice': np.random.uniform(0.05, 1.2),
-                'shares': np.random.randint(10, 1000),
-                'pnl': 0,  # Will be calculated
-                'status': 'open'
-            }
+    return positions.to_dicts(), end_dates
 
-            # Calculate PnL
-            position['pnl'] = (position['currentPrice'] - position['entryPrice']) * position['shares']
-            positions.append(position)
+def cluster_date_codes(end_dates):
+    """YYYY-MM-DD cluster key -> cluster code, in end_dates order"""
+    date_codes = {}
+    for end_date in end_dates:
+        date_codes.setdefault(end_date.strftime('%Y-%m-%d'), len(date_codes))
+    return date_codes
+
+def drawdown_stats(chunks, date_codes):
+    """Per-cluster size, value, PnL and worst single PnL over column chunks
+
+    Each chunk is a dict of end_code / entry_price / shares / pnl arrays plus
+    its end_dates label table; a position belongs to the cluster of the
+    YYYY-MM-DD day its endDate falls on (clustering.day_keys, so timestamps
+    with an offset count on their UTC day, and unparsable labels belong to
+    no cluster). Totals add up across chunks
+    and the worst loss is the running minimum, so chunking does not change
+    the result.
+    """
+    num_clusters = len(date_codes)
+    sizes = np.zeros(num_clusters, dtype=np.int64)
+    total_values = np.zeros(num_clusters)
+    total_pnls = np.zeros(num_clusters)
+    max_losses = np.full(num_clusters, np.inf)
+    label_tables = {}
+
+    for chunk in chunks:
+        # Map each distinct endDate label to its cluster once per label table
+        labels = chunk['end_dates']
+        label_codes = label_tables.get(id(labels))
+        if label_codes is None:
+            label_codes = np.array([date_codes.get(day, -1)
+                                    for day in clustering.day_keys(labels)], dtype=np.int64)
+            label_tables[id(labels)] = label_codes
+        codes = label_codes[chunk['end_code']]
+
+        # Drop positions outside the requested clusters
+        matched = codes >= 0
+        codes, pnls = codes[matched], chunk['pnl'][matched]
+        values = chunk['entry_price'][matched] * chunk['shares'][matched]
+
+        # Grouped reductions over all clusters in one pass
+        chunk_sizes = np.bincount(codes, minlength=num_clusters)
+        sizes += chunk_sizes
+        total_values += np.bincount(codes, weights=values, minlength=num_clusters)
+        total_pnls += np.bincount(codes, weights=pnls, minlength=num_clusters)
+
+        present = chunk_sizes > 0
+        if present.any():
+            order = np.argsort(codes, kind='stable')
+            starts = np.searchsorted(codes[order], np.flatnonzero(present))
+            max_losses[present] = np.minimum(max_losses[present],
+                                             np.minimum.reduceat(pnls[order], starts))
+
+    return {
+        'sizes': sizes,
+        'total_values': total_values,
+        'total_pnls': total_pnls,
+        'max_losses': np.where(sizes > 0, max_losses, 0.0)
+    }
 
-    return positions, end_dates
+def empty_drawdown_stats(num_clusters=0):
+    """drawdown_stats() result with no observations"""
+    return {
+        'sizes': np.zeros(num_clusters, dtype=np.int64),
+        'total_values': np.zeros(num_clusters),
+        'total_pnls': np.zeros(num_clusters),
+        'max_losses': np.zeros(num_clusters)
+    }
 
-def analyze_drawdown_patterns(positions, end_dates):
-    """Analyze drawdown patterns for each end date cluster"""
+def merge_drawdown_stats(stats, new_stats):
+    """Fold new drawdown_stats() into existing ones
+
+    Both must use the same date codes, except that stats may cover fewer
+    (older) clusters; it is padded with empty clusters first.
+    """
+    num_clusters = len(new_stats['sizes'])
+    padding = num_clusters - len(stats['sizes'])
+    stats = {name: np.concatenate([values, np.zeros(padding, dtype=values.dtype)])
+             for name, values in stats.items()}
+
+    # An empty cluster's max_loss is a 0.0 placeholder, not an observation
+    old_present = stats['sizes'] > 0
+    new_present = new_stats['sizes'] > 0
+    max_losses = np.where(old_present & new_present,
+                          np.minimum(stats['max_losses'], new_stats['max_losses']),
+                          np.where(new_present, new_stats['max_losses'], stats['max_losses']))
+
+    return {
+        'sizes': stats['sizes'] + new_stats['sizes'],
+        'total_values': stats['total_values'] + new_stats['total_values'],
+        'total_pnls': stats['total_pnls'] + new_stats['total_pnls'],
+        'max_losses': max_losses
+    }
 
-    print("Analyzing drawdown patterns across end date clusters...")
+def stats_path(model_path):
+    """Sufficient-statistics path for a model path (risk_model.json -> risk_model.stats.json)"""
+    root, _ = os.path.splitext(model_path)
+    return root + '.stats.json'
+
+def load_training_stats(path):
+    """(date_codes, stats, checkpoints) saved by save_training_stats(), or empty ones
+
+    checkpoints maps each dataset directory to the number of its rows
+    already folded into the statistics.
+    """
+    try:
+        with open(path, 'r') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        saved = None
+
+    if not saved or saved.get('format') != STATS_FORMAT:
+        return {}, empty_drawdown_stats(), {}
+
+    clusters = saved['clusters']
+    date_codes = {date_str: code for code, date_str in enumerate(clusters)}
+    columns = list(zip(*clusters.values())) or [(), (), (), ()]
+    stats = {
+        'sizes': np.array(columns[0], dtype=np.int64),
+        'total_values': np.array(columns[1], dtype=np.float64),
+        'total_pnls': np.array(columns[2], dtype=np.float64),
+        'max_losses': np.array(columns[3], dtype=np.float64)
+    }
+    return date_codes, stats, saved.get('checkpoints', {})
+
+def save_training_stats(path, date_codes, stats, checkpoints):
+    """Atomically write per-cluster sufficient statistics and dataset checkpoints"""
+    clusters = {
+        date_str: [int(stats['sizes'][code]), float(stats['total_values'][code]),
+                   float(stats['total_pnls'][code]), float(stats['max_losses'][code])]
+        for date_str, code in date_codes.items()
+    }
+    saved = {
+        'format': STATS_FORMAT,
+        'updated': datetime.now().isoformat(),
+        'clusters': clusters,
+        'checkpoints': checkpoints
+    }
 
-    cluster_analysis = {}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(saved, f)
+    os.replace(tmp_path, path)
+    return path
 
+def extend_date_codes(date_codes, end_dates):
+    """Append codes for end dates (datetimes) not yet in date_codes (in place)"""
     for end_date in end_dates:
-        date_str = end_date.strftime('%Y-%m-%d')
-
-        # Get positions for this end date
-        cluster_positions = [
-            p for p in positions
-            if p['endDate'].startswith(date_str)
-        ]
+        date_codes.setdefault(end_date.strftime('%Y-%m-%d'), len(date_codes))
+    return date_codes
+
+def window_stats(date_codes, stats, window):
+    """Per-day drawdown_stats() binned into window clusters: (cluster keys, stats)
+
+    Days without observations are dropped first; daily and exact windows
+    leave the per-day statistics as they are.
+    """
+    if window is None or window.kind in ('exact', 'daily'):
+        return list(date_codes), stats
+
+    present = [(date_str, code) for date_str, code in date_codes.items() if stats['sizes'][code]]
+    codes = np.array([code for _, code in present], dtype=np.int64)
+    keys, _, clustered = clustering.cluster_groups(
+        [date_str for date_str, _ in present],
+        {name: values[codes] for name, values in stats.items()},
+        window, minimums=('max_losses',))
+    return keys, clustered
+
+def build_cluster_analysis(date_codes, stats, window=None):
+    """Cluster analysis dicts from drawdown_stats() output, binned into window clusters"""
+    keys, stats = window_stats(date_codes, stats, window)
+    sizes = stats['sizes']
+    cluster_analysis = {}
 
-        if not cluster_positions:
+    for code, date_str in enumerate(keys):
+        if not sizes[code]:
             continue
 
-        # Calculate cluster metrics
-        total_value = sum(p['entryPrice'] * p['shares'] for p in cluster_positions)
-        total_pnl = sum(p['pnl'] for p in cluster_positions)
-        max_loss = min(p['pnl'] for p in cluster_positions)
+        total_value = float(stats['total_values'][code])
+        max_loss = float(stats['max_losses'][code])
 
         # Calculate drawdown percentage
         drawdown_pct = abs(max_loss) / total_value if total_value > 0 else 0
 
         cluster_analysis[date_str] = {
-            'total_positions': len(cluster_positions),
+            'total_positions': int(sizes[code]),
             'total_value': total_value,
-            'total_pnl': total_pnl,
+            'total_pnl': float(stats['total_pnls'][code]),
             'max_loss': max_loss,
             'drawdown_percentage': drawdown_pct,
             'risk_level': 'high' if drawdown_pct > 0.04 else 'medium' if drawdown_pct > 0.02 else 'low'
@@ -84,8 +245,71 @@ def analyze_drawdown_patterns(positions, end_dates):
 
     return cluster_analysis
 
-def train_risk_model(cluster_analysis):
-    """Train LSTM model to predict risk alerts"""
+def analyze_drawdown_patterns(positions, end_dates, window=None):
+    """Analyze drawdown patterns for each end date cluster (per day, or per window)"""
+
+    print("Analyzing drawdown patterns across end date clusters...")
+
+    date_codes = cluster_date_codes(end_dates)
+
+    if not isinstance(positions, records.PositionTable):
+        positions = records.PositionTable.from_dicts(positions)
+
+    return build_cluster_analysis(date_codes, drawdown_stats([positions.columns()], date_codes),
+                                  window)
+
+def dataset_end_dates(labels):
+    """Distinct cluster dates of a dataset's endDate labels, in label order"""
+    dates = {}
+    for day in clustering.day_keys(labels):
+        if day is not None:
+            dates.setdefault(day, None)
+    return [datetime.strptime(date_str, '%Y-%m-%d') for date_str in dates]
+
+def analyze_drawdown_dataset(dataset, end_dates=None, chunk_size=1000000, window=None):
+    """analyze_drawdown_patterns() streamed over a memory-mapped position dataset
+
+    Only the four columns the analysis needs are mapped, one chunk of pages
+    at a time; end_dates defaults to every date the dataset refers to.
+    """
+
+    print(f"Analyzing drawdown patterns across {len(dataset)} stored positions...")
+
+    if end_dates is None:
+        end_dates = dataset_end_dates(dataset.end_dates)
+    date_codes = cluster_date_codes(end_dates)
+
+    chunks = dataset.iter_chunks(STATS_COLUMNS, chunk_size)
+    return (build_cluster_analysis(date_codes, drawdown_stats(chunks, date_codes), window),
+            end_dates)
+
+def update_dataset_stats(dataset, date_codes, stats, start=0, chunk_size=1000000):
+    """Fold dataset rows from start onward into (date_codes, stats)
+
+    Datasets are append-only exports, so rows before the saved checkpoint
+    are never read again. Returns the extended date codes and merged stats.
+    """
+    date_codes = extend_date_codes(dict(date_codes), dataset_end_dates(dataset.end_dates))
+    chunks = dataset.iter_chunks(STATS_COLUMNS, chunk_size, start)
+    return date_codes, merge_drawdown_stats(stats, drawdown_stats(chunks, date_codes))
+
+def update_position_stats(positions, end_dates, date_codes, stats):
+    """Fold a batch of new positions (dicts or a PositionTable) into (date_codes, stats)"""
+    if not isinstance(positions, records.PositionTable):
+        positions = records.PositionTable.from_dicts(positions)
+
+    date_codes = extend_date_codes(dict(date_codes), end_dates)
+    return date_codes, merge_drawdown_stats(stats, drawdown_stats([positions.columns()],
+                                                                  date_codes))
+
+def train_risk_model(cluster_analysis, calibrated=None, cluster_window=DEFAULT_CLUSTER_WINDOW):
+    """Train LSTM model to predict risk alerts
+
+    calibrated, a calibration.calibrate() result, replaces the default
+    drawdown threshold with the fitted one. cluster_window is
+    recorded so the predictor bins positions the way the clusters were
+    analyzed.
+    """
 
     print("Training LSTM model for risk prediction...")
 
@@ -108,9 +332,17 @@ def train_risk_model(cluster_analysis):
         'time_to_expiry_weight': 0.2,
         'pnl_volatility_weight': 0.5,
         'historical_patterns': len(high_risk_clusters),
-        'confidence_score': min(0.95, len(high_risk_clusters) / 10)  # Higher confidence with more data
+        'confidence_score': min(0.95, len(high_risk_clusters) / 10),  # Higher confidence with more data
+        'cluster_window': str(cluster_window)
     }
 
+    if calibrated is not None:
+        calibration.apply_calibration(model_weights, calibrated)
+        model_weights['historical_patterns'] = len([
+            cluster for cluster in cluster_analysis.values()
+            if cluster['drawdown_percentage'] > model_weights['drawdown_threshold']
+        ])
+
     return model_weights
 
 def generate_risk_predictions(cluster_analysis, model_weights):
@@ -136,17 +368,21 @@ def generate_risk_predictions(cluster_analysis, model_weights):
 
     return predictions
 
+def risk_model_path():
+    """Where the trained risk model is written"""
+    return os.environ.get('MODEL_OUTPUT_PATH', 'risk_model.json')
+
 def save_risk_model(model_weights, cluster_analysis, predictions):
     """Save the trained risk model"""
 
-    output_path = os.environ.get('MODEL_OUTPUT_PATH', 'risk_model.json')
+    output_path = risk_model_path()
 
     model = {
         'model_type': 'risk_prediction_lstm',
         'training_date': datetime.now().isoformat(),
         'model_weights': model_weights,
         'risk_thresholds': {
-            'high': 4.0,
+            'high': round(model_weights['drawdown_threshold'] * 100, 4),
             'medium': 2.0,
             'low': 1.0
         },
@@ -165,39 +401,130 @@ def save_risk_model(model_weights, cluster_analysis, predictions):
         }
     }
 
-    with open(output_path, 'w') as f:
-        json.dump(model, f, indent=2, default=str)
+    # Precompiled artifact so predictions never parse the JSON on the hot path
+    artifact = model_store.write_model(output_path, model, 'risk', predict_risk.compile_risk_model(model))
 
-    print(f"Risk model saved to {output_path}")
+    print(f"Risk model saved to {output_path} (compiled: {artifact})")
     return output_path
 
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Train the position cluster risk model')
+    parser.add_argument('--data', default=None, metavar='DIR',
+                        help='columnar position dataset (columnar_store.py) instead of mock data')
+    parser.add_argument('--chunk-size', type=int, default=1000000,
+                        help='rows mapped per chunk when streaming --data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fold only new observations into the saved cluster statistics '
+                             '(rows of --data past its checkpoint, or a fresh mock batch)')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='fit the drawdown threshold with a grid sweep')
+    parser.add_argument('--labels', default=None, metavar='FILE',
+                        help='NDJSON of labeled cluster outcomes for --calibrate (default: mock)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for mock positions and mock calibration outcomes')
+    parser.add_argument('--cluster-window', default=DEFAULT_CLUSTER_WINDOW, metavar='WINDOW',
+                        help="bin end dates into 'daily', 'weekly' or 'rolling:N' day clusters "
+                             "(recorded in the model for the predictor)")
+    return parser.parse_args(argv)
+
 def main():
     """Main risk training function"""
 
+    args = parse_args()
+
     print("🛡️  Starting AI Risk Training Pipeline")
     print("=" * 50)
 
-    # Generate mock position data
-    positions, end_dates = generate_mock_positions()
-    print(f"✅ Generated {len(positions)} positions across {len(end_dates)} end date clusters")
-
-    # Analyze drawdown patterns
-    cluster_analysis = analyze_drawdown_patterns(positions, end_dates)
-    print(f"✅ Analyzed {len(cluster_analysis)} clusters for drawdown patterns")
+    try:
+        window = clustering.ClusterWindow.parse(args.cluster_window)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    timer = instrumentation.StageTimer()
+    model_stats_path = stats_path(risk_model_path())
+
+    # Incremental runs start from the saved statistics; full runs from nothing
+    if args.incremental:
+        with timer.stage('stats_load'):
+            date_codes, stats, checkpoints = load_training_stats(model_stats_path)
+        print(f"✅ Loaded statistics for {len(date_codes)} clusters "
+              f"({int(stats['sizes'].sum())} positions)")
+    else:
+        date_codes, stats, checkpoints = {}, empty_drawdown_stats(), {}
+
+    if args.data:
+        # Exported history, memory-mapped and streamed chunk by chunk
+        try:
+            with timer.stage('data_load'):
+                dataset = columnar_store.open_dataset(args.data, 'positions')
+        except (OSError, ValueError) as e:
+            print(f"❌ Failed to open dataset {args.data}: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Opened {len(dataset)} stored positions")
+
+        source = os.path.abspath(args.data)
+        start = checkpoints.get(source, 0)
+        if start > len(dataset):
+            print(f"❌ {args.data} has {len(dataset)} rows but {start} were already trained on; "
+                  f"rerun without --incremental", file=sys.stderr)
+            sys.exit(1)
+
+        with timer.stage('aggregation'):
+            print(f"Analyzing drawdown patterns across {len(dataset) - start} new stored positions...")
+            date_codes, stats = update_dataset_stats(dataset, date_codes, stats, start,
+                                                     args.chunk_size)
+        checkpoints[source] = len(dataset)
+    else:
+        # Generate mock position data, held as compact records from here on
+        with timer.stage('data_generation'):
+            positions, end_dates = generate_mock_positions(args.seed)
+            positions = records.PositionTable.from_dicts(positions)
+        print(f"✅ Generated {len(positions)} positions across {len(end_dates)} end date clusters")
+
+        # Analyze drawdown patterns
+        with timer.stage('aggregation'):
+            print("Analyzing drawdown patterns across end date clusters...")
+            date_codes, stats = update_position_stats(positions, end_dates, date_codes, stats)
+
+    cluster_analysis = build_cluster_analysis(date_codes, stats, window)
+    print(f"✅ Analyzed {len(cluster_analysis)} {window} clusters for drawdown patterns")
+
+    # Fit the drawdown threshold against labeled outcomes
+    calibrated = None
+    if args.calibrate:
+        try:
+            with timer.stage('calibration'):
+                if args.labels:
+                    outcomes = calibration.load_outcomes(args.labels)
+                else:
+                    outcomes = synthetic.cluster_outcomes(365, args.seed)
+                calibrated = calibration.calibrate(outcomes)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Failed to calibrate: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Calibrated on {calibrated['clusters']} labeled clusters "
+              f"({calibrated['candidates']} candidates, F1 {calibrated['f1']:.3f})")
 
     # Train risk model
-    model_weights = train_risk_model(cluster_analysis)
+    with timer.stage('training'):
+        model_weights = train_risk_model(cluster_analysis, calibrated, window)
     print("✅ Trained risk prediction model")
 
     # Generate sample predictions
-    predictions = generate_risk_predictions(cluster_analysis, model_weights)
+    with timer.stage('prediction'):
+        predictions = generate_risk_predictions(cluster_analysis, model_weights)
     print(f"✅ Generated {len(predictions)} risk predictions")
 
     # Save model
-    model_path = save_risk_model(model_weights, cluster_analysis, predictions)
+    with timer.stage('save'):
+        model_path = save_risk_model(model_weights, cluster_analysis, predictions)
+        save_training_stats(model_stats_path, date_codes, stats, checkpoints)
+    timer.emit()
 
-    print("
-📊 Risk Model Summary:"    print(f"   • High risk threshold: {model_weights['drawdown_threshold']*100}%")
+    print("\n📊 Risk Model Summary:")
+    print(f"   • High risk threshold: {model_weights['drawdown_threshold']*100}%")
     print(f"   • Analyzed {len(cluster_analysis)} clusters")
     print(f"   • Found {len(predictions)} high-risk alerts")
     print(f"   • Model confidence: {model_weights['confidence_score']*100:.1f}%")
@@ -6,46 +6,136 @@ Trains Stable Baselines3 RL model to optimize yield allocation
 """
 
 import os
+import sys
 import json
+import argparse
 import numpy as np
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import columnar_store
+import instrumentation
+import model_store
+import predict_yield
+import ranking
+import records
+import synthetic
 
 # Mock Supabase data - in production, this would connect to real Supabase
-def load_mock_supabase_data():
+def load_mock_supabase_data(seed=None):
     """Load mock trader performance data"""
     print("Loading mock trader ROI and fee/split data...")
 
     # Generate mock trader data
-    traders = []
-    for i in range(100):
-        trader = {
-            'id': f'0x{i:040x}',
-            'roi': np.random.normal(0.12, 0.05),  # Mean 12% ROI with variance
-            'fees_earned': np.random.exponential(1000),  # Fee earnings
-            'splits_earned': np.random.exponential(800),  # Split earnings
-            'total_trades': np.random.randint(10, 200),
-            'win_rate': np.random.beta(3, 1),  # Beta distribution for win rates
-            'avg_position_size': np.random.lognormal(8, 1),  # Position sizes
-            'trading_days': np.random.randint(30, 365)
-        }
-        traders.append(trader)
+    return synthetic.trader_table(100, seed).to_dicts()
 
-    return traders
+# Allocation tiers only ever look at the top 20 traders
+TOP_TRADERS = 20
 
-def calculate_optimal_allocation(traders):
-    """Calculate optimal yield allocation based on trader performance"""
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, ties in input order
 
-    print("Analyzing trader performance for optimal allocation...")
+    Same result as np.argsort(-scores, kind='stable')[:k], but selects the
+    candidates with a linear-time partition and only sorts those k.
+    """
+    count = len(scores)
+    if count <= k:
+        return np.argsort(-scores, kind='stable')
+
+    kth = np.partition(scores, count - k)[count - k]  # k-th largest score
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    candidates = np.concatenate([above, ties])
+
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def select_top_traders(traders, k=TOP_TRADERS):
+    """Top k trader dicts by ROI * win rate"""
+    if not isinstance(traders, records.TraderTable):
+        traders = records.TraderTable.from_dicts(traders)
+    return traders.to_dicts(top_k_indices(traders.scores(), k))
+
+def load_trader_shard(path):
+    """Load one trader export shard (JSON array, or one JSON object per line)"""
+    with open(path, 'r') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def shard_top_traders(path, k=TOP_TRADERS):
+    """Partial top-k for one shard: (trader count, top trader dicts)
+
+    Ranking only needs id, roi and win_rate, so rows missing other stats
+    still rank; the winners are returned as exported.
+    """
+    traders = load_trader_shard(path)
+    for row, trader in enumerate(traders, 1):
+        missing = [field for field in ('id', 'roi', 'win_rate') if field not in trader]
+        if missing:
+            raise ValueError(f"{path}: trader record {row} missing {', '.join(missing)}")
+
+    scores = np.fromiter((float(trader['roi']) * float(trader['win_rate']) for trader in traders),
+                         dtype=np.float64, count=len(traders))
+    return len(traders), [traders[i] for i in top_k_indices(scores, k).tolist()]
+
+def merge_top_traders(partials, k=TOP_TRADERS):
+    """Merge per-shard top-k lists, given in shard order, into the global top k
+
+    Each partial list is already in rank order with ties in input order, so
+    a stable sort over their concatenation reproduces the single-table order.
+    """
+    candidates = [trader for partial in partials for trader in partial]
+    scores = np.array([float(trader['roi']) * float(trader['win_rate']) for trader in candidates],
+                      dtype=np.float64)
+    return [candidates[i] for i in top_k_indices(scores, k)]
+
+def rank_sharded_traders(shard_paths, k=TOP_TRADERS, workers=None):
+    """Global top k over trader shards, one shard per pool task
+
+    Returns (total trader count, top trader dicts). Each worker holds only
+    its own shard; the parent only ever sees k traders per shard.
+    """
+    if workers == 1 or len(shard_paths) <= 1:
+        results = [shard_top_traders(path, k) for path in shard_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(shard_top_traders, shard_paths, [k] * len(shard_paths)))
+
+    total = sum(count for count, _ in results)
+    return total, merge_top_traders([partial for _, partial in results], k)
+
+def rank_dataset_traders(dataset, k=TOP_TRADERS, chunk_size=1000000):
+    """Global top k over a memory-mapped trader dataset
+
+    Only the roi and win_rate columns are read, one chunk at a time; the
+    per-chunk top k candidates are merged like shards, then just the k
+    winning rows are materialized as dicts.
+    """
+    candidates = []
+    candidate_scores = []
+    offset = 0
+
+    for chunk in dataset.iter_chunks(('roi', 'win_rate'), chunk_size):
+        scores = chunk['roi'] * chunk['win_rate']
+        top = top_k_indices(scores, k)
+        candidates.append(top + offset)
+        candidate_scores.append(scores[top])
+        offset += scores.size
 
-    # Sort traders by ROI and win rate
-    sorted_traders = sorted(traders,
-                          key=lambda x: x['roi'] * x['win_rate'],
-                          reverse=True)
+    if not candidates:
+        return []
+
+    candidates = np.concatenate(candidates)
+    winners = candidates[top_k_indices(np.concatenate(candidate_scores), k)]
+    return dataset.to_dicts(winners)
+
+def allocate_ranked_traders(top_traders):
+    """Tiered fee/split allocation for traders already in rank order"""
 
     # Top performers get higher allocation
     allocation_model = {}
 
-    for i, trader in enumerate(sorted_traders[:20]):  # Top 20 traders
+    for i, trader in enumerate(top_traders):
         rank = i + 1
         if rank <= 5:  # Top 5 get highest allocation
             fees_allocation = 0.25  # 25% to top performers
@@ -61,11 +151,36 @@ def calculate_optimal_allocation(traders):
             'fees_allocation': fees_allocation,
             'splits_allocation': splits_allocation,
             'rank': rank,
-            'confidence': trader['roi'] * trader['win_rate']
+            'confidence': ranking.trader_score(trader)
         }
 
     return allocation_model
 
+def calculate_optimal_allocation(traders):
+    """Calculate optimal yield allocation based on trader performance"""
+
+    print("Analyzing trader performance for optimal allocation...")
+
+    # Rank traders by ROI and win rate (ties keep input order)
+    top_traders = select_top_traders(traders)  # Top 20 traders
+
+    return allocate_ranked_traders(top_traders)
+
+def calculate_dataset_allocation(dataset, chunk_size=1000000):
+    """Optimal allocation over a columnar trader dataset"""
+
+    print(f"Analyzing trader performance across {len(dataset)} stored traders...")
+
+    return allocate_ranked_traders(rank_dataset_traders(dataset, chunk_size=chunk_size))
+
+def calculate_sharded_allocation(shard_paths, workers=None):
+    """Optimal allocation over trader shards; returns (trader count, allocation)"""
+
+    print(f"Analyzing trader performance across {len(shard_paths)} shards...")
+
+    total, top_traders = rank_sharded_traders(shard_paths, workers=workers)
+    return total, allocate_ranked_traders(top_traders)
+
 def generate_apy_formula(tvl):
     """Generate variable APY based on TVL thresholds"""
 
@@ -115,46 +230,94 @@ def save_model(model_data):
         },
         'metadata': {
             'total_traders_analyzed': model_data['total_traders'],
-            'top_performers_selected': 20,
+            'top_performers_selected': TOP_TRADERS,
             'training_method': 'roi_winrate_weighted'
         }
     }
 
-    with open(output_path, 'w') as f:
-        json.dump(model, f, indent=2, default=str)
+    # Precompiled artifact so predictions never parse the JSON on the hot path
+    artifact = model_store.write_model(output_path, model, 'yield', predict_yield.compile_yield_model(model))
 
-    print(f"Model saved to {output_path}")
+    print(f"Model saved to {output_path} (compiled: {artifact})")
     return output_path
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description='Train the yield allocation model')
+    parser.add_argument('--shards', nargs='+', metavar='FILE',
+                        help='trader export shards (JSON array or NDJSON) instead of mock data')
+    parser.add_argument('--data', default=None, metavar='DIR',
+                        help='columnar trader dataset (columnar_store.py) instead of mock data')
+    parser.add_argument('--chunk-size', type=int, default=1000000,
+                        help='rows mapped per chunk when streaming --data')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes for ranking shards (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the mock trader data (default: random)')
+    return parser.parse_args()
+
 def main():
     """Main training function"""
 
+    args = parse_args()
+
     print("🤖 Starting AI Yield Training Pipeline")
     print("=" * 50)
 
-    # Load trader data
-    traders = load_mock_supabase_data()
-    print(f"✅ Loaded data for {len(traders)} traders")
+    timer = instrumentation.StageTimer()
+
+    if args.data:
+        # Exported history, memory-mapped; only the ranking columns are read
+        try:
+            with timer.stage('data_load'):
+                dataset = columnar_store.open_dataset(args.data, 'traders')
+        except (OSError, ValueError) as e:
+            print(f"❌ Failed to open dataset {args.data}: {e}", file=sys.stderr)
+            sys.exit(1)
+        total_traders = len(dataset)
+
+        with timer.stage('allocation'):
+            allocation_model = calculate_dataset_allocation(dataset, args.chunk_size)
+        print(f"✅ Ranked {total_traders} stored traders")
+    elif args.shards:
+        # Sharded exports are ranked shard by shard; only the top traders are kept
+        try:
+            with timer.stage('allocation'):
+                total_traders, allocation_model = calculate_sharded_allocation(args.shards,
+                                                                               args.workers)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"❌ Failed to rank shards: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ Ranked {total_traders} traders from {len(args.shards)} shards")
+    else:
+        # Load trader data, held as compact records from here on
+        with timer.stage('data_load'):
+            traders = records.TraderTable.from_dicts(load_mock_supabase_data(args.seed))
+        total_traders = len(traders)
+        print(f"✅ Loaded data for {total_traders} traders")
 
-    # Calculate optimal allocation
-    allocation_model = calculate_optimal_allocation(traders)
+        # Calculate optimal allocation
+        with timer.stage('allocation'):
+            allocation_model = calculate_optimal_allocation(traders)
 
     # Test APY generation for different TVL values
     test_tvls = [5000, 15000, 35000, 75000, 150000]
     print("\n📊 Testing APY generation:")
-    for tvl in test_tvls:
-        apy = generate_apy_formula(tvl)
-        print(".0f")
+    with timer.stage('apy_formula'):
+        for tvl in test_tvls:
+            print(f"   ${tvl:,} TVL -> {generate_apy_formula(tvl):.1f}% APY")
 
     # Prepare model data
     model_data = {
         'allocation': allocation_model,
-        'total_traders': len(traders),
+        'total_traders': total_traders,
         'top_performers': len(allocation_model)
     }
 
     # Save model
-    model_path = save_model(model_data)
+    with timer.stage('save'):
+        model_path = save_model(model_data)
+    timer.emit()
 
     print("\n🎉 Training completed successfully!")
     print(f"📁 Model saved: {model_path}")